@@ -0,0 +1,66 @@
+"""
+ABC классификация товаров по выручке
+
+Выручка товара за окно - продажи из дневного агрегата, умноженные на
+себестоимость (cost_price из products.json). Товары сортируются по
+убыванию выручки, и по накопленной доле выручки до товара он попадает в
+класс A (первые a_share выручки), B (до b_share) или C. Товар, на котором
+накопленная доля переходит границу, остаётся в старшем классе. Товары без
+выручки - всегда C. Результат - массив кодов классов (индексы ABC_CLASSES)
+по оси товаров агрегата.
+"""
+import numpy as np
+import pandas as pd
+
+from .rollup import ABC_CLASSES
+
+
+def product_prices(products_data, products):
+    """Себестоимость товаров в порядке оси товаров агрегата
+
+    Товарам без себестоимости подставляется медиана известных цен, чтобы их
+    продажи учитывались в выручке; если цен нет совсем - 1 (выручка в штуках).
+    """
+    prices = pd.to_numeric(
+        pd.Series({product_id: record.get('cost_price') for product_id, record in products_data.items()}, dtype=object),
+        errors='coerce'
+    ).reindex(products).to_numpy(dtype=np.float64)
+    known = prices[np.isfinite(prices)]
+    return np.where(np.isfinite(prices), prices, np.median(known) if len(known) else 1.0)
+
+
+def product_revenue(rollup, prices, window_days):
+    """Выручка товаров за последние window_days дней агрегата"""
+    if rollup.start_day is None:
+        return np.zeros(len(rollup.products))
+    lo = max(0, rollup.n_days - window_days)
+    prefix = rollup.prefix
+    units = prefix[rollup.n_days].astype(np.int64) - prefix[lo]
+    by_product = np.bincount(rollup.sku_product, weights=units, minlength=len(rollup.products))
+    return by_product * prices
+
+
+def classify_revenue(revenue, a_share=0.8, b_share=0.95):
+    """Коды классов по накопленной доле выручки: сортировка и cumsum по всем товарам"""
+    classes = np.full(len(revenue), len(ABC_CLASSES) - 1, dtype=np.int8)
+    total = revenue.sum()
+    if total <= 0:
+        return classes
+    order = np.argsort(-revenue, kind='stable')
+    # Доля выручки всех товаров, стоящих выше данного
+    share_before = (np.cumsum(revenue[order]) - revenue[order]) / total
+    ranked = np.searchsorted([a_share, b_share], share_before, side='right').astype(np.int8)
+    ranked[revenue[order] <= 0] = len(ABC_CLASSES) - 1
+    classes[order] = ranked
+    return classes
+
+
+def classify_products(rollup, products_data, window_days=90, a_share=0.8, b_share=0.95, prices=None):
+    """ABC классы всех товаров агрегата по выручке за окно
+
+    prices - готовые цены product_prices() для тех же товаров: при дозаписи
+    продаж справочник не меняется, и цены не пересчитываются.
+    """
+    if prices is None or len(prices) != len(rollup.products):
+        prices = product_prices(products_data, rollup.products)
+    return classify_revenue(product_revenue(rollup, prices, window_days), a_share, b_share)
@@ -1,10 +1,16 @@
+import os
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+import time
+from contextlib import nullcontext
 from datetime import datetime, timedelta
-import numpy as np
+from config import (
+    ABC_CONFIG, API_CONFIG, CHART_CONFIG, DATA_CONFIG, DIAGNOSTICS_CONFIG, EXPORT_CONFIG, FORECAST_CONFIG,
+    INGEST_CONFIG, STOCKOUT_CONFIG, UPDATE_CONFIG
+)
+from modules.charts import FigureCache, downsample, max_points_for_width
 from modules.data_handler import DataHandler
+from modules.export import Exporter
+from modules.instrumentation import Instrumentation, instrument_methods
 
 # Настройка страницы
 st.set_page_config(
@@ -14,12 +20,213 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Инициализация обработчика данных
-@st.cache_data
+# Замеры методов обработчика и разделов, только если диагностика включена
+@st.cache_resource
+def load_instrumentation():
+    if not DIAGNOSTICS_CONFIG['enabled']:
+        return None
+    return Instrumentation(DIAGNOSTICS_CONFIG['max_samples'])
+
+# Инициализация обработчика данных: один экземпляр на процесс для всех сессий.
+# Источники данных загружаются при первом обращении из раздела, которому они нужны.
+# При auto_refresh изменения файлов подхватывает фоновый поток, а не запросы
+# пользователей, поэтому обработчик не пересоздаётся по cache_ttl
+@st.cache_resource(ttl=None if DATA_CONFIG['auto_refresh'] else DATA_CONFIG['cache_ttl'])
 def load_data():
-    return DataHandler()
+    handler = DataHandler(
+        query_cache_bytes=DATA_CONFIG['query_cache_bytes'],
+        forecast_params=FORECAST_CONFIG,
+        streaming=DATA_CONFIG['streaming'],
+        chunk_rows=DATA_CONFIG['chunk_rows'],
+        raw_window_days=DATA_CONFIG['raw_window_days'] if DATA_CONFIG['streaming'] else None,
+        engine=DATA_CONFIG['engine'],
+        partitions_dir=DATA_CONFIG['partitions_path'],
+        partition_by_product=DATA_CONFIG['partition_by_product'],
+        plane_dir=DATA_CONFIG['plane_path'],
+        abc_params=ABC_CONFIG if ABC_CONFIG['enabled'] else None,
+        stockout_params=STOCKOUT_CONFIG if STOCKOUT_CONFIG['enabled'] else None
+    )
+    instrumentation = load_instrumentation()
+    if instrumentation is not None:
+        # Загрузчики источников замеряются отдельно от запросов
+        instrument_methods(
+            handler, instrumentation, 'DataHandler.',
+            extra=['_load_sales', '_load_products_data', '_load_inventory_data', '_load_payments_data']
+        )
+    if DATA_CONFIG['auto_refresh']:
+        handler.start_refresh_worker(UPDATE_CONFIG['auto_update_interval'])
+    # Симуляция дефицита считается в фоне с момента загрузки, раздел склада её только читает
+    handler.start_stockout_simulation()
+    return handler
+
+# Загрузка из API одна на процесс: несколько клиентов на одном каталоге данных
+# дописывали бы одни и те же файлы. Загрузка дописывает исходные файлы и сразу
+# обновляет обработчик, который подставляется при каждом запуске скрипта
+@st.cache_resource
+def load_ingest_client(data_path):
+    if not INGEST_CONFIG['url']:
+        return None
+    from modules.ingest import IngestClient
+    client = IngestClient(
+        INGEST_CONFIG['url'],
+        data_path,
+        token=os.environ.get(INGEST_CONFIG['token_env']),
+        concurrency=INGEST_CONFIG['concurrency'],
+        page_size=INGEST_CONFIG['page_size'],
+        rate_per_second=INGEST_CONFIG['rate_per_second'],
+        window_days=INGEST_CONFIG['window_days'],
+        history_days=INGEST_CONFIG['history_days']
+    )
+    client.start_worker(INGEST_CONFIG['interval_seconds'])
+    return client
+
+# Построенные графики общие для всех сессий: ключ - график, фильтры, обработчик и версия данных
+@st.cache_resource
+def load_figure_cache():
+    return FigureCache(CHART_CONFIG['figure_cache_bytes'])
+
+# Пул потоков выгрузок общий для всех сессий
+@st.cache_resource
+def load_exporter():
+    return Exporter(
+        export_dir=EXPORT_CONFIG['export_dir'],
+        max_workers=EXPORT_CONFIG['max_workers'],
+        chunk_rows=EXPORT_CONFIG['chunk_rows'],
+        max_age_seconds=EXPORT_CONFIG['max_age_seconds']
+    )
 
+# HTTP API данных один на процесс. Обработчик подставляется при каждом запуске
+# скрипта, поэтому API отвечает по тому же снимку данных, что и дашборд
+@st.cache_resource
+def load_api_server():
+    if not API_CONFIG['enabled']:
+        return None
+    from modules.data_api import ApiServer, DataApi
+    return ApiServer(
+        DataApi(threads=API_CONFIG['threads'], body_cache_bytes=API_CONFIG['body_cache_bytes']),
+        host=API_CONFIG['host'],
+        port=API_CONFIG['port']
+    ).start()
+
+instrumentation = load_instrumentation()
 data_handler = load_data()
+figure_cache = load_figure_cache()
+exporter = load_exporter()
+api_server = load_api_server()
+if api_server is not None:
+    api_server.app.handler = data_handler
+ingest_client = load_ingest_client(data_handler.data_path)
+if ingest_client is not None:
+    ingest_client.handler = data_handler
+rerun_started = time.perf_counter()
+
+
+def measured(name):
+    """Замер блока скрипта при включённой диагностике"""
+    return instrumentation.timer(name) if instrumentation is not None else nullcontext()
+
+
+def data_key():
+    """Ключ данных для кэша фигур: версия данных пересозданного обработчика снова начинается с нуля"""
+    return data_handler.instance_id, data_handler.data_version
+
+
+def show_chart(chart, fig):
+    """Вывод графика: отдельно замеряется сериализация фигуры в Streamlit"""
+    with measured('chart:' + chart):
+        st.plotly_chart(fig, use_container_width=True)
+
+
+def get_query_param(name):
+    """Значение параметра адресной строки (API Streamlit разных версий)"""
+    if hasattr(st, 'query_params'):
+        return st.query_params.get(name)
+    values = st.experimental_get_query_params().get(name)
+    return values[0] if values else None
+
+
+def render_diagnostics_page():
+    """Скрытая страница диагностики: ?diagnostics=1 в адресе дашборда"""
+    import json
+
+    st.title("🛠️ Диагностика")
+    st.caption(f"Замеры с {instrumentation.started_at.strftime('%d.%m.%Y %H:%M:%S')}")
+    stats = instrumentation.stats()
+    st.subheader("Методы и разделы")
+    st.dataframe(
+        [{'имя': name, **values} for name, values in stats.items()],
+        use_container_width=True,
+        hide_index=True
+    )
+    st.subheader("Графики")
+    st.dataframe(
+        [{'график': chart, **values} for chart, values in figure_cache.stats().items()],
+        use_container_width=True,
+        hide_index=True
+    )
+    st.subheader("Кэш запросов")
+    st.json(data_handler.query_cache.stats())
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.download_button(
+            "Скачать JSON",
+            instrumentation.to_json(),
+            file_name=f"diagnostics_{datetime.now():%Y%m%d_%H%M%S}.json",
+            mime="application/json"
+        )
+    with col2:
+        if st.button("Сбросить замеры"):
+            instrumentation.reset()
+            st.rerun()
+    with col3:
+        if st.button("Профилировать следующий запуск"):
+            instrumentation.capture_next = True
+        if instrumentation.capture_next:
+            st.caption("Профиль снимется при следующем запуске дашборда")
+
+    capture = instrumentation.last_capture
+    if capture is not None:
+        st.subheader(f"Профиль запуска {capture['captured_at']}: {capture['seconds']} с")
+        st.caption(f"Пик отслеживаемой памяти: {capture['peak_traced_bytes'] / 1024 ** 2:.1f} МБ")
+        st.dataframe(capture['allocations'], use_container_width=True, hide_index=True)
+        st.code(capture['profile'])
+        st.download_button(
+            "Скачать профиль",
+            json.dumps(capture, ensure_ascii=False, indent=2),
+            file_name="profile.json",
+            mime="application/json"
+        )
+
+
+if instrumentation is not None:
+    if get_query_param(DIAGNOSTICS_CONFIG['query_param']):
+        render_diagnostics_page()
+        st.stop()
+    # Профиль прерванного запуска закрывается, не дожидаясь конца скрипта
+    if instrumentation.capturing:
+        instrumentation.stop_capture()
+    if instrumentation.capture_next:
+        instrumentation.start_capture()
+
+def format_number(value):
+    """Число с разделителем разрядов, '-' для пустых значений"""
+    if value is None or value == 0:
+        return "-"
+    return f"{value:,.0f}".replace(",", " ")
+
+
+def format_units(value):
+    """Количество в штуках, включая ноль"""
+    return f"{value:,.0f} шт".replace(",", " ")
+
+
+def format_price(value, decimals=0):
+    """Сумма в рублях в русском формате"""
+    if value is None:
+        return "-"
+    return "₽" + f"{value:,.{decimals}f}".replace(",", " ").replace(".", ",")
+
 
 # Заголовок
 st.title("📦 Дашборд склада")
@@ -27,6 +234,17 @@ st.title("📦 Дашборд склада")
 # Боковая панель с фильтрами
 st.sidebar.header("Фильтры")
 
+# Выбор товара: поиск по артикулу, названию и коду WB через индекс каталога
+product_query = st.sidebar.text_input("Поиск товара", placeholder="Артикул, название или код WB")
+product_options = data_handler.search_products(product_query, limit=50)
+product_id = st.sidebar.selectbox(
+    "Товар",
+    product_options,
+    format_func=lambda pid: f"{pid} - {data_handler.get_product_record(pid).title}"
+)
+if product_id is None:
+    st.sidebar.info("Товары не найдены")
+
 # Фильтр периода
 period = st.sidebar.selectbox(
     "Период",
@@ -49,237 +267,503 @@ size_filter = st.sidebar.selectbox(
     index=3  # по умолчанию M
 )
 
-# Основная область дашборда
-st.markdown("---")
-
-# Раздел 1: ТОВАРЫ ПРОДАЖИ
-st.header("📈 ТОВАРЫ ПРОДАЖИ")
-
-col1, col2, col3, col4 = st.columns(4)
-
-with col1:
-    st.metric(
-        label="Продажи за месяц",
-        value="3 154 шт",
-        delta="+22%"
-    )
-
-with col2:
-    st.metric(
-        label="Упущенные продажи",
-        value="570 шт"
-    )
-
-with col3:
-    st.metric(
-        label="Текущий остаток",
-        value="13 454 шт"
-    )
-
-with col4:
-    st.metric(
-        label="Рекомендованный запас",
-        value="16 000 шт"
-    )
-
-# График продаж по дням
-col1, col2 = st.columns([2, 1])
-
-with col1:
-    st.subheader("Продажи по дням")
-    # Создание примера данных для графика
-    dates = pd.date_range(start='2024-05-01', end='2024-06-30', freq='D')
-    sales_data = np.random.randint(20, 60, len(dates))
-    
-    fig_sales = px.line(
-        x=dates, 
-        y=sales_data,
-        title="Динамика продаж",
-        labels={'x': 'Дата', 'y': 'Продажи (шт)'}
-    )
-    fig_sales.update_layout(
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)'
-    )
-    st.plotly_chart(fig_sales, use_container_width=True)
-
-with col2:
-    st.subheader("Фактический остаток и рекомендованный запас по размерам")
-    # Данные для круговой диаграммы
-    sizes_data = {
-        'Размер': ['XS', 'S', 'M', 'L', 'XL', 'XXL'],
-        'Процент': [15, 35, 33, 18, 14, 5]
-    }
-    
-    fig_pie = px.pie(
-        values=sizes_data['Процент'],
-        names=sizes_data['Размер'],
-        title="Распределение по размерам"
-    )
-    st.plotly_chart(fig_pie, use_container_width=True)
-
-# Карточка товара
-st.subheader("Карточка товара")
-col1, col2, col3 = st.columns([1, 2, 1])
-
-with col1:
-    st.image("https://via.placeholder.com/150x150?text=Фото+товара", caption="Фото товара")
-
-with col2:
-    st.write("**Заголовок карточки:** Футболка хлопок однотонная базовая")
-    st.write("**Артикул:** tshirtwhite")
-    st.write("**Количество товара в комплекте:** 1")
-    st.write("**Код Wb:** 76280452")
-    st.write("**Заказы (шт):** 5046")
-    st.write("**Заказы по отношению к предыдущему периоду:** +347")
-    st.write("**Размер:** M")
-
-with col3:
-    st.write("**План на месяц:** -")
-    st.write("**План на день:** -")
-
-st.markdown("---")
-
-# Раздел 2: ТОВАРЫ НА СКЛАДЕ
-st.header("📦 ТОВАРЫ НА СКЛАДЕ")
-
-col1, col2 = st.columns(2)
-
-with col1:
-    st.subheader("Информация о товаре")
-    st.write("**Название:** Футболки")
-    st.write("**Себестоимость товара:** ₽495,00")
-    st.write("**На складе Wb:** -")
-    st.write("**В пути к клиенту:** 1 577")
-    st.write("**В пути от клиента:** 566")
-    st.write("**На своих складах:** 3 500")
-    st.write("**Товар в пути:** 15 510")
-
-with col2:
-    st.subheader("Прогнозы и планирование")
-    st.write("**Поставка ожидается:** 30.08.25")
-    st.write("**Стоимость товара:** ₽14 975 221")
-    st.write("**Средняя продажа за период:** день")
-    st.write("**Товара хватит:** 1497 дней")
-    st.write("**Товар закончится:** 08.04.2029")
-    st.write("**Дата обновления данных:** 23 минуты назад")
-
-# Календарь наличия товара
-st.subheader("Наличие товара по дням")
-# Создание календарной тепловой карты
-calendar_data = np.random.choice([0, 1, 2], size=(5, 7), p=[0.1, 0.3, 0.6])
-fig_calendar = px.imshow(
-    calendar_data,
-    color_continuous_scale=['red', 'yellow', 'green'],
-    title="Календарь наличия товара (красный - нет, желтый - мало, зеленый - достаточно)"
-)
-fig_calendar.update_layout(
-    xaxis_title="Дни недели",
-    yaxis_title="Недели"
+# Выгрузка таблиц с текущими фильтрами: файл пишется в фоне,
+# ход записи выводится в конце скрипта, когда раздел уже построен
+st.sidebar.header("Экспорт")
+EXPORT_TABLES = {
+    "Продажи за период": ('sales', lambda: data_handler.get_sales_by_period(period, abc_filter, size_filter)),
+    "Прогноз по SKU": ('forecast', lambda: data_handler.get_forecast_data()),
+    "Оплаты": ('payments', lambda: data_handler.payments_data)
+}
+export_table = st.sidebar.selectbox("Таблица", list(EXPORT_TABLES))
+export_format = st.sidebar.selectbox(
+    "Формат",
+    EXPORT_CONFIG['formats'],
+    index=EXPORT_CONFIG['formats'].index(EXPORT_CONFIG['default_format'])
 )
-st.plotly_chart(fig_calendar, use_container_width=True)
-
-st.markdown("---")
-
-# Раздел 3: ТОВАРЫ В ПУТИ
-st.header("🚚 ТОВАРЫ В ПУТИ")
-
-col1, col2, col3, col4 = st.columns(4)
-
-with col1:
-    st.metric(
-        label="Название фабрики (поставщик)",
-        value="-"
-    )
-
-with col2:
-    st.metric(
-        label="Количество",
-        value="15 510"
-    )
-
-with col3:
-    st.metric(
-        label="Дата прибытия",
-        value="30.08.25"
-    )
-
-with col4:
-    st.metric(
-        label="Статус",
-        value="В пути"
+if st.sidebar.button("Подготовить файл"):
+    export_name, get_table = EXPORT_TABLES[export_table]
+    st.session_state['export_job'] = exporter.submit(get_table(), export_name, export_format)
+export_status = st.sidebar.empty()
+
+
+# Разделы дашборда. Каждый раздел запрашивает только свои данные
+# и строится только когда он выбран
+
+def render_sales_section():
+    """Раздел 1: ТОВАРЫ ПРОДАЖИ"""
+    import plotly.express as px
+
+    st.header("📈 ТОВАРЫ ПРОДАЖИ")
+
+    # Метрики за период и сравнение с предыдущим периодом той же длины
+    metrics = data_handler.get_sales_metrics(period, abc_filter, size_filter)
+    col1, col2, col3, col4 = st.columns(4)
+
+    with col1:
+        st.metric(
+            label=f"Продажи за {period}",
+            value=format_units(metrics['total_sales']),
+            delta=f"{metrics['change_percent']:+.0f}%" if metrics['change_percent'] is not None else None
+        )
+
+    with col2:
+        st.metric(
+            label="Упущенные продажи",
+            value=format_units(metrics['missed_sales'])
+        )
+
+    with col3:
+        st.metric(
+            label="Текущий остаток",
+            value=format_units(metrics['current_stock'])
+        )
+
+    with col4:
+        st.metric(
+            label="Рекомендованный запас",
+            value=format_units(metrics['recommended_stock'])
+        )
+
+    # График продаж по дням
+    col1, col2 = st.columns([2, 1])
+
+    with col1:
+        st.subheader("Продажи по дням")
+
+        def build_sales_chart():
+            # Продажи по дням из дневного агрегата с учетом фильтров,
+            # прореженные до числа точек, различимого на ширине графика
+            daily_sales = data_handler.get_daily_sales(period, abc_filter, size_filter)
+            shown = downsample(
+                daily_sales,
+                max_points_for_width(CHART_CONFIG['width_px'], CHART_CONFIG['points_per_px']),
+                CHART_CONFIG['downsampling']
+            )
+            fig_sales = px.line(
+                shown.reset_index(),
+                x='date',
+                y='sales',
+                title="Динамика продаж",
+                labels={'date': 'Дата', 'sales': 'Продажи (шт)'}
+            )
+            fig_sales.update_layout(
+                plot_bgcolor='rgba(0,0,0,0)',
+                paper_bgcolor='rgba(0,0,0,0)'
+            )
+            return fig_sales, {'points': len(daily_sales), 'shown': len(shown)}
+
+        fig_sales = figure_cache.get(
+            'daily_sales', (period, abc_filter, size_filter), data_key(), build_sales_chart
+        )
+        show_chart('daily_sales', fig_sales)
+
+    with col2:
+        st.subheader("Фактический остаток и рекомендованный запас по размерам")
+
+        def build_size_chart():
+            # Доли продаж по размерам за период
+            size_distribution = data_handler.get_size_distribution(period, abc_filter)
+            return px.pie(
+                values=list(size_distribution.values()),
+                names=list(size_distribution.keys()),
+                title="Распределение по размерам"
+            )
+
+        fig_pie = figure_cache.get(
+            'size_distribution', (period, abc_filter), data_key(), build_size_chart
+        )
+        show_chart('size_distribution', fig_pie)
+
+    # Карточка товара
+    st.subheader("Карточка товара")
+    product = data_handler.get_product_record(product_id)
+    col1, col2, col3 = st.columns([1, 2, 1])
+
+    if product is None:
+        st.info("Товар не выбран")
+        return
+
+    with col1:
+        st.image(product.photo_url or "https://via.placeholder.com/150x150?text=Фото+товара", caption="Фото товара")
+
+    with col2:
+        st.write(f"**Заголовок карточки:** {product.title}")
+        st.write(f"**Артикул:** {product.article}")
+        st.write(f"**Количество товара в комплекте:** {product.quantity_in_set or '-'}")
+        st.write(f"**Код Wb:** {product.wb_code or '-'}")
+        st.write(f"**Заказы (шт):** {product.orders if product.orders is not None else '-'}")
+        st.write(f"**Заказы по отношению к предыдущему периоду:** {product.orders_change or 0:+d}")
+        st.write(f"**Размер:** {size_filter if size_filter != 'Все' else product.default_size or '-'}")
+
+    with col3:
+        st.write(f"**План на месяц:** {format_number(product.monthly_plan)}")
+        st.write(f"**План на день:** {format_number(product.daily_plan)}")
+
+
+def render_inventory_section():
+    """Раздел 2: ТОВАРЫ НА СКЛАДЕ"""
+    import plotly.express as px
+
+    st.header("📦 ТОВАРЫ НА СКЛАДЕ")
+
+    inventory = data_handler.get_inventory_record(product_id)
+    col1, col2 = st.columns(2)
+
+    if inventory is None:
+        st.info("Нет данных об остатках товара")
+    else:
+        with col1:
+            st.subheader("Информация о товаре")
+            st.write(f"**Название:** {inventory.name}")
+            st.write(f"**Себестоимость товара:** {format_price(inventory.cost_price, decimals=2)}")
+            st.write(f"**На складе Wb:** {format_number(inventory.wb_warehouse)}")
+            st.write(f"**В пути к клиенту:** {format_number(inventory.to_client)}")
+            st.write(f"**В пути от клиента:** {format_number(inventory.from_client)}")
+            st.write(f"**На своих складах:** {format_number(inventory.own_warehouses)}")
+            st.write(f"**Товар в пути:** {format_number(inventory.in_transit)}")
+
+        with col2:
+            st.subheader("Прогнозы и планирование")
+            # Дни запаса и дата окончания товара из прогноза остатков
+            st.write(f"**Поставка ожидается:** {inventory.expected_delivery or '-'}")
+            st.write(f"**Стоимость товара:** {format_price(inventory.total_value)}")
+            st.write(f"**Средняя продажа за период:** {inventory.avg_sales_period or '-'}")
+            st.write("**Товара хватит:** " + (f"{inventory.days_remaining} дней" if inventory.days_remaining is not None else "-"))
+            st.write(f"**Товар закончится:** {inventory.end_date or '-'}")
+            if UPDATE_CONFIG['show_last_update']:
+                st.write(f"**Дата обновления данных:** {data_handler.updated_at.strftime(UPDATE_CONFIG['update_format'])}")
+
+    # Календарь наличия товара
+    st.subheader("Наличие товара по дням")
+
+    def build_calendar_chart():
+        # Календарная тепловая карта по проекции остатков (с понедельника текущей недели)
+        calendar_data = data_handler.get_calendar_data(product_id)
+        week_start = datetime.now().date() - timedelta(days=datetime.now().weekday())
+        fig_calendar = px.imshow(
+            calendar_data,
+            x=['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс'],
+            y=[(week_start + timedelta(weeks=i)).strftime('%d.%m') for i in range(len(calendar_data))],
+            zmin=0,
+            zmax=2,
+            color_continuous_scale=['red', 'yellow', 'green'],
+            title="Календарь наличия товара (красный - нет, желтый - мало, зеленый - достаточно)"
+        )
+        fig_calendar.update_layout(
+            xaxis_title="Дни недели",
+            yaxis_title="Недели"
+        )
+        return fig_calendar
+
+    fig_calendar = figure_cache.get('calendar', (product_id,), data_key(), build_calendar_chart)
+    show_chart('calendar', fig_calendar)
+
+    # Риск дефицита: симуляция считается один раз на версию данных в фоне, здесь только читается
+    risk = data_handler.get_stockout_risk(product_id)
+    if risk is None:
+        if data_handler.stockout_pending():
+            st.info("Риск дефицита рассчитывается, он появится после обновления страницы")
+        return
+    st.subheader("Риск дефицита")
+    summary = risk['product']
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric(
+            label=f"Закончится за {len(risk['probability'])} дней",
+            value=f"{summary['stockout_probability'] * 100:.0f}%"
+        )
+    for column, percentile in zip([col2, col3, col4], [10, 50, 90]):
+        with column:
+            days = summary[f'cover_p{percentile}']
+            st.metric(
+                label=f"Товара хватит, P{percentile}",
+                value=f"{days:.0f} дней" if days != float('inf') else "весь горизонт"
+            )
+
+    def build_stockout_chart():
+        # Доля сценариев, в которых товара нет на дату
+        probability = risk['probability'] * 100
+        fig_stockout = px.area(
+            x=probability.index,
+            y=probability.values,
+            title=f"Вероятность отсутствия товара по датам ({risk['n_paths']} сценариев спроса и поставки)",
+            labels={'x': 'Дата', 'y': 'Вероятность, %'}
+        )
+        fig_stockout.update_layout(
+            yaxis_range=[0, 100],
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)'
+        )
+        return fig_stockout
+
+    fig_stockout = figure_cache.get('stockout', (product_id,), data_key(), build_stockout_chart)
+    show_chart('stockout', fig_stockout)
+
+    st.dataframe(
+        risk['skus'][['size', 'stockout_probability', 'cover_p10', 'cover_p50', 'cover_p90']].rename(columns={
+            'size': 'Размер',
+            'stockout_probability': 'Вероятность закончиться',
+            'cover_p10': 'Дней запаса P10',
+            'cover_p50': 'Дней запаса P50',
+            'cover_p90': 'Дней запаса P90'
+        }),
+        use_container_width=True,
+        hide_index=True
     )
 
-# Таблица остатков и прогнозов
-st.subheader("Таблица остатков и прогнозов")
-forecast_data = {
-    'SKU': ['S10', 'S11', 'S21', 'S22', 'S23', 'S24'],
-    'Средняя оценка': [3.8, 3.8, 5.9, 6.8, 5.7, 5.1],
-    'Дни отсутствия': ['-', 3, 1, 8, 3, 8],
-    'Упущенные продажи': [66, 119, 188, 228, 328, 528]
-}
-
-df_forecast = pd.DataFrame(forecast_data)
-st.dataframe(df_forecast, use_container_width=True)
 
-# Доля упущенных продаж
-st.subheader("Доля упущенных продаж")
-missed_sales_data = {
-    'Размер': ['SS', 'M', 'XL', 'XXL', 'XXXL'],
-    'Процент': [35, 33, 16, 14, 5]
+def render_transit_section():
+    """Раздел 3: ТОВАРЫ В ПУТИ"""
+    import plotly.express as px
+
+    st.header("🚚 ТОВАРЫ В ПУТИ")
+
+    inventory = data_handler.get_inventory_record(product_id)
+    col1, col2, col3, col4 = st.columns(4)
+
+    with col1:
+        st.metric(
+            label="Название фабрики (поставщик)",
+            value="-"
+        )
+
+    with col2:
+        st.metric(
+            label="Количество",
+            value=format_number(inventory.in_transit if inventory else None)
+        )
+
+    with col3:
+        st.metric(
+            label="Дата прибытия",
+            value=(inventory.expected_delivery if inventory else None) or "-"
+        )
+
+    with col4:
+        st.metric(
+            label="Статус",
+            value="В пути"
+        )
+
+    # Таблица остатков и прогнозов
+    st.subheader("Таблица остатков и прогнозов")
+    forecast_data = data_handler.get_forecast_data(product_id)
+
+    df_forecast = forecast_data[
+        ['SKU', 'velocity', 'stock', 'days_of_cover', 'stockout_date', 'days_out', 'missed_sales']
+    ].rename(columns={
+        'velocity': 'Средние продажи в день',
+        'stock': 'Остаток',
+        'days_of_cover': 'Дней запаса',
+        'stockout_date': 'Товар закончится',
+        'days_out': 'Дни отсутствия',
+        'missed_sales': 'Упущенные продажи'
+    })
+    st.dataframe(df_forecast, use_container_width=True)
+
+    # Доля упущенных продаж
+    st.subheader("Доля упущенных продаж")
+
+    def build_missed_chart():
+        missed_sales_data = data_handler.get_missed_sales_distribution(product_id)
+        return px.pie(
+            values=list(missed_sales_data.values()),
+            names=list(missed_sales_data.keys()),
+            title="Распределение упущенных продаж по размерам"
+        )
+
+    fig_missed = figure_cache.get('missed_sales', (product_id,), data_key(), build_missed_chart)
+    show_chart('missed_sales', fig_missed)
+
+
+def render_payments_section():
+    """Раздел 4: ОПЛАТА"""
+    import plotly.express as px
+
+    st.header("💰 ОПЛАТА")
+
+    # Суммы по периодам, денежный поток и следующие оплаты считаются
+    # один раз на версию данных
+    analytics = data_handler.get_payment_analytics()
+    metrics = data_handler.get_payment_metrics()
+
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        st.metric(
+            label="Общая сумма оплат",
+            value=format_price(metrics['total_payments'])
+        )
+
+    with col2:
+        st.metric(
+            label="Средняя оплата в месяц",
+            value=format_price(metrics['avg_monthly'])
+        )
+
+    with col3:
+        st.metric(
+            label="Следующая оплата",
+            value=metrics['next_payment_date'] or "-"
+        )
+        if metrics['next_payment_date']:
+            st.caption(f"{metrics['next_payment_type']}, около {format_price(metrics['next_payment_amount'])}")
+
+    st.subheader("График оплат")
+    granularity = st.radio("Группировка", list(analytics['totals']), horizontal=True, key="payments_granularity")
+
+    def build_payments_chart():
+        # Суммы по периодам в разрезе типов оплат
+        totals = analytics['totals'][granularity]
+        fig_payments = px.bar(
+            totals,
+            x=totals.index,
+            y=list(totals.columns),
+            title="График оплат по типам",
+            labels={'date': 'Период', 'value': 'Сумма оплат (₽)', 'type': 'Тип оплаты'}
+        )
+        fig_payments.update_layout(
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)'
+        )
+        return fig_payments
+
+    fig_payments = figure_cache.get('payments', (granularity,), data_key(), build_payments_chart)
+    show_chart('payments', fig_payments)
+
+    col1, col2 = st.columns([2, 1])
+
+    with col1:
+        st.subheader("Денежный поток")
+
+        def build_cash_flow_chart():
+            # Накопленная сумма оплат по дням, прореженная до ширины графика
+            cumulative = analytics['cash_flow']['cumulative']
+            shown = downsample(
+                cumulative,
+                max_points_for_width(CHART_CONFIG['width_px'], CHART_CONFIG['points_per_px']),
+                CHART_CONFIG['downsampling']
+            )
+            fig_cash_flow = px.line(
+                shown.reset_index(),
+                x='date',
+                y='cumulative',
+                title="Накопленная сумма оплат",
+                labels={'date': 'Дата', 'cumulative': 'Сумма (₽)'}
+            )
+            fig_cash_flow.update_layout(
+                plot_bgcolor='rgba(0,0,0,0)',
+                paper_bgcolor='rgba(0,0,0,0)'
+            )
+            return fig_cash_flow, {'points': len(cumulative), 'shown': len(shown)}
+
+        fig_cash_flow = figure_cache.get('cash_flow', (), data_key(), build_cash_flow_chart)
+        show_chart('cash_flow', fig_cash_flow)
+
+    with col2:
+        st.subheader("Следующие оплаты")
+        upcoming = analytics['next_payments']
+        st.dataframe(
+            {
+                'Тип': list(upcoming.index),
+                'Дата': [d.strftime('%d.%m.%Y') if d == d else "-" for d in upcoming['next_date']],
+                'Сумма': [format_price(v) for v in upcoming['expected_amount']],
+                'Интервал, дн': [f"{v:.0f}" if v == v else "-" for v in upcoming['cadence_days']]
+            },
+            use_container_width=True,
+            hide_index=True
+        )
+
+
+SECTIONS = {
+    "📈 Продажи": render_sales_section,
+    "📦 Склад": render_inventory_section,
+    "🚚 В пути": render_transit_section,
+    "💰 Оплата": render_payments_section
 }
 
-fig_missed = px.pie(
-    values=missed_sales_data['Процент'],
-    names=missed_sales_data['Размер'],
-    title="Распределение упущенных продаж по размерам"
+section = st.radio(
+    "Раздел",
+    list(SECTIONS),
+    horizontal=True,
+    key="section",
+    label_visibility="collapsed"
 )
-st.plotly_chart(fig_missed, use_container_width=True)
 
 st.markdown("---")
 
-# Раздел 4: ОПЛАТА
-st.header("💰 ОПЛАТА")
-
-st.subheader("График оплат")
-# Создание примера данных для графика оплат
-payment_dates = pd.date_range(start='2024-01-01', end='2024-12-31', freq='M')
-payment_amounts = np.random.randint(50000, 200000, len(payment_dates))
-
-fig_payments = px.bar(
-    x=payment_dates,
-    y=payment_amounts,
-    title="График оплат по месяцам",
-    labels={'x': 'Месяц', 'y': 'Сумма оплат (₽)'}
-)
-fig_payments.update_layout(
-    plot_bgcolor='rgba(0,0,0,0)',
-    paper_bgcolor='rgba(0,0,0,0)'
-)
-st.plotly_chart(fig_payments, use_container_width=True)
-
-# Дополнительная информация об оплатах
-col1, col2, col3 = st.columns(3)
-
-with col1:
-    st.metric(
-        label="Общая сумма оплат",
-        value="₽1 245 000"
-    )
-
-with col2:
-    st.metric(
-        label="Средняя оплата в месяц",
-        value="₽103 750"
-    )
-
-with col3:
-    st.metric(
-        label="Следующая оплата",
-        value="15.08.2024"
-    )
+with measured('section:' + section):
+    SECTIONS[section]()
+
+# Время построения и объём графиков, отправляемых в браузер
+if CHART_CONFIG['show_chart_stats']:
+    with st.expander("Статистика графиков"):
+        st.dataframe(
+            [{'график': chart, **stats} for chart, stats in figure_cache.stats().items()],
+            use_container_width=True
+        )
+
+def render_export_status(job):
+    """Ход выгрузки и кнопка скачивания готового файла
+
+    Прогресс выводится один раз за запуск, выгрузка продолжается в пуле.
+    Файл передаётся кнопке открытым дескриптором, без копии в скрипте.
+    """
+    if not job.done:
+        st.progress(
+            job.progress,
+            text=f"Записано {job.rows_written:,} из {job.total_rows:,} строк".replace(",", " ")
+        )
+        return
+    if job.error is not None:
+        st.error(f"Ошибка выгрузки: {job.error}")
+        return
+    try:
+        f = open(job.path, 'rb')
+    except OSError:
+        # Файл удалён по сроку хранения
+        del st.session_state['export_job']
+        return
+    with f:
+        st.download_button(f"Скачать {job.file_name}", f, file_name=job.file_name, mime=job.mime)
+    st.caption(f"{job.total_rows:,} строк за {job.seconds:.1f} с".replace(",", " "))
+
+
+def poll_export_status(job):
+    """Прогресс выгрузки, обновляемый фрагментом без перезапуска страницы
+
+    Когда файл готов, страница перезапускается целиком, и кнопка
+    скачивания выводится уже без опроса.
+    """
+    if job.done:
+        st.rerun()
+    render_export_status(job)
+
+
+# В версиях Streamlit без st.fragment прогресс обновляется перезапуском
+# всего скрипта в его конце
+export_pending = False
+if 'export_job' in st.session_state:
+    export_job = st.session_state['export_job']
+    with export_status.container():
+        if export_job.done:
+            render_export_status(export_job)
+        elif hasattr(st, 'fragment'):
+            st.fragment(run_every=EXPORT_CONFIG['poll_seconds'])(poll_export_status)(export_job)
+        else:
+            render_export_status(export_job)
+            export_pending = True
 
 # Футер
 st.markdown("---")
 st.markdown("*Дашборд обновлен: " + datetime.now().strftime("%d.%m.%Y %H:%M") + "*")
 
+if instrumentation is not None:
+    instrumentation.record('rerun', time.perf_counter() - rerun_started)
+    if instrumentation.capturing:
+        instrumentation.stop_capture()
+
+if export_pending:
+    time.sleep(EXPORT_CONFIG['poll_seconds'])
+    st.rerun()
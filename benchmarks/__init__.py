@@ -0,0 +1 @@
+# Бенчмарки модулей дашборда склада
@@ -0,0 +1,95 @@
+"""
+ABC классификация по выручке на большом каталоге
+
+    python -m benchmarks.bench_abc --products 200000
+
+Дневной агрегат строится поверх синтетических массивов (по SKU на товар),
+себестоимость - словарь products.json. Замеряются цены, выручка за окно,
+сортировка с накопленной долей, полная классификация, классы для колонки
+строк продаж и пересчёт после дозаписи дня продаж. Цель - полная
+классификация 200 тыс. товаров заметно быстрее секунды.
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+
+def make_rollup(n_products, days, seed=0):
+    """Агрегат по SKU (товар x размер) с продажами по закону Ципфа"""
+    from benchmarks.common import SIZES
+    from modules.rollup import DailyRollup
+
+    rng = np.random.default_rng(seed)
+    products = ['P%06d' % i for i in range(n_products)]
+    sku_product = np.arange(n_products, dtype=np.int32)
+    sku_size = rng.integers(0, len(SIZES), n_products).astype(np.int32)
+    rate = 50.0 / np.arange(1, n_products + 1) ** 0.8
+    daily = rng.poisson(rate[rng.permutation(n_products)], size=(days, n_products))
+    prefix = np.zeros((days + 1, n_products), dtype=np.int32)
+    np.cumsum(daily, axis=0, out=prefix[1:])
+    rollup = DailyRollup.from_arrays(
+        '2024-01-01', products, SIZES,
+        product_abc=np.zeros(n_products, dtype=np.int8),
+        sku_product=sku_product, sku_size=sku_size, prefix=prefix
+    )
+    products_data = {
+        product_id: {'cost_price': float(price)}
+        for product_id, price in zip(products, rng.uniform(100, 5000, n_products).round(2))
+    }
+    return rollup, products_data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=200_000)
+    parser.add_argument('--days', type=int, default=120)
+    parser.add_argument('--window-days', type=int, default=90)
+    parser.add_argument('--rows', type=int, default=1_000_000, help='строк продаж для классов колонки')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    from benchmarks.common import time_call
+    from modules.abc_analysis import classify_products, classify_revenue, product_prices, product_revenue
+
+    rollup, products_data = make_rollup(args.products, args.days)
+    prices = product_prices(products_data, rollup.products)
+    revenue = product_revenue(rollup, prices, args.window_days)
+    classes = classify_products(rollup, products_data, args.window_days)
+    labelled = rollup.with_abc(classes)
+    rng = np.random.default_rng(1)
+    product_ids = pd.Categorical.from_codes(rng.integers(0, args.products, args.rows), categories=rollup.products)
+
+    print('товаров: %d, дней: %d, окно: %d дней' % (args.products, args.days, args.window_days))
+    print('классы A/B/C: %s' % '/'.join(str(n) for n in np.bincount(classes, minlength=3)))
+    steps = {
+        'цены из products.json': lambda: product_prices(products_data, rollup.products),
+        'выручка за окно': lambda: product_revenue(rollup, prices, args.window_days),
+        'сортировка и доли': lambda: classify_revenue(revenue),
+        'классификация целиком': lambda: classify_products(rollup, products_data, args.window_days),
+        'классы %d строк' % args.rows: lambda: labelled.abc_codes(product_ids)
+    }
+    for name, step in steps.items():
+        p50, p95 = time_call(step, repeat=args.repeat)
+        print('  %-28s%10.1f мс (p95 %.1f мс)' % (name, p50, p95))
+
+    # Дозапись дня продаж и пересчёт классов с прежними ценами, как в DataHandler.append_sales
+    day = pd.Timestamp(rollup.end_day) + pd.Timedelta(days=1)
+    new_rows = pd.DataFrame({
+        'date': day,
+        'product_id': pd.Categorical.from_codes(rng.integers(0, args.products, 10_000), categories=rollup.products),
+        'size': 'M',
+        'sales': rng.integers(1, 5, 10_000)
+    })
+
+    def append_and_classify():
+        updated = rollup.copy()
+        updated.add(new_rows)
+        return updated.with_abc(classify_products(updated, products_data, args.window_days, prices=prices))
+
+    p50, p95 = time_call(append_and_classify, repeat=args.repeat)
+    print('  %-28s%10.1f мс (p95 %.1f мс)' % ('дозапись дня и пересчёт', p50, p95))
+
+
+if __name__ == '__main__':
+    main()
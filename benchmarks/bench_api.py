@@ -0,0 +1,212 @@
+"""
+Нагрузка на HTTP API данных: запросы в секунду и p99 задержки
+
+    python -m benchmarks.bench_api --products 1000 --days 730 --concurrency 1 16 64 --seconds 5
+
+Сервер data_api запускается в отдельном процессе на синтетических данных
+и отвечает из одного DataHandler. Клиенты aiohttp отправляют смесь
+запросов дашборда (продажи за период, по дням, метрики, остатки, карточки,
+прогноз, оплаты) с заданным числом запросов в полёте. Три фазы для
+каждого уровня: без If-None-Match (ответы с телом, из кэша ответов по
+ETag), с If-None-Match (повторные запросы получают 304) и с
+If-None-Match, пока в sales.csv каждые --append-seconds дописываются
+строки и фоновое обновление подменяет версию данных. Клиент и сервер
+делят процессор, поэтому абсолютные числа занижены.
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def serve(data_path, port, threads, refresh_interval):
+    """Сервер API в текущем процессе"""
+    import uvicorn
+
+    from modules.data_api import DataApi
+    from modules.data_handler import DataHandler
+
+    handler = DataHandler(data_path=data_path, lazy=False)
+    handler.start_refresh_worker(refresh_interval)
+    uvicorn.run(DataApi(handler, threads=threads), host='127.0.0.1', port=port, access_log=False,
+                log_level='warning')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def request_mix(product_ids, fmt, seed):
+    """Бесконечная последовательность путей запросов со своим seed"""
+    rng = random.Random(seed)
+    products = product_ids[:50]
+    periods = ['день', 'неделя', 'месяц']
+    while True:
+        kind = rng.random()
+        if kind < 0.2:
+            path, params = '/api/sales', {'period': rng.choice(periods), 'abc': rng.choice('ABC'), 'limit': 1000}
+        elif kind < 0.35:
+            path, params = '/api/sales/daily', {'period': 'год', 'abc': rng.choice(['Все', 'A'])}
+        elif kind < 0.55:
+            path, params = '/api/metrics', {'period': rng.choice(periods), 'abc': rng.choice(['Все', 'A', 'B'])}
+        elif kind < 0.7:
+            path, params = '/api/inventory', {'product_id': rng.choice(products)}
+        elif kind < 0.8:
+            path, params = '/api/product', {'product_id': rng.choice(products)}
+        elif kind < 0.95:
+            path, params = '/api/forecast', {'product_id': rng.choice(products)}
+        else:
+            path, params = '/api/payments/metrics', {}
+        params['format'] = fmt
+        yield path + '?' + urlencode(params)
+
+
+async def load(url, product_ids, fmt, concurrency, seconds, revalidate):
+    """Фаза нагрузки: задержки (мс), статусы ответов и байты тел"""
+    import aiohttp
+
+    latencies = []
+    statuses = {}
+    received = 0
+    deadline = time.perf_counter() + seconds
+
+    async def client(session, seed):
+        nonlocal received
+        etags = {}
+        for path in request_mix(product_ids, fmt, seed):
+            if time.perf_counter() >= deadline:
+                return
+            headers = {'If-None-Match': etags[path]} if revalidate and path in etags else {}
+            started = time.perf_counter()
+            async with session.get(url + path, headers=headers) as response:
+                body = await response.read()
+                if 'ETag' in response.headers:
+                    etags[path] = response.headers['ETag']
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[response.status] = statuses.get(response.status, 0) + 1
+            received += len(body)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(session, seed) for seed in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return np.array(latencies), statuses, received, elapsed
+
+
+def append_rows(data_path, product_ids, interval, stop):
+    """Дозапись дня продаж в sales.csv каждые interval секунд"""
+    from modules.synthetic import SyntheticWarehouse
+
+    seed = 100
+    while not stop.wait(interval):
+        seed += 1
+        rows = SyntheticWarehouse(product_ids=product_ids, days=1, seed=seed).sales_frame()
+        with open(os.path.join(data_path, 'sales.csv'), 'a', encoding='utf-8', newline='') as f:
+            rows.to_csv(f, index=False, header=False, date_format='%Y-%m-%d')
+
+
+def wait_ready(url, process, timeout=600):
+    import urllib.error
+    import urllib.request
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('Сервер API завершился с кодом %d' % process.returncode)
+        try:
+            with urllib.request.urlopen(url + '/api/version', timeout=1):
+                return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    raise RuntimeError('Сервер API не ответил за %d с' % timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 64])
+    parser.add_argument('--seconds', type=float, default=5.0, help='длительность каждой фазы')
+    parser.add_argument('--threads', type=int, default=4, help='потоков расчёта ответов на сервере')
+    parser.add_argument('--format', default='json', choices=['json', 'arrow'])
+    parser.add_argument('--append-seconds', type=float, default=1.0,
+                        help='интервал дозаписи продаж в фазе обновления; 0 - без этой фазы')
+    parser.add_argument('--serve', default=None)
+    parser.add_argument('--port', type=int, default=None)
+    args = parser.parse_args()
+
+    refresh_interval = args.append_seconds or 60.0
+    if args.serve:
+        serve(args.serve, args.port, args.threads, refresh_interval)
+        return
+
+    from modules.synthetic import SyntheticWarehouse
+
+    workdir = tempfile.mkdtemp(prefix='bench_api_')
+    warehouse = SyntheticWarehouse(args.products, args.days)
+    rows = warehouse.write(workdir)
+    port = free_port()
+    url = 'http://127.0.0.1:%d' % port
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.bench_api', '--serve', workdir, '--port', str(port),
+         '--threads', str(args.threads), '--append-seconds', str(args.append_seconds)],
+        cwd=PROJECT_DIR
+    )
+    try:
+        started = time.perf_counter()
+        wait_ready(url, process)
+        print('%d товаров, %d дней, %d строк продаж; сервер готов за %.1f с, формат %s' % (
+            args.products, args.days, rows, time.perf_counter() - started, args.format
+        ))
+        phases = [('тело ответа', False, False), ('If-None-Match', True, False)]
+        if args.append_seconds:
+            phases.append(('If-None-Match + дозапись', True, True))
+        print('  %-28s%12s%10s%10s%10s%8s%8s%12s' % (
+            'фаза', 'параллельно', 'запр/с', 'p50, мс', 'p99, мс', '304', 'ошибок', 'МБ/с'
+        ))
+        for name, revalidate, appending in phases:
+            for concurrency in args.concurrency:
+                stop = threading.Event()
+                appender = None
+                if appending:
+                    appender = threading.Thread(
+                        target=append_rows, args=(workdir, warehouse.product_ids[:100], args.append_seconds, stop)
+                    )
+                    appender.start()
+                try:
+                    latencies, statuses, received, elapsed = asyncio.run(load(
+                        url, warehouse.product_ids, args.format, concurrency, args.seconds, revalidate
+                    ))
+                finally:
+                    stop.set()
+                    if appender is not None:
+                        appender.join()
+                errors = sum(count for status, count in statuses.items() if status >= 400)
+                print('  %-28s%12d%10.0f%10.2f%10.2f%7.0f%%%8d%12.1f' % (
+                    name, concurrency, len(latencies) / elapsed, np.percentile(latencies, 50),
+                    np.percentile(latencies, 99), statuses.get(304, 0) / len(latencies) * 100, errors,
+                    received / elapsed / 2 ** 20
+                ))
+    finally:
+        process.terminate()
+        process.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
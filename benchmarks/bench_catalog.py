@@ -0,0 +1,74 @@
+"""
+Бенчмарк каталога товаров: построение индекса, поиск по артикулу и поиск с подсказками
+
+    python -m benchmarks.bench_catalog --sizes 20000 200000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.common import format_bytes, rss_bytes, time_call
+
+WORDS = [
+    'футболка', 'джинсы', 'кроссовки', 'худи', 'платье', 'рубашка', 'куртка',
+    'белый', 'черный', 'синий', 'хлопок', 'оверсайз', 'базовая', 'спортивные',
+    'классические', 'женская', 'мужская', 'детская', 'летняя', 'зимняя'
+]
+
+
+def make_products(n_products, seed=0):
+    """Синтетический products.json на n_products товаров"""
+    rng = np.random.default_rng(seed)
+    titles = rng.integers(0, len(WORDS), (n_products, 4))
+    orders = rng.integers(0, 10000, n_products)
+    return {
+        'art%07d' % i: {
+            'title': ' '.join(WORDS[w] for w in titles[i]),
+            'article': 'art%07d' % i,
+            'wb_code': str(70000000 + i),
+            'orders': int(orders[i]),
+            'sizes': ['S', 'M', 'L'],
+            'cost_price': 500.0
+        }
+        for i in range(n_products)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20000, 200000])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    from modules.catalog import ProductCatalog
+
+    print('%10s %10s %12s %12s %12s %12s %12s' % (
+        'товаров', 'индекс, с', 'память', 'get, мкс', 'префикс, мс', '2 слова, мс', 'код WB, мс'
+    ))
+    for n_products in args.sizes:
+        products = make_products(n_products)
+        rss_before = rss_bytes()
+        started = time.perf_counter()
+        catalog = ProductCatalog(products)
+        build_seconds = time.perf_counter() - started
+        memory = rss_bytes() - rss_before
+
+        ids = catalog.ids
+        rng = np.random.default_rng(1)
+        picks = [ids[i] for i in rng.integers(0, n_products, args.repeat)]
+        picks_iter = iter(picks * 2)
+        get_p50, _ = time_call(lambda: catalog.get(next(picks_iter)), repeat=args.repeat)
+
+        prefix_p50, _ = time_call(lambda: catalog.search('фут', limit=50), repeat=args.repeat)
+        two_words_p50, _ = time_call(lambda: catalog.search('джинсы син', limit=50), repeat=args.repeat)
+        code_p50, _ = time_call(lambda: catalog.search(str(70000000 + n_products // 2)), repeat=args.repeat)
+
+        print('%10d %10.2f %12s %12.2f %12.3f %12.3f %12.3f' % (
+            n_products, build_seconds, format_bytes(memory),
+            get_p50 * 1000, prefix_p50, two_words_p50, code_p50
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Построение графика продаж по дням: прореживание и кэш фигур
+
+    python -m benchmarks.bench_charts --days 1826 3650 --width 900
+
+Для ряда продаж по дням заданной длины замеряются время построения
+фигуры plotly express, время сериализации и объём JSON, который уходит
+в браузер: без прореживания, с LTTB и с min/max до числа точек по
+ширине графика, а также повторный запрос фигуры из FigureCache.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.io
+
+from modules.charts import FigureCache, downsample, max_points_for_width
+
+
+def make_daily_series(days, seed=0):
+    """Продажи по дням с недельной сезонностью, трендом и выбросами"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(days)
+    values = 200 + 0.05 * t + 40 * np.sin(2 * np.pi * t / 7) + rng.normal(0, 15, days)
+    values[rng.integers(0, days, max(1, days // 100))] *= 3
+    return pd.Series(
+        np.maximum(values, 0).round().astype(np.int64),
+        index=pd.DatetimeIndex(pd.date_range(end=pd.Timestamp.today().normalize(), periods=days), name='date'),
+        name='sales'
+    )
+
+
+def build(series):
+    return px.line(series.reset_index(), x='date', y='sales', title="Динамика продаж")
+
+
+def measure(series, method, max_points, repeat=5):
+    """Медиана построения и сериализации в мс и объём JSON"""
+    build_ms = []
+    json_ms = []
+    payload = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        shown = series if method == 'нет' else downsample(series, max_points, method)
+        figure = build(shown)
+        build_ms.append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        payload = len(plotly.io.to_json(figure, validate=False))
+        json_ms.append((time.perf_counter() - started) * 1000)
+    return len(shown), float(np.median(build_ms)), float(np.median(json_ms)), payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--days', type=int, nargs='+', default=[365, 1826, 3650])
+    parser.add_argument('--width', type=int, default=900)
+    parser.add_argument('--points-per-px', type=float, default=1.0)
+    args = parser.parse_args()
+
+    max_points = max_points_for_width(args.width, args.points_per_px)
+    # Прогрев plotly express, чтобы первый замер не включал инициализацию
+    build(make_daily_series(10))
+
+    print('Предел точек: %d (ширина %d px)' % (max_points, args.width))
+    print('%8s %-10s %8s %14s %14s %12s' % ('дней', 'метод', 'точек', 'построение, мс', 'JSON, мс', 'JSON, КБ'))
+    for days in args.days:
+        series = make_daily_series(days)
+        for method in ['нет', 'lttb', 'minmax']:
+            points, build_ms, json_ms, payload = measure(series, method, max_points)
+            print('%8d %-10s %8d %14.1f %14.1f %12.1f' % (days, method, points, build_ms, json_ms, payload / 1024))
+
+        cache = FigureCache()
+        cache.get('daily_sales', (days,), 0, lambda: build(downsample(series, max_points)))
+        calls = 1000
+        started = time.perf_counter()
+        for _ in range(calls):
+            cache.get('daily_sales', (days,), 0, lambda: build(downsample(series, max_points)))
+        hit_ms = (time.perf_counter() - started) * 1000 / calls
+        print('%8d %-10s %8s %14.4f' % (days, 'из кэша', '', hit_ms))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Скорость выгрузки таблицы продаж в CSV, Excel и JSON
+
+    python -m benchmarks.bench_export --rows 100000 1000000 --formats CSV Excel JSON
+
+Для каждого объёма и формата в отдельном процессе строится синтетическая
+таблица продаж и записывается в файл частями (modules.export). Выводятся
+время записи, строк и мегабайт в секунду, размер файла и прирост пиковой
+памяти процесса во время записи - он не должен расти с числом строк.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FORMATS = ['CSV', 'Excel', 'JSON']
+
+
+def measure(export_format, rows, chunk_rows):
+    """Запись одной таблицы в текущем процессе"""
+    from benchmarks.common import make_sales_frame, peak_rss_bytes
+    from modules.export import FORMATS as EXTENSIONS, export_frame
+
+    df = make_sales_frame(rows)
+    path = os.path.join(tempfile.mkdtemp(prefix='bench_export_'), 'sales.' + EXTENSIONS[export_format][0])
+    peak_before = peak_rss_bytes()
+    started = time.perf_counter()
+    export_frame(df, path, export_format, chunk_rows=chunk_rows)
+    seconds = time.perf_counter() - started
+    result = {
+        'seconds': seconds,
+        'file_bytes': os.path.getsize(path),
+        'peak_growth': peak_rss_bytes() - peak_before
+    }
+    os.remove(path)
+    os.rmdir(os.path.dirname(path))
+    return result
+
+
+def run_measure(export_format, rows, chunk_rows):
+    output = subprocess.check_output(
+        [sys.executable, '-m', 'benchmarks.bench_export', '--measure', export_format,
+         '--rows', str(rows), '--chunk-rows', str(chunk_rows)],
+        cwd=PROJECT_DIR
+    )
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--formats', nargs='+', default=FORMATS)
+    parser.add_argument('--chunk-rows', type=int, default=100_000)
+    parser.add_argument('--measure', default=None)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.rows[0], args.chunk_rows)))
+        return
+
+    from benchmarks.common import format_bytes
+
+    print('  %-8s%12s%12s%14s%12s%12s%16s' % (
+        'формат', 'строк', 'время, с', 'строк/с', 'МБ/с', 'файл', 'рост пика RSS'
+    ))
+    for rows in args.rows:
+        for export_format in args.formats:
+            result = run_measure(export_format, rows, args.chunk_rows)
+            print('  %-8s%12d%12.2f%14.0f%12.1f%12s%16s' % (
+                export_format, rows, result['seconds'],
+                rows / result['seconds'],
+                result['file_bytes'] / result['seconds'] / 1024 ** 2,
+                format_bytes(result['file_bytes']),
+                format_bytes(result['peak_growth'])
+            ))
+
+
+if __name__ == '__main__':
+    main()
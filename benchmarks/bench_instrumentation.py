@@ -0,0 +1,61 @@
+"""
+Накладные расходы инструментирования методов DataHandler
+
+    python -m benchmarks.bench_instrumentation --rows 1000000
+
+Задержки запросов с попаданием в кэш (самые короткие вызовы, где доля
+обёртки наибольшая) и без кэша - без замеров и с обёртками
+instrument_methods. Без включения методы не оборачиваются, поэтому
+первая колонка - и есть стоимость выключенной диагностики.
+"""
+import argparse
+import shutil
+import tempfile
+
+QUERIES = {
+    'get_sales_by_period': lambda handler: handler.get_sales_by_period('месяц', 'Все', 'Все'),
+    'get_daily_sales': lambda handler: handler.get_daily_sales('год', 'A', 'Все'),
+    'get_sales_metrics': lambda handler: handler.get_sales_metrics('месяц', 'Все', 'Все'),
+    'get_product_record': lambda handler: handler.get_product_record(handler.catalog.default_id)
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    from benchmarks.bench_sql_engine import prepare_data
+    from benchmarks.common import time_call
+    from modules.data_handler import DataHandler
+    from modules.instrumentation import Instrumentation, instrument_methods
+
+    workdir = prepare_data(tempfile.mkdtemp(prefix='bench_instr_'), args.rows, args.days)
+    try:
+        handlers = {}
+        for mode in ['off', 'on']:
+            for cache_bytes in [64 * 1024 * 1024, 0]:
+                handler = DataHandler(data_path=workdir, query_cache_bytes=cache_bytes)
+                handler.rollup
+                handler.catalog
+                if mode == 'on':
+                    instrument_methods(handler, Instrumentation(), 'DataHandler.')
+                handlers[mode, cache_bytes > 0] = handler
+
+        print('  %-22s%8s%14s%14s%12s' % ('запрос', 'кэш', 'без замеров', 'с замерами', 'разница'))
+        for name, query in QUERIES.items():
+            for cached in [True, False]:
+                repeat = args.repeat if cached else max(20, args.repeat // 20)
+                off = time_call(lambda: query(handlers['off', cached]), repeat=repeat)[0]
+                on = time_call(lambda: query(handlers['on', cached]), repeat=repeat)[0]
+                print('  %-22s%8s%11.4f мс%11.4f мс%9.4f мс' % (
+                    name, 'да' if cached else 'нет', off, on, on - off
+                ))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
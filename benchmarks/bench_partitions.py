@@ -0,0 +1,119 @@
+"""
+Партиции по месяцам: стоимость коротких запросов при росте истории
+
+    python -m benchmarks.bench_partitions --years 1 2 3 4 5 --rows-per-year 1000000
+
+Для каждой длины истории (история заканчивается сегодня, число строк
+растёт вместе с ней) sales.csv раскладывается по партициям, после чего в
+отдельном процессе замеряются старт обработчика, резидентная память и
+задержки запросов за день, неделю и месяц без кэша запросов - с движком
+pandas (все строки в памяти) и с партициями. Для партиций выводится,
+сколько из них открыл запрос за неделю: это число не зависит от истории.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENGINES = ['pandas', 'partitions']
+PERIODS = ['день', 'неделя', 'месяц']
+
+
+def measure(engine, data_path, by_product):
+    """Замер одного движка в текущем процессе"""
+    from benchmarks.common import rss_bytes, time_call
+    from modules.data_handler import DataHandler
+
+    rss_before = rss_bytes()
+    started = time.perf_counter()
+    handler = DataHandler(
+        data_path=data_path, engine=engine, query_cache_bytes=0, partition_by_product=by_product
+    )
+    handler.rollup
+    load_seconds = time.perf_counter() - started
+
+    queries = {}
+    for period in PERIODS:
+        queries['by_period/' + period] = time_call(
+            lambda: handler.get_sales_by_period(period, 'Все', 'Все'), repeat=20
+        )[0]
+    for period in PERIODS:
+        start_date, end_date = handler._period_bounds(period)
+        edges = [start_date - (end_date - start_date), start_date, end_date]
+        queries['totals/' + period] = time_call(lambda: handler._sales_totals(edges), repeat=20)[0]
+    opened = 0
+    if engine == 'partitions':
+        opened = len(handler.store.partitions_between(*handler._period_bounds('неделя')))
+    return {
+        'load_seconds': load_seconds,
+        'rss': rss_bytes() - rss_before,
+        'opened': opened,
+        'queries': queries
+    }
+
+
+def run_measure(engine, data_path, by_product):
+    """Запуск замера в дочернем процессе"""
+    command = [sys.executable, '-m', 'benchmarks.bench_partitions', '--measure', engine, '--data', data_path]
+    if by_product:
+        command.append('--by-product')
+    output = subprocess.check_output(command, cwd=PROJECT_DIR)
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--years', type=int, nargs='+', default=[1, 2, 3, 4, 5])
+    parser.add_argument('--rows-per-year', type=int, default=1_000_000)
+    parser.add_argument('--by-product', action='store_true')
+    parser.add_argument('--measure', default=None)
+    parser.add_argument('--data', default=None)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.data, args.by_product)))
+        return
+
+    from benchmarks.bench_sql_engine import prepare_data
+    from benchmarks.common import format_bytes
+    from modules.partitions import convert_csv
+
+    rows = {}
+    for years in args.years:
+        workdir = prepare_data(tempfile.mkdtemp(prefix='bench_parts_'), years * args.rows_per_year, years * 365)
+        try:
+            started = time.perf_counter()
+            store, _ = convert_csv(workdir, by_product=args.by_product)
+            convert_seconds = time.perf_counter() - started
+            results = {engine: run_measure(engine, workdir, args.by_product) for engine in ENGINES}
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        print('\n%d г., %d строк, %d партиций, преобразование %.1f с, запрос за неделю открывает %d' % (
+            years, years * args.rows_per_year, len(store.partitions), convert_seconds,
+            results['partitions']['opened']
+        ))
+        print('  %-24s' % '' + ''.join('%14s' % engine for engine in ENGINES))
+        print('  %-24s' % 'старт, с' + ''.join('%14.2f' % results[e]['load_seconds'] for e in ENGINES))
+        print('  %-24s' % 'RSS' + ''.join('%14s' % format_bytes(results[e]['rss']) for e in ENGINES))
+        for query in results[ENGINES[0]]['queries']:
+            print('  %-24s' % (query + ', мс') + ''.join(
+                '%14.2f' % results[e]['queries'][query] for e in ENGINES
+            ))
+        rows[years] = results
+
+    # Сводка: задержка запроса за неделю по партициям от длины истории
+    print('\nby_period/неделя по партициям, мс: ' + ', '.join(
+        '%d г. - %.2f' % (years, results['partitions']['queries']['by_period/неделя'])
+        for years, results in rows.items()
+    ))
+
+
+if __name__ == '__main__':
+    main()
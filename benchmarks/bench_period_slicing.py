@@ -0,0 +1,82 @@
+"""
+Микро-бенчмарк get_sales_by_period по всем комбинациям фильтров
+
+    python -m benchmarks.bench_period_slicing --rows 5000000
+
+Перебираются все периоды x ABC категории x размеры из FILTER_CONFIG.
+Для сравнения замеряется прежняя реализация (копия таблицы и маски
+по всей истории).
+"""
+import argparse
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from benchmarks.common import make_sales_frame, time_call
+from config import FILTER_CONFIG
+
+
+def legacy_get_sales_by_period(sales_data, period, abc_filter, size_filter):
+    """Прежняя реализация: копия таблицы и маски по всей истории"""
+    filtered_data = sales_data.copy()
+    if abc_filter != "Все":
+        filtered_data = filtered_data[filtered_data['abc_category'] == abc_filter]
+    if size_filter != "Все":
+        filtered_data = filtered_data[filtered_data['size'] == size_filter]
+    end_date = datetime.now()
+    deltas = {"день": 1, "неделя": 7, "месяц": 30, "год": 365}
+    if period in deltas:
+        start_date = end_date - timedelta(days=deltas[period])
+    else:
+        start_date = filtered_data['date'].min()
+    return filtered_data[
+        (filtered_data['date'] >= start_date) &
+        (filtered_data['date'] <= end_date)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=5_000_000)
+    parser.add_argument('--days', type=int, default=1826)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    from modules.data_handler import DataHandler
+
+    # История заканчивается сегодня, чтобы короткие периоды были непустыми
+    start = (pd.Timestamp.now().normalize() - pd.Timedelta(days=args.days - 1)).strftime('%Y-%m-%d')
+    workdir = tempfile.mkdtemp(prefix='bench_period_')
+    make_sales_frame(args.rows, start=start, days=args.days).to_csv(
+        os.path.join(workdir, 'sales.csv'), index=False, date_format='%Y-%m-%d'
+    )
+    handler = DataHandler(data_path=workdir)
+
+    print('%-12s %-5s %-5s %10s %10s %12s %8s' % (
+        'период', 'ABC', 'размер', 'p50, мс', 'p95, мс', 'было p50, мс', 'строк'
+    ))
+    totals = {'new': 0.0, 'legacy': 0.0}
+    for period in FILTER_CONFIG['periods']:
+        for abc_filter in FILTER_CONFIG['abc_categories']:
+            for size_filter in FILTER_CONFIG['sizes']:
+                p50, p95 = time_call(
+                    lambda: handler.get_sales_by_period(period, abc_filter, size_filter),
+                    repeat=args.repeat
+                )
+                legacy_p50, _ = time_call(
+                    lambda: legacy_get_sales_by_period(handler.sales_data, period, abc_filter, size_filter),
+                    repeat=args.repeat
+                )
+                rows = len(handler.get_sales_by_period(period, abc_filter, size_filter))
+                totals['new'] += p50
+                totals['legacy'] += legacy_p50
+                print('%-12s %-5s %-5s %10.3f %10.3f %12.3f %8d' % (
+                    period, abc_filter, size_filter, p50, p95, legacy_p50, rows
+                ))
+    print('Сумма p50 по всем комбинациям: %.1f мс (было %.1f мс)' % (totals['new'], totals['legacy']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Задержки чтения во время фонового обновления данных
+
+    python -m benchmarks.bench_refresh --rows 2000000 --seconds 10
+
+Поток-читатель непрерывно выполняет запросы дашборда (кэш запросов
+отключён) сначала без обновлений, затем пока в sales.csv дописываются
+строки, а фоновый поток обработчика подхватывает их и подменяет
+состояние данных. Сравниваются p50/p95/p99 задержек двух фаз.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import SIZES, write_sales_csv
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def dashboard_queries(handler):
+    handler.get_sales_metrics('месяц', 'Все', 'Все')
+    handler.get_daily_sales('год', 'A', 'Все')
+    handler.get_size_distribution('месяц', 'Все')
+    handler.get_calendar_data(handler.catalog.default_id)
+
+
+def read_phase(handler, seconds):
+    """Задержки запросов за фазу, мс"""
+    samples = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        dashboard_queries(handler)
+        samples.append((time.perf_counter() - started) * 1000)
+    return np.array(samples)
+
+
+def append_rows(csv_path, stop, batch_rows, pause):
+    """Дозапись пачек строк за сегодняшний день, пока не установлен stop"""
+    rng = np.random.default_rng(1)
+    today = pd.Timestamp.today().strftime('%Y-%m-%d')
+    batches = 0
+    while not stop.is_set():
+        lines = [
+            '%s,%d,sku%05d,%s,A\n' % (today, sales, product, SIZES[size])
+            for sales, product, size in zip(
+                rng.integers(1, 60, batch_rows),
+                rng.integers(0, 200, batch_rows),
+                rng.integers(0, len(SIZES), batch_rows)
+            )
+        ]
+        with open(csv_path, 'a', encoding='utf-8') as f:
+            f.writelines(lines)
+        batches += 1
+        stop.wait(pause)
+    return batches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--interval', type=float, default=0.2)
+    parser.add_argument('--batch-rows', type=int, default=5000)
+    parser.add_argument('--engine', default='pandas')
+    args = parser.parse_args()
+
+    from modules.data_handler import DataHandler
+
+    workdir = tempfile.mkdtemp(prefix='bench_refresh_')
+    for file_name in ['products.json', 'inventory.json', 'payments.csv']:
+        source = os.path.join(PROJECT_DIR, 'data', file_name)
+        if os.path.exists(source):
+            shutil.copy(source, workdir)
+    start = (pd.Timestamp.now().normalize() - pd.Timedelta(days=args.days - 1)).strftime('%Y-%m-%d')
+    csv_path = write_sales_csv(os.path.join(workdir, 'sales.csv'), args.rows, start=start, days=args.days)
+
+    handler = DataHandler(data_path=workdir, engine=args.engine, query_cache_bytes=0)
+    dashboard_queries(handler)
+
+    idle = read_phase(handler, args.seconds)
+
+    handler.start_refresh_worker(args.interval)
+    version = handler.data_version
+    stop = threading.Event()
+    writer = threading.Thread(target=append_rows, args=(csv_path, stop, args.batch_rows, args.interval / 2))
+    writer.start()
+    refreshing = read_phase(handler, args.seconds)
+    stop.set()
+    writer.join()
+    handler.stop_refresh_worker()
+
+    print('%-16s %8s %10s %10s %10s' % ('фаза', 'запросов', 'p50, мс', 'p95, мс', 'p99, мс'))
+    for name, samples in [('без обновлений', idle), ('с обновлениями', refreshing)]:
+        print('%-16s %8d %10.2f %10.2f %10.2f' % (
+            name, len(samples), *np.percentile(samples, [50, 95, 99])
+        ))
+    print('Подмен состояния: %d' % (handler.data_version - version))
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
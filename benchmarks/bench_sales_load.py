@@ -0,0 +1,100 @@
+"""
+Бенчмарк загрузки продаж: холодное чтение CSV против колоночного снимка
+
+    python -m benchmarks.bench_sales_load --rows 10000000
+
+Каждый способ загрузки замеряется в отдельном процессе, чтобы резидентная
+память одного замера не влияла на другой.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import format_bytes, rss_bytes, write_sales_csv
+
+
+def measure(mode, csv_path, snapshot_dir):
+    """Замер одной загрузки в текущем процессе"""
+    from modules.sales_store import load_sales_snapshot, read_sales_csv
+
+    rss_before = rss_bytes()
+    started = time.perf_counter()
+    if mode == 'csv':
+        df = read_sales_csv(csv_path)
+    else:
+        df = load_sales_snapshot(snapshot_dir, source_path=csv_path, mmap=(mode == 'snapshot-mmap'))
+    load_seconds = time.perf_counter() - started
+    rss_loaded = rss_bytes()
+
+    # Полный проход по данным, чтобы страницы memory-map попали в память
+    started = time.perf_counter()
+    total = int(df['sales'].sum())
+    scan_seconds = time.perf_counter() - started
+
+    return {
+        'mode': mode,
+        'rows': len(df),
+        'load_seconds': load_seconds,
+        'scan_seconds': scan_seconds,
+        'rss_after_load': rss_loaded - rss_before,
+        'rss_after_scan': rss_bytes() - rss_before,
+        'total_sales': total
+    }
+
+
+def run_measure(mode, csv_path, snapshot_dir):
+    """Запуск замера в дочернем процессе"""
+    output = subprocess.check_output([
+        sys.executable, '-m', 'benchmarks.bench_sales_load',
+        '--measure', mode, '--csv', csv_path, '--snapshot', snapshot_dir
+    ])
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--workdir', default=None)
+    parser.add_argument('--measure', default=None)
+    parser.add_argument('--csv', default=None)
+    parser.add_argument('--snapshot', default=None)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.csv, args.snapshot)))
+        return
+
+    from modules.sales_store import read_sales_csv, save_sales_snapshot
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='bench_sales_')
+    csv_path = os.path.join(workdir, 'sales.csv')
+    snapshot_dir = os.path.join(workdir, '.cache', 'sales')
+    os.makedirs(workdir, exist_ok=True)
+
+    if not os.path.exists(csv_path):
+        print('Генерация %d строк в %s ...' % (args.rows, csv_path))
+        write_sales_csv(csv_path, args.rows)
+    print('Размер CSV: %s' % format_bytes(os.path.getsize(csv_path)))
+
+    started = time.perf_counter()
+    save_sales_snapshot(read_sales_csv(csv_path), snapshot_dir, source_path=csv_path)
+    print('Построение снимка: %.2f с' % (time.perf_counter() - started))
+
+    print('%-15s %10s %10s %14s %14s' % ('режим', 'загрузка', 'проход', 'RSS загрузки', 'RSS прохода'))
+    for mode in ['csv', 'snapshot', 'snapshot-mmap']:
+        result = run_measure(mode, csv_path, snapshot_dir)
+        print('%-15s %9.3fс %9.3fс %14s %14s' % (
+            mode,
+            result['load_seconds'],
+            result['scan_seconds'],
+            format_bytes(result['rss_after_load']),
+            format_bytes(result['rss_after_scan'])
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Несколько процессов дашборда: собственные данные против общего снимка
+
+    python -m benchmarks.bench_shared_plane --rows 5000000 --workers 1 2 4 8
+
+Запускается N процессов одновременно. В режиме private каждый процесс
+строит свой DataHandler по файлам данных (с колоночным снимком продаж),
+в режиме plane подключается к общему снимку, опубликованному заранее
+(modules.shared_plane). Для каждого процесса замеряется старт (создание
+обработчика, загрузка продаж, агрегата и оплат, первый запрос метрик), а
+когда все процессы загружены - PSS: общие страницы делятся между
+процессами, поэтому сумма PSS - реальная память всех процессов. Для
+сравнения приводится PSS тех же процессов без данных (только импорты).
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = ['private', 'plane']
+
+
+def worker(mode, data_path, plane_dir):
+    """Процесс дашборда: загрузка, отчёт о старте, отчёт о памяти по команде"""
+    from benchmarks.common import pss_bytes
+    from modules.data_handler import DataHandler
+
+    started = time.perf_counter()
+    if mode != 'imports':
+        handler = DataHandler(
+            data_path=data_path,
+            query_cache_bytes=0,
+            plane_dir=plane_dir if mode == 'plane' else None
+        )
+        handler.rollup
+        handler.payments_data
+        handler.get_sales_metrics('месяц', 'Все', 'Все')
+        handler.get_sales_by_period('месяц', 'Все', 'Все')
+    print(json.dumps({'startup_seconds': time.perf_counter() - started}), flush=True)
+    sys.stdin.readline()
+    print(json.dumps({'pss': pss_bytes()}), flush=True)
+    sys.stdin.readline()
+
+
+def run_workers(mode, n_workers, data_path, plane_dir):
+    """N одновременных процессов: время старта каждого и суммарный PSS"""
+    processes = [
+        subprocess.Popen(
+            [sys.executable, '-m', 'benchmarks.bench_shared_plane', '--worker', mode,
+             '--data', data_path, '--plane', plane_dir],
+            cwd=PROJECT_DIR, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+        )
+        for _ in range(n_workers)
+    ]
+    startup = [json.loads(process.stdout.readline())['startup_seconds'] for process in processes]
+    for process in processes:
+        process.stdin.write('\n')
+        process.stdin.flush()
+    pss = [json.loads(process.stdout.readline())['pss'] for process in processes]
+    for process in processes:
+        process.stdin.close()
+        process.wait()
+    return {'startup_max': max(startup), 'startup_mean': sum(startup) / len(startup), 'pss_total': sum(pss)}
+
+
+def prepare_data(workdir, rows, days):
+    """Каталог данных с синтетическим sales.csv, история заканчивается сегодня"""
+    import pandas as pd
+
+    from benchmarks.common import write_sales_csv
+
+    os.makedirs(workdir, exist_ok=True)
+    for file_name in ['products.json', 'inventory.json', 'payments.csv']:
+        source = os.path.join(PROJECT_DIR, 'data', file_name)
+        if os.path.exists(source):
+            shutil.copy(source, workdir)
+    start = (pd.Timestamp.now().normalize() - pd.Timedelta(days=days - 1)).strftime('%Y-%m-%d')
+    write_sales_csv(os.path.join(workdir, 'sales.csv'), rows, start=start, days=days)
+    return workdir
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=5_000_000)
+    parser.add_argument('--days', type=int, default=1826)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--plane', default=None, help='каталог общего снимка, по умолчанию в /dev/shm')
+    parser.add_argument('--worker', default=None)
+    parser.add_argument('--data', default=None)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.data, args.plane)
+        return
+
+    from benchmarks.common import format_bytes
+    from modules.data_handler import DataHandler
+    from modules.shared_plane import SharedPlane
+
+    workdir = prepare_data(tempfile.mkdtemp(prefix='bench_plane_'), args.rows, args.days)
+    shm = '/dev/shm' if os.path.isdir('/dev/shm') else None
+    plane_dir = args.plane or tempfile.mkdtemp(prefix='bench_plane_', dir=shm)
+    try:
+        started = time.perf_counter()
+        loader = DataHandler(data_path=workdir)
+        plane = SharedPlane(plane_dir)
+        plane.publish(loader.sales_data, loader.rollup, loader.payments_data)
+        print('%d строк, загрузка и публикация снимка %.2f с' % (args.rows, time.perf_counter() - started))
+        del loader
+
+        print('  %-10s%14s' % ('', 'без данных') + ''.join('%28s' % mode for mode in MODES))
+        print('  %-10s%14s' % ('процессов', 'PSS') + '%14s%14s' % ('старт, с', 'PSS') * len(MODES))
+        for n_workers in args.workers:
+            imports = run_workers('imports', n_workers, workdir, plane_dir)
+            line = '  %-10d%14s' % (n_workers, format_bytes(imports['pss_total']))
+            for mode in MODES:
+                result = run_workers(mode, n_workers, workdir, plane_dir)
+                line += '%14.2f%14s' % (result['startup_max'], format_bytes(result['pss_total']))
+            print(line)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        if args.plane is None:
+            shutil.rmtree(plane_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
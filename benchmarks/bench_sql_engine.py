@@ -0,0 +1,125 @@
+"""
+Движки хранения DataHandler: pandas в памяти против SQLite
+
+    python -m benchmarks.bench_sql_engine --sizes 100000 1000000 5000000
+
+Для каждого объёма данных и движка в отдельном процессе замеряются
+загрузка (первая - с построением снимка или базы, повторная - холодный
+старт процесса), резидентная память и задержки запросов, которые
+движок выполняет сам: get_sales_by_period по всем фильтрам,
+get_sales_metrics и get_payment_metrics. Кэш запросов отключён.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENGINES = ['pandas', 'sqlite']
+PERIODS = ['день', 'неделя', 'месяц', 'год', 'весь период']
+ABC_FILTERS = ['Все', 'A']
+SIZE_FILTERS = ['Все', 'M']
+
+
+def measure(engine, data_path):
+    """Замер одного движка в текущем процессе"""
+    from benchmarks.common import rss_bytes, time_call
+    from modules.data_handler import DataHandler
+
+    rss_before = rss_bytes()
+    started = time.perf_counter()
+    handler = DataHandler(data_path=data_path, engine=engine, query_cache_bytes=0)
+    handler.rollup
+    handler.payments_data
+    load_seconds = time.perf_counter() - started
+    rss_loaded = rss_bytes() - rss_before
+
+    queries = {}
+    for period in PERIODS:
+        samples = [
+            time_call(lambda: handler.get_sales_by_period(period, abc, size), repeat=5)[0]
+            for abc in ABC_FILTERS for size in SIZE_FILTERS
+        ]
+        queries['by_period/' + period] = sum(samples) / len(samples)
+    queries['sales_metrics'] = time_call(lambda: handler.get_sales_metrics('месяц'), repeat=20)[0]
+    queries['payment_metrics'] = time_call(handler.get_payment_metrics, repeat=20)[0]
+    return {
+        'load_seconds': load_seconds,
+        'rss_loaded': rss_loaded,
+        'rss_total': rss_bytes() - rss_before,
+        'queries': queries
+    }
+
+
+def run_measure(engine, data_path):
+    """Запуск замера в дочернем процессе"""
+    output = subprocess.check_output(
+        [sys.executable, '-m', 'benchmarks.bench_sql_engine', '--measure', engine, '--data', data_path],
+        cwd=PROJECT_DIR
+    )
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def prepare_data(workdir, rows, days):
+    """Каталог данных с синтетическим sales.csv, история заканчивается сегодня"""
+    import pandas as pd
+
+    from benchmarks.common import write_sales_csv
+
+    os.makedirs(workdir, exist_ok=True)
+    for file_name in ['products.json', 'inventory.json', 'payments.csv']:
+        source = os.path.join(PROJECT_DIR, 'data', file_name)
+        if os.path.exists(source):
+            shutil.copy(source, workdir)
+    start = (pd.Timestamp.now().normalize() - pd.Timedelta(days=days - 1)).strftime('%Y-%m-%d')
+    write_sales_csv(os.path.join(workdir, 'sales.csv'), rows, start=start, days=days)
+    return workdir
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000, 5_000_000])
+    parser.add_argument('--days', type=int, default=1826)
+    parser.add_argument('--measure', default=None)
+    parser.add_argument('--data', default=None)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.data)))
+        return
+
+    from benchmarks.common import format_bytes
+
+    for rows in args.sizes:
+        workdir = prepare_data(tempfile.mkdtemp(prefix='bench_sql_'), rows, args.days)
+        print('\n%d строк, CSV %s' % (rows, format_bytes(os.path.getsize(os.path.join(workdir, 'sales.csv')))))
+        results = {}
+        for engine in ENGINES:
+            first = run_measure(engine, workdir)
+            results[engine] = run_measure(engine, workdir)
+            results[engine]['first_load_seconds'] = first['load_seconds']
+
+        print('  %-24s' % '' + ''.join('%14s' % engine for engine in ENGINES))
+        print('  %-24s' % 'первая загрузка, с' + ''.join(
+            '%14.2f' % results[engine]['first_load_seconds'] for engine in ENGINES
+        ))
+        print('  %-24s' % 'холодный старт, с' + ''.join(
+            '%14.2f' % results[engine]['load_seconds'] for engine in ENGINES
+        ))
+        print('  %-24s' % 'RSS после запросов' + ''.join(
+            '%14s' % format_bytes(results[engine]['rss_total']) for engine in ENGINES
+        ))
+        for query in results[ENGINES[0]]['queries']:
+            print('  %-24s' % (query + ', мс') + ''.join(
+                '%14.2f' % results[engine]['queries'][query] for engine in ENGINES
+            ))
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+Холодный старт дашборда: время импорта и время до первой отрисовки
+
+    python -m benchmarks.bench_startup --rows 2000000
+
+Каждый замер выполняется в отдельном процессе, чтобы модули и данные,
+загруженные одним замером, не ускоряли другой:
+
+- импорт модулей, которые приложение загружает при старте;
+- создание DataHandler и запрос данных одного раздела при отложенной и
+  немедленной загрузке источников (на синтетическом sales.csv из --rows строк);
+- полный прогон app.py (streamlit AppTest) с открытым разделом - время
+  до первой отрисовки страницы.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(PROJECT_DIR, 'app.py')
+
+IMPORTS = ['streamlit', 'numpy', 'pandas', 'plotly.express', 'modules.data_handler']
+
+SECTIONS = {
+    'Продажи': '📈 Продажи',
+    'Склад': '📦 Склад',
+    'В пути': '🚚 В пути',
+    'Оплата': '💰 Оплата'
+}
+
+
+def section_queries(handler, section):
+    """Запросы данных, которые делает раздел дашборда"""
+    product_id = (handler.search_products('', limit=50) or [None])[0]
+    if section == 'Продажи':
+        handler.get_daily_sales('месяц', 'A', 'M')
+        handler.get_size_distribution('месяц', 'A')
+        handler.get_product_record(product_id)
+    elif section == 'Склад':
+        handler.get_inventory_record(product_id)
+        handler.get_calendar_data(product_id)
+    elif section == 'В пути':
+        handler.get_inventory_record(product_id)
+        handler.get_forecast_data(product_id)
+        handler.get_missed_sales_distribution(product_id)
+    elif section == 'Оплата':
+        handler.get_payment_metrics()
+
+
+def measure_import(module):
+    started = time.perf_counter()
+    __import__(module)
+    return {'seconds': time.perf_counter() - started}
+
+
+def measure_handler(section, data_path, lazy):
+    from modules.data_handler import DataHandler
+
+    started = time.perf_counter()
+    handler = DataHandler(data_path=data_path, lazy=lazy)
+    init_seconds = time.perf_counter() - started
+    section_queries(handler, section)
+    return {
+        'init_seconds': init_seconds,
+        'seconds': time.perf_counter() - started,
+        'loaded': [name for name in DataHandler.SOURCE_ATTRIBUTES.values() if handler.is_loaded(name)]
+    }
+
+
+def measure_app(section):
+    started = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(APP_PATH, default_timeout=600)
+    app.session_state['section'] = SECTIONS[section]
+    app.run()
+    if app.exception:
+        raise RuntimeError(app.exception[0].value)
+    return {'seconds': time.perf_counter() - started}
+
+
+def run_measure(*args):
+    """Запуск замера в дочернем процессе"""
+    output = subprocess.check_output(
+        [sys.executable, '-m', 'benchmarks.bench_startup', '--measure'] + list(args),
+        cwd=PROJECT_DIR,
+        stderr=subprocess.DEVNULL
+    )
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def prepare_data(workdir, rows):
+    """Каталог данных: JSON и оплаты из data/, синтетический sales.csv"""
+    # numpy и pandas импортируются только здесь, чтобы не искажать замер импорта
+    from benchmarks.common import write_sales_csv
+
+    os.makedirs(workdir, exist_ok=True)
+    for file_name in ['products.json', 'inventory.json', 'payments.csv']:
+        source = os.path.join(PROJECT_DIR, 'data', file_name)
+        if os.path.exists(source):
+            shutil.copy(source, workdir)
+    csv_path = os.path.join(workdir, 'sales.csv')
+    if not os.path.exists(csv_path):
+        print('Генерация %d строк в %s ...' % (rows, csv_path))
+        write_sales_csv(csv_path, rows)
+    return workdir
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--workdir', default=None)
+    parser.add_argument('--skip-app', action='store_true')
+    parser.add_argument('--measure', nargs='+', default=None)
+    args = parser.parse_args()
+
+    if args.measure:
+        kind = args.measure[0]
+        if kind == 'import':
+            result = measure_import(args.measure[1])
+        elif kind == 'handler':
+            result = measure_handler(args.measure[1], args.measure[2], args.measure[3] == 'lazy')
+        else:
+            result = measure_app(args.measure[1])
+        print(json.dumps(result))
+        return
+
+    print('Импорт модулей (отдельный процесс на модуль):')
+    for module in IMPORTS:
+        print('  %-22s %8.3f с' % (module, run_measure('import', module)['seconds']))
+
+    data_path = prepare_data(args.workdir or tempfile.mkdtemp(prefix='bench_startup_'), args.rows)
+    # Первый прогон строит колоночный снимок, дальше замеряется обычный холодный старт
+    run_measure('handler', 'Продажи', data_path, 'eager')
+
+    print('\nДанные раздела, DataHandler с нуля (%d строк продаж):' % args.rows)
+    print('  %-10s %12s %12s   %s' % ('раздел', 'немедленно', 'отложенно', 'загружено при отложенной'))
+    for section in SECTIONS:
+        eager = run_measure('handler', section, data_path, 'eager')
+        lazy = run_measure('handler', section, data_path, 'lazy')
+        print('  %-10s %11.3fс %11.3fс   %s' % (
+            section, eager['seconds'], lazy['seconds'], ', '.join(lazy['loaded'])
+        ))
+
+    if args.skip_app:
+        return
+    print('\nВремя до первой отрисовки app.py (данные из data/):')
+    for section in SECTIONS:
+        print('  %-10s %8.3f с' % (section, run_measure('app', section)['seconds']))
+
+
+if __name__ == '__main__':
+    main()
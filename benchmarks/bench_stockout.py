@@ -0,0 +1,73 @@
+"""
+Симуляция риска дефицита: время и память от размера каталога и числа процессов
+
+    python -m benchmarks.bench_stockout --products 1000 5000 --paths 1000 --workers 1 4
+
+Для каждого размера каталога synthetic.py записывает исходные файлы,
+обработчик строит дневной агрегат, после чего simulate_stockout
+запускается с разным числом процессов. Выводятся время симуляции, SKU в
+секунду и пик выделенной памяти основного процесса (tracemalloc).
+Результат не зависит от числа процессов - это проверяется сравнением
+таблиц.
+"""
+import argparse
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, nargs='+', default=[1000, 5000])
+    parser.add_argument('--days', type=int, default=120)
+    parser.add_argument('--paths', type=int, default=1000)
+    parser.add_argument('--horizon-days', type=int, default=60)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4])
+    args = parser.parse_args()
+
+    from benchmarks.common import format_bytes
+    from modules.data_handler import DataHandler
+    from modules.stockout import simulate_stockout
+    from modules.synthetic import SyntheticWarehouse
+
+    for n_products in args.products:
+        workdir = tempfile.mkdtemp(prefix='bench_stockout_')
+        try:
+            SyntheticWarehouse(n_products, args.days).write(workdir)
+            handler = DataHandler(data_path=workdir, query_cache_bytes=0)
+            rollup, inventory = handler.rollup, handler.inventory_data
+            print('\n%d товаров, %d SKU, %d сценариев на %d дней' % (
+                n_products, rollup.n_skus, args.paths, args.horizon_days
+            ))
+            first = None
+            for workers in args.workers:
+                tracemalloc.start()
+                started = time.perf_counter()
+                result = simulate_stockout(
+                    rollup, inventory, n_paths=args.paths, horizon_days=args.horizon_days,
+                    workers=workers, parallel_min_skus=0
+                )
+                seconds = time.perf_counter() - started
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                if first is None:
+                    first = result
+                same = np.array_equal(first['sku_probability'], result['sku_probability'])
+                print('  процессов %-3d%8.2f с  %10.0f SKU/с  пик %s%s' % (
+                    workers, seconds, rollup.n_skus / seconds, format_bytes(peak),
+                    '' if same else '  РЕЗУЛЬТАТ ОТЛИЧАЕТСЯ'
+                ))
+            products = first['products']
+            print('  закончатся за горизонт с вероятностью > 50%%: %d товаров, медиана P50 дней запаса %.1f' % (
+                (products['stockout_probability'] > 0.5).sum(),
+                np.median(products['cover_p50'])
+            ))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
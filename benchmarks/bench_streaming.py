@@ -0,0 +1,111 @@
+"""
+Потоковая загрузка продаж под ограничением резидентной памяти
+
+    python -m benchmarks.bench_streaming --gb 5 --rss-cap-mb 1024
+
+Синтетическая выгрузка заданного объёма генерируется на лету (без записи
+на диск) и читается stream_sales_csv частями в дневной агрегат. После
+загрузки сверяется сумма продаж и пиковый RSS процесса; при превышении
+лимита бенчмарк завершается с кодом 1.
+"""
+import argparse
+import io
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import ABC, SIZES, format_bytes, peak_rss_bytes, rss_bytes
+
+
+class SyntheticSalesStream(io.RawIOBase):
+    """
+    CSV поток продаж заданного объёма: один день - один блок строк
+    """
+
+    def __init__(self, total_bytes, rows_per_day=100_000, n_products=200, start='2015-01-01', seed=0):
+        rng = np.random.default_rng(seed)
+        self.total_bytes = total_bytes
+        self.produced = 0
+        self.total_sales = 0
+        self.rows = 0
+        self._day = np.datetime64(start, 'D')
+        self._buffer = b'date,sales,product_id,size,abc_category\n'
+        # Несколько заготовок строк без даты; дата подставляется при склейке
+        self._templates = []
+        for _ in range(4):
+            products = rng.integers(0, n_products, rows_per_day)
+            sales = rng.integers(1, 60, rows_per_day)
+            lines = [
+                b'%d,sku%05d,%s,%s' % (q, p, SIZES[s].encode(), ABC[p % len(ABC)].encode())
+                for q, p, s in zip(sales, products, rng.integers(0, len(SIZES), rows_per_day))
+            ]
+            self._templates.append((lines, int(sales.sum())))
+
+    def readable(self):
+        return True
+
+    def _next_day(self):
+        lines, sales = self._templates[self.rows // len(self._templates[0][0]) % len(self._templates)]
+        prefix = str(self._day).encode() + b','
+        self._day += 1
+        self.rows += len(lines)
+        self.total_sales += sales
+        return prefix + (b'\n' + prefix).join(lines) + b'\n'
+
+    def readinto(self, buffer):
+        while len(self._buffer) < len(buffer) and self.produced < self.total_bytes:
+            block = self._next_day()
+            self.produced += len(block)
+            self._buffer += block
+        n = min(len(buffer), len(self._buffer))
+        buffer[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--gb', type=float, default=5.0)
+    parser.add_argument('--rss-cap-mb', type=int, default=1024)
+    parser.add_argument('--chunk-rows', type=int, default=500_000)
+    parser.add_argument('--window-days', type=int, default=30)
+    parser.add_argument('--rows-per-day', type=int, default=100_000)
+    args = parser.parse_args()
+
+    from modules.rollup import DailyRollup
+    from modules.sales_store import stream_sales_csv
+
+    stream = SyntheticSalesStream(int(args.gb * 1024 ** 3), rows_per_day=args.rows_per_day)
+    rss_start = rss_bytes()
+    rollup = DailyRollup()
+    started = time.perf_counter()
+    recent = stream_sales_csv(
+        io.BufferedReader(stream, buffer_size=4 * 1024 * 1024),
+        rollup.add,
+        chunk_rows=args.chunk_rows,
+        raw_window_days=args.window_days
+    )
+    seconds = time.perf_counter() - started
+    peak = peak_rss_bytes()
+
+    print('Прочитано: %s, %d строк за %.1f с (%.1f МБ/с)' % (
+        format_bytes(stream.produced), stream.rows, seconds, stream.produced / seconds / 1024 ** 2
+    ))
+    print('Дней в агрегате: %d, SKU: %d, строк в окне: %d' % (rollup.n_days, rollup.n_skus, len(recent)))
+    print('RSS до загрузки: %s, пиковый RSS: %s, лимит: %d МБ' % (
+        format_bytes(rss_start), format_bytes(peak), args.rss_cap_mb
+    ))
+
+    if rollup.total() != stream.total_sales:
+        print('ОШИБКА: сумма продаж в агрегате %d, в потоке %d' % (rollup.total(), stream.total_sales))
+        sys.exit(1)
+    if peak > args.rss_cap_mb * 1024 ** 2:
+        print('ОШИБКА: пиковый RSS превышает лимит')
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
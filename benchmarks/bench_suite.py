@@ -0,0 +1,282 @@
+"""
+Набор замеров всех методов DataHandler на синтетических данных разного объёма
+
+    python -m benchmarks.bench_suite --scales small medium --output results.json
+    python -m benchmarks.bench_suite --scales small --baseline results.json
+    python -m benchmarks.bench_suite --compare old.json new.json
+
+Для каждого масштаба генератор synthetic.py записывает исходные файлы
+(одинаковые при одном seed), после чего в отдельном процессе для каждого
+движка замеряются загрузка источников, пиковая резидентная память и все
+публичные методы обработчика без кэша запросов: p50/p95 задержки и пик
+выделенной памяти одного вызова (tracemalloc). Результаты - JSON с
+версией кода и окружения. При сравнении с базовыми результатами замеры,
+выросшие по времени или памяти больше чем в threshold раз, считаются
+регрессией, и процесс завершается с кодом 1.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Масштаб: число товаров и дней истории
+SCALES = {
+    'small': (100, 365),
+    'medium': (1000, 730),
+    'large': (5000, 1825),
+    'xlarge': (50000, 1825)
+}
+
+SOURCES = ['products_data', 'sales_data', 'inventory_data', 'payments_data', 'catalog']
+
+METHODS = {
+    'is_loaded': lambda h, ctx: h.is_loaded('sales_data'),
+    'sources_changed': lambda h, ctx: h.sources_changed(),
+    'refresh_if_changed': lambda h, ctx: h.refresh_if_changed(),
+    'get_sales_by_period/неделя': lambda h, ctx: h.get_sales_by_period('неделя', 'Все', 'Все'),
+    'get_sales_by_period/месяц': lambda h, ctx: h.get_sales_by_period('месяц', 'A', 'M'),
+    'get_sales_by_period/год': lambda h, ctx: h.get_sales_by_period('год', 'Все', 'Все'),
+    'get_daily_sales/год': lambda h, ctx: h.get_daily_sales('год', 'Все', 'Все'),
+    'get_daily_sales/весь период': lambda h, ctx: h.get_daily_sales('весь период', 'A', 'Все'),
+    'get_sales_metrics/месяц': lambda h, ctx: h.get_sales_metrics('месяц', 'Все', 'Все'),
+    'get_sales_metrics/год': lambda h, ctx: h.get_sales_metrics('год', 'B', 'M'),
+    'get_inventory_record': lambda h, ctx: h.get_inventory_record(ctx['product_id']),
+    'get_product_record': lambda h, ctx: h.get_product_record(ctx['product_id']),
+    'get_inventory_info': lambda h, ctx: h.get_inventory_info(ctx['product_id']),
+    'get_product_info': lambda h, ctx: h.get_product_info(ctx['product_id']),
+    'search_products': lambda h, ctx: h.search_products(ctx['query']),
+    'get_forecast_data': lambda h, ctx: h.get_forecast_data(),
+    'get_forecast_data/товар': lambda h, ctx: h.get_forecast_data(ctx['product_id']),
+    'get_size_distribution': lambda h, ctx: h.get_size_distribution('месяц', 'Все'),
+    'get_missed_sales_distribution': lambda h, ctx: h.get_missed_sales_distribution(ctx['product_id']),
+    'get_payment_analytics': lambda h, ctx: h.get_payment_analytics(),
+    'get_payment_metrics': lambda h, ctx: h.get_payment_metrics(),
+    'get_calendar_data': lambda h, ctx: h.get_calendar_data(ctx['product_id']),
+    'get_transit_info': lambda h, ctx: h.get_transit_info(),
+    # Дописывает строки, поэтому замеряется последним
+    'append_sales': lambda h, ctx: h.append_sales(ctx['new_rows'])
+}
+# Методы, которые не замеряются, и почему
+SKIPPED = {
+    'start_refresh_worker': 'запускает фоновый поток',
+    'stop_refresh_worker': 'останавливает фоновый поток',
+    'get_stockout_risk': 'симуляция Монте-Карло, замеряется в bench_stockout'
+}
+
+
+def environment():
+    """Версия кода и окружения для сравнения результатов"""
+    import numpy as np
+    import pandas as pd
+
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+def unmeasured_methods():
+    """Публичные методы DataHandler без замера: новый метод должен попасть в METHODS"""
+    from modules.data_handler import DataHandler
+
+    measured = {name.split('/')[0] for name in METHODS} | set(SKIPPED)
+    return sorted(
+        name for name, value in vars(DataHandler).items()
+        if not name.startswith('_') and callable(value) and name not in measured
+    )
+
+
+def measure(engine, data_path, repeat):
+    """Замер загрузки и всех методов одного движка в текущем процессе"""
+    from benchmarks.common import peak_rss_bytes, rss_bytes, time_call
+    from modules.data_handler import DataHandler
+    from modules.synthetic import SyntheticWarehouse
+
+    rss_before = rss_bytes()
+    handler = DataHandler(data_path=data_path, engine=engine, query_cache_bytes=0)
+    load = {}
+    for source in SOURCES:
+        started = time.perf_counter()
+        getattr(handler, source)
+        load[source] = round(time.perf_counter() - started, 4)
+    rss_loaded = rss_bytes() - rss_before
+
+    product_id = handler.catalog.default_id
+    last_day = handler.rollup.end_day
+    context = {
+        'product_id': product_id,
+        'query': product_id[:4],
+        'new_rows': SyntheticWarehouse(
+            product_ids=handler.rollup.products[:100], days=1, end=last_day, seed=1
+        ).sales_frame()
+    }
+    methods = {}
+    for name, call in METHODS.items():
+        # append_sales меняет данные: один вызов без повторов
+        p50, p95 = time_call(lambda: call(handler, context), repeat=1 if name == 'append_sales' else repeat)
+        peak = 0
+        if name != 'append_sales':
+            tracemalloc.start()
+            call(handler, context)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        methods[name] = {'p50_ms': round(p50, 4), 'p95_ms': round(p95, 4), 'peak_bytes': peak}
+    return {
+        'rows': int(handler.rollup.total()),
+        'load_seconds': load,
+        'rss_loaded': rss_loaded,
+        'peak_rss': peak_rss_bytes(),
+        'methods': methods
+    }
+
+
+def run_measure(engine, data_path, repeat):
+    """Запуск замера в дочернем процессе"""
+    output = subprocess.check_output(
+        [sys.executable, '-m', 'benchmarks.bench_suite', '--measure', engine, '--data', data_path,
+         '--repeat', str(repeat)],
+        cwd=PROJECT_DIR
+    )
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def flatten(result):
+    """Замеры одного движка: имя -> (значение, единица, порог шума)"""
+    values = {'load/' + source: (seconds * 1000, 'мс', 0.05) for source, seconds in result['load_seconds'].items()}
+    values['peak_rss'] = (result['peak_rss'] / 2 ** 20, 'МБ', 1.0)
+    for name, stat in result['methods'].items():
+        values[name] = (stat['p50_ms'], 'мс', 0.05)
+        values[name + '/пик'] = (stat['peak_bytes'] / 2 ** 20, 'МБ', 1.0)
+    return values
+
+
+def compare(baseline, current, threshold=1.25):
+    """Сравнение результатов: строки (масштаб, движок, замер, единица, было, стало, отношение, регрессия)
+
+    Время сравнивается по p50, память - по пику; прирост меньше порога
+    шума (0.05 мс, 1 МБ) регрессией не считается.
+    """
+    rows = []
+    for scale, engines in current['results'].items():
+        for engine, result in engines.items():
+            base = baseline.get('results', {}).get(scale, {}).get(engine)
+            if base is None:
+                continue
+            base_values = flatten(base)
+            for name, (value, unit, noise) in flatten(result).items():
+                if name not in base_values:
+                    continue
+                before = base_values[name][0]
+                ratio = value / before if before > 0 else (1.0 if value == 0 else float('inf'))
+                regression = ratio > threshold and value - before > noise
+                rows.append((scale, engine, name, unit, before, value, ratio, regression))
+    return rows
+
+
+def print_comparison(rows):
+    print('  %-8s%-12s%-38s%12s%12s%9s' % ('масштаб', 'движок', 'замер', 'было', 'стало', 'x'))
+    for scale, engine, name, unit, before, value, ratio, regression in rows:
+        print('  %-8s%-12s%-38s%9.3f %-2s%9.3f %-2s%9.2f%s' % (
+            scale, engine, name, before, unit, value, unit, ratio, '  РЕГРЕССИЯ' if regression else ''
+        ))
+    return sum(row[-1] for row in rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', nargs='+', default=['small', 'medium'], choices=sorted(SCALES))
+    parser.add_argument('--engines', nargs='+', default=['pandas'], choices=['pandas', 'sqlite', 'partitions'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output', default=None, help='файл результатов JSON')
+    parser.add_argument('--baseline', default=None, help='результаты прошлого запуска для сравнения')
+    parser.add_argument('--threshold', type=float, default=1.25, help='замедление, считающееся регрессией')
+    parser.add_argument('--compare', nargs=2, default=None, metavar=('BASELINE', 'CURRENT'),
+                        help='только сравнить два файла результатов')
+    parser.add_argument('--measure', default=None)
+    parser.add_argument('--data', default=None)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.data, args.repeat)))
+        return
+
+    if args.compare:
+        files = []
+        for path in args.compare:
+            with open(path, 'r', encoding='utf-8') as f:
+                files.append(json.load(f))
+        regressions = print_comparison(compare(files[0], files[1], args.threshold))
+        sys.exit(1 if regressions else 0)
+
+    from benchmarks.common import format_bytes
+    from modules.synthetic import SyntheticWarehouse
+
+    missing = unmeasured_methods()
+    if missing:
+        print('Методы без замера: %s' % ', '.join(missing))
+
+    report = {
+        'created_at': datetime.now().isoformat(),
+        'environment': environment(),
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'results': {}
+    }
+    for scale in args.scales:
+        n_products, days = SCALES[scale]
+        workdir = tempfile.mkdtemp(prefix='bench_suite_')
+        try:
+            started = time.perf_counter()
+            rows = SyntheticWarehouse(n_products, days, seed=args.seed).write(workdir)
+            print('\n%s: %d товаров, %d дней, %d строк продаж, генерация %.1f с' % (
+                scale, n_products, days, rows, time.perf_counter() - started
+            ))
+            report['results'][scale] = {}
+            for engine in args.engines:
+                result = run_measure(engine, workdir, args.repeat)
+                report['results'][scale][engine] = result
+                print('  %s: загрузка %.2f с, RSS данных %s, пик RSS %s' % (
+                    engine, sum(result['load_seconds'].values()),
+                    format_bytes(result['rss_loaded']), format_bytes(result['peak_rss'])
+                ))
+                for name, stat in result['methods'].items():
+                    print('    %-34s%10.3f мс  p95 %8.3f мс  пик %s' % (
+                        name, stat['p50_ms'], stat['p95_ms'], format_bytes(stat['peak_bytes'])
+                    ))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print('\nРезультаты: %s' % args.output)
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print('\nСравнение с %s (%s)' % (args.baseline, baseline.get('environment', {}).get('commit')))
+        regressions = print_comparison(compare(baseline, report, args.threshold))
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Общие утилиты бенчмарков: синтетические данные, замер времени и памяти
+
+Бенчмарки запускаются из корня проекта: python -m benchmarks.<имя>
+"""
+import os
+import resource
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+SIZES = ['XS', 'S', 'M', 'L', 'XL', '2XL', '3XL', '4XL', '5XL']
+ABC = ['A', 'B', 'C']
+
+
+def make_sales_frame(n_rows, n_products=200, start='2020-01-01', days=1826, seed=0):
+    """Синтетическая таблица продаж в формате sales.csv, отсортированная по дате"""
+    rng = np.random.default_rng(seed)
+    day_offsets = np.sort(rng.integers(0, days, n_rows))
+    products = rng.integers(0, n_products, n_rows)
+    return pd.DataFrame({
+        'date': pd.Timestamp(start) + pd.to_timedelta(day_offsets, unit='D'),
+        'sales': rng.integers(1, 60, n_rows).astype('int32'),
+        'product_id': pd.Categorical.from_codes(
+            products, ['sku%05d' % i for i in range(n_products)]
+        ),
+        'size': pd.Categorical.from_codes(rng.integers(0, len(SIZES), n_rows), SIZES),
+        'abc_category': pd.Categorical.from_codes(products % len(ABC), ABC)
+    })
+
+
+def write_sales_csv(file_path, n_rows, chunk_rows=1_000_000, seed=0, **kwargs):
+    """Запись синтетического sales.csv по частям, без удержания всей таблицы"""
+    df = make_sales_frame(n_rows, seed=seed, **kwargs)
+    with open(file_path, 'w', encoding='utf-8', newline='') as f:
+        for start in range(0, n_rows, chunk_rows):
+            chunk = df.iloc[start:start + chunk_rows]
+            chunk.to_csv(f, index=False, header=(start == 0), date_format='%Y-%m-%d')
+    return file_path
+
+
+def rss_bytes():
+    """Текущий резидентный объём памяти процесса"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return peak_rss_bytes()
+
+
+def pss_bytes():
+    """Пропорциональный объём памяти процесса: общие страницы делятся между процессами
+
+    Сумма по процессам равна реально занятой ими памяти. Если smaps_rollup
+    недоступен - резидентный объём.
+    """
+    try:
+        with open('/proc/self/smaps_rollup', 'r') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return rss_bytes()
+
+
+def peak_rss_bytes():
+    """Пиковый резидентный объём памяти процесса"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS - байты
+    return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+
+@contextmanager
+def timer(results, name):
+    """Замер времени выполнения блока в секундах"""
+    started = time.perf_counter()
+    yield
+    results[name] = time.perf_counter() - started
+
+
+def time_call(func, repeat=50):
+    """Медиана и p95 времени вызова функции в миллисекундах"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples = np.array(samples)
+    return float(np.median(samples)), float(np.percentile(samples, 95))
+
+
+def format_bytes(value):
+    """Человекочитаемый размер"""
+    for unit in ['Б', 'КБ', 'МБ', 'ГБ']:
+        if abs(value) < 1024:
+            return '%.1f %s' % (value, unit)
+        value /= 1024
+    return '%.1f ТБ' % value
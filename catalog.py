@@ -0,0 +1,154 @@
+"""
+Каталог товаров: компактные записи и индекс поиска
+
+Записи товаров и остатков хранятся в объектах со __slots__ и доступны
+по артикулу за O(1). Поиск с подсказками идёт по отсортированному списку
+токенов (слова названия, артикул, код WB): все токены с заданным
+префиксом лежат в массиве подряд, и их диапазон находится бинарным поиском.
+"""
+import re
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Токены для поиска: слова в нижнем регистре"""
+    return TOKEN_PATTERN.findall(str(text).lower()) if text is not None else []
+
+
+class ProductRecord:
+    """
+    Карточка товара
+    """
+
+    __slots__ = (
+        'product_id', 'title', 'article', 'quantity_in_set', 'wb_code',
+        'orders', 'orders_change', 'sizes', 'default_size', 'monthly_plan',
+        'daily_plan', 'abc_category', 'cost_price', 'photo_url'
+    )
+
+    def __init__(self, product_id, data):
+        self.product_id = product_id
+        for field in self.__slots__[1:]:
+            setattr(self, field, data.get(field))
+        if self.article is None:
+            self.article = product_id
+        self.sizes = tuple(self.sizes or ())
+
+    def to_dict(self):
+        """Запись в виде словаря в формате products.json"""
+        data = {field: getattr(self, field) for field in self.__slots__[1:]}
+        data['sizes'] = list(self.sizes)
+        return data
+
+
+class InventoryRecord:
+    """
+    Остатки товара
+    """
+
+    __slots__ = (
+        'product_id', 'name', 'cost_price', 'wb_warehouse', 'to_client',
+        'from_client', 'own_warehouses', 'in_transit', 'expected_delivery',
+        'total_value', 'avg_sales_period', 'days_remaining', 'end_date',
+        'last_update'
+    )
+
+    def __init__(self, product_id, data):
+        self.product_id = product_id
+        for field in self.__slots__[1:]:
+            setattr(self, field, data.get(field))
+
+    def copy(self):
+        """Копия записи: записи каталога общие для всех запросов"""
+        record = InventoryRecord.__new__(InventoryRecord)
+        for field in self.__slots__:
+            setattr(record, field, getattr(self, field))
+        return record
+
+    def to_dict(self):
+        """Запись в виде словаря в формате inventory.json"""
+        return {field: getattr(self, field) for field in self.__slots__[1:]}
+
+
+class ProductCatalog:
+    """
+    Справочник товаров с поиском по артикулу, названию и коду WB
+    """
+
+    def __init__(self, products_data, inventory_data=None):
+        inventory_data = inventory_data or {}
+        self.ids = list(products_data)
+        self._index = {product_id: i for i, product_id in enumerate(self.ids)}
+        self.products = [ProductRecord(product_id, products_data[product_id]) for product_id in self.ids]
+        self.inventory = [
+            InventoryRecord(product_id, inventory_data[product_id]) if product_id in inventory_data else None
+            for product_id in self.ids
+        ]
+        # Популярность для ранжирования результатов поиска
+        self.orders = np.array([record.orders or 0 for record in self.products], dtype=np.int64)
+        self._build_search_index()
+
+    def _build_search_index(self):
+        """Отсортированные токены и номера товаров, которым они принадлежат"""
+        tokens = []
+        owners = []
+        for i, record in enumerate(self.products):
+            record_tokens = set()
+            for text in (record.product_id, record.article, record.wb_code, record.title):
+                record_tokens.update(tokenize(text))
+            tokens.extend(record_tokens)
+            owners.extend([i] * len(record_tokens))
+        tokens = np.array(tokens, dtype=str)
+        order = np.argsort(tokens, kind='stable')
+        self._tokens = tokens[order]
+        self._token_products = np.array(owners, dtype=np.int32)[order]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, product_id):
+        return product_id in self._index
+
+    @property
+    def default_id(self):
+        """Товар, показываемый по умолчанию"""
+        return self.ids[0] if self.ids else None
+
+    def get(self, product_id):
+        """Карточка товара по артикулу"""
+        i = self._index.get(product_id)
+        return None if i is None else self.products[i]
+
+    def get_inventory(self, product_id):
+        """Остатки товара по артикулу"""
+        i = self._index.get(product_id)
+        return None if i is None else self.inventory[i]
+
+    def _prefix_matches(self, prefix):
+        """Номера товаров, у которых есть токен с данным префиксом"""
+        lo, hi = np.searchsorted(self._tokens, [prefix, prefix + '\uffff'])
+        return self._token_products[lo:hi]
+
+    def search(self, query, limit=20):
+        """Поиск товаров по началу слов запроса
+
+        Каждое слово запроса должно быть началом какого-либо токена товара.
+        Результаты упорядочены по числу заказов.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return self.ids[:limit]
+        matches = None
+        for token in tokens:
+            found = np.unique(self._prefix_matches(token))
+            matches = found if matches is None else np.intersect1d(matches, found, assume_unique=True)
+            if len(matches) == 0:
+                return []
+        if len(matches) > limit:
+            top = np.argpartition(-self.orders[matches], limit - 1)[:limit]
+            matches = matches[top]
+        matches = matches[np.argsort(-self.orders[matches], kind='stable')]
+        return [self.ids[i] for i in matches]
@@ -0,0 +1,150 @@
+"""
+Подготовка графиков: прореживание рядов и кэш построенных фигур
+
+Ряд продаж по дням за несколько лет содержит тысячи точек, а на графике
+шириной в несколько сотен пикселей различимо не больше точки на пиксель.
+Перед построением ряд прореживается до max_points точек методом LTTB
+(Largest-Triangle-Three-Buckets, сохраняет форму кривой) или min/max по
+корзинам (сохраняет пики). Построенные фигуры кэшируются по ключу
+(график, фильтры, версия данных, день), поэтому при повторном запуске
+скрипта с теми же фильтрами plotly express не вызывается.
+"""
+import threading
+import time
+from datetime import date
+
+import numpy as np
+
+from .query_cache import QueryCache
+
+
+def max_points_for_width(width_px, points_per_px=1.0):
+    """Предел точек ряда для графика заданной ширины"""
+    return max(3, int(width_px * points_per_px))
+
+
+def _as_float(values):
+    """Ось X в числах (даты - в наносекундах)"""
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ns]').astype(np.int64).astype(np.float64)
+    return values.astype(np.float64)
+
+
+def lttb_indices(x, y, max_points):
+    """Индексы точек, отобранных методом LTTB
+
+    Первая и последняя точки сохраняются всегда. Остальные делятся на
+    max_points - 2 корзины; из каждой берётся точка, образующая
+    наибольший треугольник с выбранной точкой предыдущей корзины и
+    средним следующей.
+    """
+    n = len(y)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+    x = _as_float(x)
+    y = np.asarray(y, dtype=np.float64)
+    edges = (np.arange(max_points - 1) * ((n - 2) / (max_points - 2)) + 1).astype(np.int64)
+    edges[-1] = n - 1
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(max_points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[hi:next_hi].mean()
+        avg_y = y[hi:next_hi].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a])
+        )
+        a = lo + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(y, max_points):
+    """Индексы минимума и максимума в каждой из max_points / 2 корзин"""
+    n = len(y)
+    if max_points >= n or max_points < 2:
+        return np.arange(n)
+    y = np.asarray(y, dtype=np.float64)
+    bucket = np.arange(n) * (max_points // 2) // n
+    # Внутри корзины точки упорядочены по значению: первая - минимум, последняя - максимум
+    order = np.lexsort((y, bucket))
+    starts = np.flatnonzero(np.r_[True, bucket[order][1:] != bucket[order][:-1]])
+    ends = np.r_[starts[1:], n] - 1
+    return np.unique(np.concatenate([order[starts], order[ends]]))
+
+
+def downsample(series, max_points, method='lttb'):
+    """Прореживание ряда pandas (индекс - ось X) до max_points точек"""
+    if len(series) <= max_points:
+        return series
+    if method == 'minmax':
+        selected = minmax_indices(series.to_numpy(), max_points)
+    else:
+        selected = lttb_indices(series.index.to_numpy(), series.to_numpy(), max_points)
+    return series.iloc[selected]
+
+
+class FigureCache:
+    """
+    Кэш построенных фигур plotly со статистикой по графикам
+
+    Для каждого графика хранится время последнего построения, объём JSON,
+    который уходит в браузер, и число точек до и после прореживания.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self._cache = QueryCache(max_bytes)
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def get(self, chart, filters, data_key, build):
+        """Фигура из кэша либо результат build() с замером построения
+
+        data_key - идентификатор обработчика и версия его данных: кэш живёт
+        дольше обработчика, а версия нового обработчика начинается с нуля.
+        build возвращает фигуру или пару (фигура, {'points': ..., 'shown': ...}).
+        Фигуры общие для всех сессий и не должны изменяться после построения.
+        """
+        key = (chart, tuple(filters), data_key, date.today())
+        entry = self._cache.get(key)
+        if entry is not None:
+            with self._lock:
+                self._stats.setdefault(chart, {}).setdefault('hits', 0)
+                self._stats[chart]['hits'] += 1
+            return entry[0]
+
+        # plotly загружается только при первом построении
+        import plotly.io
+
+        started = time.perf_counter()
+        figure = build()
+        points = {}
+        if isinstance(figure, tuple):
+            figure, points = figure
+        build_ms = (time.perf_counter() - started) * 1000
+        payload_bytes = len(plotly.io.to_json(figure, validate=False))
+        self._cache.put(key, (figure, payload_bytes), size=payload_bytes)
+        with self._lock:
+            stats = self._stats.setdefault(chart, {})
+            stats.update(points)
+            stats.update({
+                'build_ms': round(build_ms, 1),
+                'payload_bytes': payload_bytes,
+                'builds': stats.get('builds', 0) + 1
+            })
+            stats.setdefault('hits', 0)
+        return figure
+
+    def stats(self):
+        """Статистика по графикам: построения, попадания, время и объём"""
+        with self._lock:
+            return {chart: dict(stats) for chart, stats in self._stats.items()}
+
+    def clear(self):
+        """Очистка кэша фигур (статистика сохраняется)"""
+        self._cache.clear()
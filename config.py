@@ -14,7 +14,43 @@ APP_CONFIG = {
 DATA_CONFIG = {
     'data_path': 'data/',
     'cache_ttl': 300,  # время кэширования в секундах
-    'auto_refresh': True
+    'auto_refresh': True,
+    'query_cache_bytes': 64 * 1024 * 1024,  # бюджет кэша запросов в байтах
+    'streaming': False,  # потоковая загрузка sales.csv для очень больших выгрузок
+    'chunk_rows': 500_000,  # строк в одной части при потоковой загрузке
+    'raw_window_days': 90,  # за сколько последних дней хранить строки в потоковом режиме
+    'engine': 'pandas',  # хранение продаж и оплат: 'pandas' (в памяти), 'sqlite' (файл базы) или 'partitions' (продажи по месяцам)
+    'partitions_path': None,  # каталог партиций продаж, None - data/.cache/partitions
+    'partition_by_product': False,  # партиции месяц x товар вместо месяца
+    'plane_path': None  # каталог общего снимка от процесса-загрузчика (modules.shared_plane), None - читать файлы самим
+}
+
+# Настройки прогноза остатков
+FORECAST_CONFIG = {
+    'history_days': 56,  # глубина истории для оценки скорости продаж, дни
+    'ewma_alpha': 0.1,  # вес последнего дня в экспоненциальном среднем
+    'horizon_days': 30,  # горизонт упущенных продаж без ожидаемой поставки, дни
+    'low_stock_days': 7  # запас меньше этого числа дней считается малым в календаре
+}
+
+# Настройки симуляции риска дефицита
+STOCKOUT_CONFIG = {
+    'enabled': True,  # вероятность отсутствия и P10/P50/P90 дней запаса в разделе склада
+    'n_paths': 1000,  # сценариев спроса на SKU
+    'horizon_days': 60,  # горизонт симуляции, дни
+    'delay_probability': 0.3,  # вероятность опоздания поставки
+    'max_delay_days': 14,  # наибольшее опоздание поставки, дни
+    'seed': 0,  # одинаковый seed - одинаковый результат на одних данных
+    'workers': None,  # процессов симуляции, None - по числу ядер
+    'parallel_min_skus': 20000  # с этого числа SKU симуляция идёт в пуле процессов
+}
+
+# Настройки ABC классификации
+ABC_CONFIG = {
+    'enabled': True,  # категории по выручке за окно; False - колонка abc_category из файлов
+    'window_days': 90,  # окно выручки, дни до последнего дня продаж
+    'a_share': 0.8,  # доля выручки товаров класса A
+    'b_share': 0.95  # накопленная доля выручки товаров классов A и B
 }
 
 # Настройки фильтров
@@ -32,7 +68,12 @@ CHART_CONFIG = {
     'color_scheme': ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd'],
     'background_color': 'rgba(0,0,0,0)',
     'grid_color': '#e0e0e0',
-    'font_family': 'Arial, sans-serif'
+    'font_family': 'Arial, sans-serif',
+    'width_px': 900,  # ширина графика динамики продаж, пиксели
+    'points_per_px': 1.0,  # предел точек ряда на пиксель ширины
+    'downsampling': 'lttb',  # прореживание рядов: 'lttb' или 'minmax'
+    'figure_cache_bytes': 32 * 1024 * 1024,  # бюджет кэша построенных графиков в байтах
+    'show_chart_stats': False  # показывать время построения и объём графиков
 }
 
 # Настройки метрик
@@ -57,10 +98,43 @@ UPDATE_CONFIG = {
     'update_format': '%d.%m.%Y %H:%M'
 }
 
+# Настройки загрузки данных из API маркетплейса и поставщика (modules.ingest)
+INGEST_CONFIG = {
+    'url': None,  # адрес API; None - данные приходят только файлами
+    'token_env': 'WAREHOUSE_API_TOKEN',  # переменная окружения с токеном API
+    'interval_seconds': 900,  # интервал фоновой загрузки
+    'concurrency': 16,  # одновременных запросов (и соединений keep-alive)
+    'rate_per_second': None,  # лимит запросов API в секунду, None - подбирается по ответам 429
+    'page_size': 1000,  # записей на странице
+    'window_days': 7,  # окно дат одного курсора заказов и оплат
+    'history_days': 365  # глубина первой загрузки заказов и оплат, дни
+}
+
+# HTTP API данных для отчётов и скриптов (modules.data_api), в процессе дашборда
+API_CONFIG = {
+    'enabled': False,
+    'host': '127.0.0.1',
+    'port': 8502,
+    'threads': 4,  # потоков для расчёта ответов
+    'body_cache_bytes': 32 * 1024 * 1024  # кэш готовых ответов по ETag
+}
+
 # Настройки экспорта
 EXPORT_CONFIG = {
     'formats': ['CSV', 'Excel', 'JSON'],
-    'default_format': 'Excel'
+    'default_format': 'Excel',
+    'chunk_rows': 100_000,  # строк в одной части при записи файла
+    'max_workers': 2,  # одновременных выгрузок на процесс
+    'export_dir': None,  # каталог файлов выгрузки, None - временный каталог системы
+    'max_age_seconds': 3600,  # через сколько секунд файлы выгрузки удаляются
+    'poll_seconds': 0.5  # период обновления хода выгрузки на странице
+}
+
+# Диагностика: замеры методов обработчика данных и разделов дашборда
+DIAGNOSTICS_CONFIG = {
+    'enabled': False,  # без включения методы не оборачиваются и замеров нет
+    'max_samples': 2048,  # последних замеров на метод для p50/p95/p99
+    'query_param': 'diagnostics'  # страница диагностики: адрес дашборда с ?diagnostics=1
 }
 
 # Сообщения и тексты
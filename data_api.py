@@ -0,0 +1,332 @@
+"""
+HTTP API данных склада (ASGI) для отчётов и скриптов закупок
+
+Отдаёт те же выборки, что и дашборд, из одного DataHandler процесса:
+продажи за период, продажи по дням, метрики продаж, остатки и карточку
+товара, прогноз по SKU и метрики оплат - в JSON или, с ?format=arrow
+или заголовком Accept: application/vnd.apache.arrow.stream, в Arrow IPC
+(нужен pyarrow).
+
+ETag ответа - версия данных и хэш запроса (путь, параметры, формат,
+текущий день). Запрос с совпадающим If-None-Match получает 304 без
+обращения к обработчику, готовые тела ответов хранятся в LRU кэше по
+ETag. Методы обработчика выполняются в пуле потоков: цикл событий не
+ждёт расчётов, а обновление данных собирает новое состояние рядом с
+текущим, поэтому запросы во время обновления дочитывают старую версию.
+
+    python -m modules.data_api --data data --port 8502 --refresh-interval 60
+    curl 'http://127.0.0.1:8502/api/sales?period=неделя&abc=A&limit=100'
+"""
+import argparse
+import asyncio
+import hashlib
+import importlib.util
+import io
+import json
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from urllib.parse import parse_qsl
+
+import numpy as np
+import pandas as pd
+
+from .query_cache import QueryCache
+from .rollup import ABC_CLASSES
+
+logger = logging.getLogger(__name__)
+
+JSON_TYPE = 'application/json; charset=utf-8'
+ARROW_TYPE = 'application/vnd.apache.arrow.stream'
+PERIODS = ['день', 'неделя', 'месяц', 'год', 'весь период']
+# Параметр запроса -> аргумент метода DataHandler и значение по умолчанию
+PARAMS = {
+    'period': ('period', 'месяц'),
+    'abc': ('abc_filter', 'Все'),
+    'size': ('size_filter', 'Все'),
+    'product_id': ('product_id', None)
+}
+# Путь -> (вызов обработчика, параметры, результат - таблица)
+ENDPOINTS = {
+    '/api/version': (
+        lambda h: {'data_version': h.data_version, 'updated_at': h.updated_at.isoformat(timespec='seconds')},
+        [], False
+    ),
+    '/api/sales': (lambda h, **kw: h.get_sales_by_period(**kw), ['period', 'abc', 'size'], True),
+    '/api/sales/daily': (lambda h, **kw: h.get_daily_sales(**kw), ['period', 'abc', 'size'], True),
+    '/api/metrics': (lambda h, **kw: h.get_sales_metrics(**kw), ['period', 'abc', 'size'], False),
+    '/api/inventory': (lambda h, **kw: h.get_inventory_info(**kw), ['product_id'], False),
+    '/api/product': (lambda h, **kw: h.get_product_info(**kw), ['product_id'], False),
+    '/api/forecast': (lambda h, **kw: h.get_forecast_data(**kw), ['product_id'], True),
+    '/api/payments/metrics': (lambda h: h.get_payment_metrics(), [], False)
+}
+
+
+def _plain(value):
+    """Значение для JSON и Arrow: типы NumPy и pandas -> Python, NaN и inf -> None"""
+    if isinstance(value, dict):
+        return {str(key): _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_plain(item) for item in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if value is pd.NaT:
+        return None
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def encode_json(value):
+    if isinstance(value, pd.DataFrame):
+        return value.to_json(orient='records', date_format='iso', date_unit='s', force_ascii=False).encode('utf-8')
+    return json.dumps(_plain(value), ensure_ascii=False).encode('utf-8')
+
+
+def encode_arrow(value):
+    """Поток Arrow IPC: таблица целиком или словарь одной строкой"""
+    import pyarrow as pa
+
+    if isinstance(value, pd.DataFrame):
+        table = pa.Table.from_pandas(value, preserve_index=False)
+    else:
+        table = pa.Table.from_pylist([_plain(value)])
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def _if_none_match(header):
+    """ETag из заголовка If-None-Match (слабые сравниваются как сильные)"""
+    return {tag.strip().removeprefix('W/') for tag in header.split(',') if tag.strip()}
+
+
+class DataApi:
+    """
+    ASGI приложение над DataHandler
+
+    handler можно подменить на ходу (например, при пересоздании
+    обработчика дашборда); пока он None, API отвечает 503.
+    """
+
+    def __init__(self, handler=None, threads=4, body_cache_bytes=32 * 1024 * 1024):
+        self.bodies = QueryCache(body_cache_bytes)
+        self.handler = handler
+        self.arrow = importlib.util.find_spec('pyarrow') is not None
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='data-api')
+        self.requests = 0
+        self.not_modified = 0
+
+    @property
+    def handler(self):
+        return self._handler
+
+    @handler.setter
+    def handler(self, handler):
+        # Тела ответов прежнего обработчика больше не нужны
+        if handler is not getattr(self, '_handler', None):
+            self.bodies.clear()
+        self._handler = handler
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        status, headers, body = await self._respond(scope)
+        headers.append(('Content-Length', str(len(body))))
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+        })
+        await send({'type': 'http.response.body', 'body': b'' if scope['method'] == 'HEAD' else body})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self._executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    def _error(status, message, headers=()):
+        return status, [('Content-Type', JSON_TYPE), *headers], encode_json({'error': message})
+
+    def _parse(self, params, query, accept):
+        """Аргументы метода, формат и окно строк из параметров запроса
+
+        ValueError - неизвестный параметр или недопустимое значение.
+        """
+        allowed = set(params) | {'format', 'limit', 'offset'}
+        unknown = set(query) - allowed
+        if unknown:
+            raise ValueError('неизвестные параметры: %s' % ', '.join(sorted(unknown)))
+        kwargs = {}
+        for name in params:
+            argument, default = PARAMS[name]
+            kwargs[argument] = query.get(name) or default
+        if kwargs.get('period', PERIODS[0]) not in PERIODS:
+            raise ValueError('period: одно из %s' % ', '.join(PERIODS))
+        if kwargs.get('abc_filter', 'Все') not in ['Все', *ABC_CLASSES]:
+            raise ValueError('abc: одно из Все, %s' % ', '.join(ABC_CLASSES))
+
+        fmt = query.get('format') or ('arrow' if ARROW_TYPE in accept else 'json')
+        if fmt not in ('json', 'arrow'):
+            raise ValueError('format: json или arrow')
+        try:
+            limit = int(query['limit']) if query.get('limit') else None
+            offset = int(query.get('offset') or 0)
+        except ValueError:
+            raise ValueError('limit и offset - целые числа')
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError('limit и offset не могут быть отрицательными')
+        return kwargs, fmt, limit, offset
+
+    @staticmethod
+    def _etag(instance_id, version, path, kwargs, fmt, limit, offset):
+        # Окна периодов отсчитываются от сегодняшней даты, поэтому день входит в хэш.
+        # Версия данных нового обработчика снова начинается с нуля, поэтому
+        # ETag включает идентификатор экземпляра обработчика
+        request = repr((date.today().isoformat(), path, sorted(kwargs.items()), fmt, limit, offset))
+        return '"%s-%d-%s"' % (
+            instance_id, version, hashlib.blake2b(request.encode('utf-8'), digest_size=8).hexdigest()
+        )
+
+    def _render(self, handler, call, table, kwargs, fmt, limit, offset):
+        """Вызов метода обработчика и сериализация, выполняется в пуле потоков"""
+        value = call(handler, **kwargs)
+        if isinstance(value, pd.Series):
+            value = value.reset_index()
+        if table:
+            value = value.iloc[offset:offset + limit if limit is not None else None]
+        elif not value:
+            raise LookupError('товар не найден')
+        return encode_arrow(value) if fmt == 'arrow' else encode_json(value)
+
+    async def _respond(self, scope):
+        """Статус, заголовки и тело ответа"""
+        self.requests += 1
+        if scope['method'] not in ('GET', 'HEAD'):
+            return self._error(405, 'метод не поддерживается', [('Allow', 'GET, HEAD')])
+        path = scope['path'].rstrip('/') or '/'
+        if path not in ENDPOINTS:
+            return self._error(404, 'неизвестный ресурс: %s' % path)
+        handler = self.handler
+        if handler is None:
+            return self._error(503, 'данные ещё не загружены', [('Retry-After', '1')])
+        call, params, table = ENDPOINTS[path]
+        headers = {name.decode('latin-1'): value.decode('latin-1') for name, value in scope['headers']}
+        query = dict(parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True))
+        try:
+            kwargs, fmt, limit, offset = self._parse(params, query, headers.get('accept', ''))
+        except ValueError as e:
+            return self._error(400, str(e))
+        if fmt == 'arrow' and not self.arrow:
+            return self._error(406, 'формат arrow недоступен: не установлен pyarrow')
+
+        content_type = ARROW_TYPE if fmt == 'arrow' else JSON_TYPE
+        version = handler.data_version
+        etag = self._etag(handler.instance_id, version, path, kwargs, fmt, limit, offset)
+        cache_headers = [('ETag', etag), ('Cache-Control', 'no-cache'), ('Vary', 'Accept')]
+        if etag in _if_none_match(headers.get('if-none-match', '')):
+            self.not_modified += 1
+            return 304, cache_headers, b''
+        body = self.bodies.get(etag)
+        if body is not None:
+            return 200, [('Content-Type', content_type), *cache_headers], body
+
+        loop = asyncio.get_running_loop()
+        try:
+            body = await loop.run_in_executor(
+                self._executor, self._render, handler, call, table, kwargs, fmt, limit, offset
+            )
+        except LookupError as e:
+            return self._error(404, str(e))
+        except Exception:
+            logger.exception('Ошибка запроса %s', path)
+            return self._error(500, 'внутренняя ошибка')
+        if handler.data_version != version:
+            # Данные обновились во время расчёта: ответ не привязывается к версии
+            return 200, [('Content-Type', content_type), ('Cache-Control', 'no-store')], body
+        self.bodies.put(etag, body, size=len(body))
+        return 200, [('Content-Type', content_type), *cache_headers], body
+
+
+class ApiServer:
+    """
+    Сервер uvicorn для DataApi в фоновом потоке, рядом с дашбордом
+    """
+
+    def __init__(self, app, host='127.0.0.1', port=8502):
+        self.app = app
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://%s:%d' % (self.host, self.port)
+
+    def start(self):
+        """Запуск сервера; при port=0 порт выбирается свободный"""
+        import uvicorn
+
+        config = uvicorn.Config(
+            self.app, host=self.host, port=self.port, lifespan='on', access_log=False, log_level='warning'
+        )
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, name='data-api-server', daemon=True)
+        self._thread.start()
+        while not self._server.started:
+            if not self._thread.is_alive():
+                raise RuntimeError('Сервер API не запустился на %s' % self.url)
+            time.sleep(0.01)
+        self.port = self._server.servers[0].sockets[0].getsockname()[1]
+        return self
+
+    def stop(self):
+        self._server.should_exit = True
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HTTP API данных склада')
+    parser.add_argument('--data', default='data', help='каталог исходных данных')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8502)
+    parser.add_argument('--engine', default='pandas', choices=['pandas', 'sqlite', 'partitions'])
+    parser.add_argument('--threads', type=int, default=4, help='потоков для расчёта ответов')
+    parser.add_argument('--refresh-interval', type=float, default=60.0,
+                        help='проверка исходных файлов, секунды; 0 - без обновления')
+    args = parser.parse_args()
+
+    import uvicorn
+
+    from .data_handler import DataHandler
+
+    handler = DataHandler(data_path=args.data, engine=args.engine, lazy=False)
+    if args.refresh_interval > 0:
+        handler.start_refresh_worker(args.refresh_interval)
+    uvicorn.run(DataApi(handler, threads=args.threads), host=args.host, port=args.port, access_log=False)
+
+
+if __name__ == '__main__':
+    main()
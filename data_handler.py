@@ -1,20 +1,404 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+import io
 import json
+import logging
 import os
+import threading
+import uuid
+import weakref
+
+from .abc_analysis import classify_products, product_prices
+from .catalog import ProductCatalog
+from .forecast import forecast_stock, project_stock
+from .instrumentation import add_rows
+from .partitions import PartitionStore
+from .payments import payment_analytics, read_payments_csv
+from .query_cache import QueryCache, cached_query
+from .rollup import ABC_CLASSES, DailyRollup
+from .sales_store import (
+    as_sales_frame,
+    concat_sales,
+    load_sales_snapshot,
+    read_sales_csv,
+    read_snapshot_meta,
+    save_sales_snapshot,
+    sort_by_date,
+    stream_sales_csv,
+    trim_to_window
+)
+from .shared_plane import PlaneTracker, SharedPlane
+from .sources import APPENDED, UNCHANGED, SourceTracker
+from .sql_store import SqlStore
+from .stockout import simulate_stockout
+from .synthetic import SyntheticWarehouse
+
+logger = logging.getLogger(__name__)
+
+class DataState:
+    """
+    Согласованный набор данных одной версии
+    
+    Обработчик держит ссылку на текущее состояние. Обновление собирает
+    новое состояние рядом со старым и подменяет ссылку одним
+    присваиванием, поэтому читатели не ждут обновления и не видят
+    частично обновлённых данных.
+    """
+    
+    def __init__(self, version=0):
+        self.version = version
+        self.updated_at = datetime.now()
+    
+    def copy(self):
+        """Следующее состояние: те же объекты данных, неизменённые источники общие"""
+        state = DataState.__new__(DataState)
+        state.__dict__.update(self.__dict__)
+        return state
+
+class _LazySource:
+    """
+    Атрибут обработчика, который загружается при первом обращении
+    
+    Значение хранится в текущем DataState. Загрузчик получает состояние,
+    в которое нужно записать данные.
+    """
+    
+    def __init__(self, loader):
+        self.loader = loader
+    
+    def __set_name__(self, owner, name):
+        self.name = name
+    
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        try:
+            return instance._state.__dict__[self.name]
+        except KeyError:
+            pass
+        with instance._load_lock:
+            return self.load(instance, instance._state)
+    
+    def load(self, instance, state):
+        """Значение из заданного состояния, загрузка при первом обращении"""
+        try:
+            return state.__dict__[self.name]
+        except KeyError:
+            pass
+        with instance._load_lock:
+            if self.name not in state.__dict__:
+                getattr(instance, self.loader)(state)
+            return state.__dict__[self.name]
+    
+    def __set__(self, instance, value):
+        instance._state.__dict__[self.name] = value
 
 class DataHandler:
     """
     Класс для обработки данных дашборда склада
     """
     
-    def __init__(self):
-        self.data_path = os.path.join(os.path.dirname(__file__), '..', 'data')
-        self.products_data = self._load_products_data()
-        self.sales_data = self._load_sales_data()
-        self.inventory_data = self._load_inventory_data()
-        self.payments_data = self._load_payments_data()
+    SOURCE_FILES = ['products.json', 'sales.csv', 'inventory.json', 'payments.csv']
+    # Атрибут, в который загружается каждый исходный файл
+    SOURCE_ATTRIBUTES = {
+        'products.json': 'products_data',
+        'sales.csv': 'sales_data',
+        'inventory.json': 'inventory_data',
+        'payments.csv': 'payments_data'
+    }
+    
+    # Источники загружаются при первом обращении, а не в __init__
+    products_data = _LazySource('_init_products')
+    sales_data = _LazySource('_init_sales')
+    rollup = _LazySource('_init_sales')
+    inventory_data = _LazySource('_init_inventory')
+    payments_data = _LazySource('_init_payments')
+    catalog = _LazySource('_init_catalog')
+    
+    def __init__(self, data_path=None, use_snapshot=True, query_cache_bytes=64 * 1024 * 1024,
+                 forecast_params=None, streaming=False, chunk_rows=500_000, raw_window_days=None,
+                 lazy=True, engine='pandas', db_path=None, plane_dir=None, abc_params=None,
+                 partitions_dir=None, partition_by_product=False, stockout_params=None):
+        if data_path is None:
+            data_path = os.path.join(os.path.dirname(__file__), '..', 'data')
+        self.data_path = data_path
+        self.use_snapshot = use_snapshot
+        self.forecast_params = forecast_params or {}
+        # ABC категории по выручке за окно (window_days, a_share, b_share)
+        # вместо колонки abc_category; None - категории из файлов
+        self.abc_params = abc_params
+        self._store_classes = None
+        # Цены товаров для классификации: (справочник, цены по оси товаров агрегата)
+        self._abc_prices = (None, None)
+        # Симуляция риска дефицита (n_paths, horizon_days, delay_probability,
+        # max_delay_days, workers, ...); None - симуляция выключена
+        self.stockout_params = stockout_params
+        self._stockout = (None, None)
+        self._stockout_lock = threading.Lock()
+        self._stockout_thread = None
+        self._stockout_start_lock = threading.Lock()
+        # Потоковый режим: sales.csv читается частями по chunk_rows строк,
+        # строки хранятся только за последние raw_window_days дней
+        self.streaming = streaming
+        self.chunk_rows = chunk_rows
+        self.raw_window_days = raw_window_days
+        self.snapshot_path = os.path.join(self.data_path, '.cache')
+        # Движок хранения: 'pandas' - таблицы в памяти, 'sqlite' - строки
+        # продаж и оплат в файле базы, фильтры и агрегаты выполняются в SQL,
+        # 'partitions' - продажи в партициях по месяцам, запрос за период
+        # открывает только пересекающиеся с ним партиции
+        self.engine = engine
+        self.store = None
+        # Хранилище оплат: в партициях лежат только продажи
+        self.payments_store = None
+        if engine == 'sqlite':
+            self.store = self.payments_store = SqlStore(
+                db_path or os.path.join(self.snapshot_path, 'warehouse.sqlite')
+            )
+        elif engine == 'partitions':
+            self.store = PartitionStore(
+                partitions_dir or os.path.join(self.snapshot_path, 'partitions'),
+                by_product=partition_by_product
+            )
+        elif engine != 'pandas':
+            raise ValueError("Неизвестный движок хранения: %s" % engine)
+        # Общий снимок: продажи, агрегат и оплаты публикует процесс-загрузчик,
+        # здесь они открываются через memory-map без копирования
+        self.plane = None
+        self._plane_sources = {}
+        if plane_dir is not None:
+            if engine != 'pandas':
+                raise ValueError("Общий снимок данных доступен только с движком pandas")
+            self.plane = SharedPlane(plane_dir)
+            self._plane_sources = {
+                'sales.csv': PlaneTracker(self.plane, ['sales', 'rollup']),
+                'payments.csv': PlaneTracker(self.plane, ['payments'])
+            }
+        self.query_cache = QueryCache(query_cache_bytes)
+        # Версия данных каждого обработчика начинается с нуля: ключи кэшей
+        # вне обработчика включают и этот идентификатор экземпляра
+        self.instance_id = uuid.uuid4().hex[:12]
+        self._state = DataState()
+        self._reload_lock = threading.Lock()
+        self._load_lock = threading.RLock()
+        self._refresh_thread = None
+        self._refresh_stop = threading.Event()
+        self._sources = {
+            file_name: SourceTracker(
+                os.path.join(self.data_path, file_name),
+                kind='json' if file_name.endswith('.json') else 'csv'
+            )
+            for file_name in self.SOURCE_FILES
+        }
+        if not lazy:
+            self._load_all()
+    
+    def _load_all(self):
+        """Загрузка всех источников данных сразу"""
+        for name in ['products_data', 'sales_data', 'inventory_data', 'payments_data', 'catalog']:
+            getattr(self, name)
+    
+    @property
+    def data_version(self):
+        """Версия данных: растёт при каждой подмене состояния"""
+        return self._state.version
+    
+    @property
+    def updated_at(self):
+        """Время, когда текущее состояние данных стало актуальным"""
+        return self._state.updated_at
+    
+    def _read(self, state, name):
+        """Атрибут-источник из снимка состояния
+        
+        Запрос берёт снимок self._state один раз и читает все источники
+        из него: подмена состояния посреди запроса не смешивает версии.
+        """
+        return getattr(type(self), name).load(self, state)
+    
+    def is_loaded(self, name):
+        """Загружен ли уже атрибут-источник (products_data, sales_data, ...)"""
+        return name in self._state.__dict__
+    
+    def _init_products(self, state):
+        """Загрузка товаров при первом обращении"""
+        state.products_data = self._load_products_data()
+    
+    def _init_sales(self, state):
+        """Загрузка продаж и дневного агрегата при первом обращении"""
+        state.sales_data, state.rollup = self._load_sales()
+        self._classify(state)
+    
+    def _init_inventory(self, state):
+        """Загрузка остатков при первом обращении"""
+        state.inventory_data = self._load_inventory_data()
+    
+    def _init_payments(self, state):
+        """Загрузка оплат при первом обращении"""
+        state.payments_data = self._load_payments_data()
+    
+    def _init_catalog(self, state):
+        """Построение каталога при первом обращении"""
+        state.catalog = ProductCatalog(self._read(state, 'products_data'), self._read(state, 'inventory_data'))
+    
+    def _changed_sources(self):
+        """Исходные файлы, изменившиеся с момента последнего чтения
+        
+        Ещё не загруженные источники не проверяются: они будут прочитаны
+        в актуальном состоянии при первом обращении.
+        """
+        changes = {}
+        for file_name in self.SOURCE_FILES:
+            if not self.is_loaded(self.SOURCE_ATTRIBUTES[file_name]):
+                continue
+            # Продажи и оплаты из общего снимка меняются с публикацией новой версии
+            tracker = self._plane_sources.get(file_name) or self._sources[file_name]
+            status = tracker.check()
+            if status != UNCHANGED:
+                changes[file_name] = status
+        return changes
+    
+    def sources_changed(self):
+        """Изменились ли исходные файлы с момента загрузки"""
+        return bool(self._changed_sources())
+    
+    def refresh_if_changed(self):
+        """Обновление данных при изменении исходных файлов
+        
+        Из дописанных CSV читается только новый хвост: строки добавляются
+        в таблицу, индекс по дате и копию дневного агрегата, поэтому
+        стоимость обновления пропорциональна объёму новых данных. JSON
+        перечитываются, только если изменилось их содержимое. Новое
+        состояние собирается рядом с текущим и подменяет его целиком.
+        Возвращает True, если данные изменились; тогда версия данных
+        увеличивается, а кэш запросов очищается.
+        """
+        if not self.sources_changed():
+            return False
+        with self._reload_lock, self._load_lock:
+            changes = self._changed_sources()
+            if not changes:
+                return False
+            state = self._state.copy()
+            for file_name, status in changes.items():
+                self._reload_source(state, file_name, status)
+            # Выручка зависит от продаж и себестоимости товаров
+            if 'sales.csv' in changes or 'products.json' in changes:
+                self._classify(state)
+            self._publish(state)
+        return True
+    
+    def _reload_source(self, state, file_name, status):
+        """Перечитывание одного источника в новое состояние: хвост при дозаписи, иначе целиком"""
+        if file_name == 'sales.csv':
+            if status == APPENDED:
+                new_rows = self._read_sales_tail()
+                if self.store is not None:
+                    # Хвост в хранилище дописывает sync_csv под его блокировкой:
+                    # другой процесс с тем же хранилищем мог уже перенести эти строки
+                    tracker = SourceTracker(self._sources['sales.csv'].path)
+                    self.store.sync_csv('sales', tracker, self.chunk_rows)
+                self._append_sales_rows(state, new_rows, write_store=False)
+            else:
+                state.sales_data, state.rollup = self._load_sales()
+        elif file_name == 'payments.csv':
+            if status == APPENDED and self.payments_store is None:
+                tracker = self._sources[file_name]
+                tail = tracker.read_tail()
+                if tail:
+                    new_rows = read_payments_csv(io.BytesIO(tail), header=None, names=tracker.columns)
+                    state.payments_data = pd.concat([state.payments_data, new_rows], ignore_index=True)
+            else:
+                state.payments_data = self._load_payments_data()
+        elif file_name == 'products.json':
+            state.products_data = self._load_products_data()
+            # Каталог будет пересобран при следующем обращении
+            state.__dict__.pop('catalog', None)
+        elif file_name == 'inventory.json':
+            state.inventory_data = self._load_inventory_data()
+            state.__dict__.pop('catalog', None)
+    
+    def _classify(self, state):
+        """Расчёт ABC категорий по выручке для агрегата нового состояния
+        
+        Категории записываются в копию агрегата (массивы продаж общие), и все
+        фильтры ABC - по агрегату, строкам и базе - используют их. Расчёт
+        идёт по префиксным суммам агрегата, поэтому после дозаписи строк
+        он не зависит от длины истории.
+        """
+        if self.abc_params is None or 'rollup' not in state.__dict__:
+            return
+        products_data = state.__dict__.get('products_data')
+        if products_data is None:
+            products_data = self.products_data
+        cached_data, prices = self._abc_prices
+        if cached_data is not products_data or len(prices) != len(state.rollup.products):
+            prices = product_prices(products_data, state.rollup.products)
+            self._abc_prices = (products_data, prices)
+        params = self.abc_params
+        classes = classify_products(
+            state.rollup, products_data,
+            window_days=params.get('window_days', 90),
+            a_share=params.get('a_share', 0.8),
+            b_share=params.get('b_share', 0.95),
+            prices=prices
+        )
+        state.rollup = state.rollup.with_abc(classes)
+        if self.store is not None:
+            previous = self._store_classes
+            if previous is None or len(previous) != len(classes) or not np.array_equal(previous, classes):
+                labels = np.array(ABC_CLASSES, dtype=object)[classes]
+                self.store.set_product_classes(state.rollup.products, labels.tolist())
+                self._store_classes = classes
+    
+    def _with_abc_labels(self, sales_rows, rollup):
+        """Колонка abc_category строк из рассчитанных категорий агрегата"""
+        if self.abc_params is None:
+            return sales_rows
+        return sales_rows.assign(abc_category=pd.Categorical.from_codes(
+            rollup.abc_codes(sales_rows['product_id']), categories=ABC_CLASSES
+        ))
+    
+    def _read_sales_tail(self):
+        """Разбор строк, дописанных в sales.csv после последнего чтения"""
+        tracker = self._sources['sales.csv']
+        tail = tracker.read_tail()
+        if not tail:
+            return None
+        return read_sales_csv(io.BytesIO(tail), header=None, names=tracker.columns)
+    
+    def _publish(self, state):
+        """Подмена текущего состояния новым: записи кэша запросов больше не действительны"""
+        state.version = self._state.version + 1
+        state.updated_at = datetime.now()
+        self._state = state
+        self.query_cache.clear()
+    
+    def start_refresh_worker(self, interval):
+        """Фоновый поток, проверяющий исходные файлы каждые interval секунд
+        
+        Обновление идёт вне запросов пользователей: читатели продолжают
+        работать с текущим состоянием до подмены. Поток держит слабую
+        ссылку на обработчик и завершается, когда обработчик удалён.
+        """
+        if self._refresh_thread is not None and self._refresh_thread.is_alive():
+            return
+        self._refresh_stop.clear()
+        self._refresh_thread = threading.Thread(
+            target=_refresh_loop,
+            args=(weakref.ref(self), self._refresh_stop, interval),
+            name='data-refresh',
+            daemon=True
+        )
+        self._refresh_thread.start()
+    
+    def stop_refresh_worker(self):
+        """Остановка фонового обновления"""
+        self._refresh_stop.set()
+        if self._refresh_thread is not None:
+            self._refresh_thread.join()
+            self._refresh_thread = None
     
     def _load_products_data(self):
         """Загрузка данных о товарах"""
@@ -22,8 +406,7 @@ class DataHandler:
             # Попытка загрузить из файла
             file_path = os.path.join(self.data_path, 'products.json')
             if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                return json.loads(self._sources['products.json'].read_all().decode('utf-8'))
         except:
             pass
         
@@ -46,38 +429,103 @@ class DataHandler:
             }
         }
     
+    def _load_sales(self):
+        """Загрузка таблицы продаж и построение дневного агрегата"""
+        if self.plane is not None:
+            # До первой публикации продажи читаются из файлов, как без снимка
+            data = self._plane_sources['sales.csv'].attach()
+            if data is not None:
+                return tuple(data)
+        tracker = self._sources['sales.csv']
+        if self.store is not None and os.path.exists(tracker.path):
+            return self._load_sales_store(tracker)
+        if self.streaming and os.path.exists(tracker.path):
+            return self._stream_sales_file(tracker)
+        sales_data = self._load_sales_data()
+        return sales_data, DailyRollup.from_sales(sales_data)
+    
+    def _load_sales_store(self, tracker):
+        """Синхронизация продаж в базе или партициях и построение агрегата по ним
+        
+        Строки продаж в памяти не хранятся (sales_data = None): запросы по
+        строкам выполняются хранилищем, агрегат строится проходом по нему частями.
+        """
+        self.store.sync_csv('sales', tracker, self.chunk_rows)
+        rollup = DailyRollup()
+        for chunk in self.store.sales_chunks(self.chunk_rows):
+            rollup.add(chunk)
+        return None, rollup
+    
+    def _stream_sales_file(self, tracker):
+        """Потоковая загрузка sales.csv: агрегат по всей истории, строки только за окно
+        
+        Колоночный снимок в этом режиме не используется: он хранит все строки,
+        а дневной агрегат всё равно строится проходом по всему файлу.
+        """
+        rollup = DailyRollup()
+        sales_data = stream_sales_csv(
+            tracker.open_full(),
+            rollup.add,
+            chunk_rows=self.chunk_rows,
+            raw_window_days=self.raw_window_days
+        )
+        return sales_data, rollup
+    
     def _load_sales_data(self):
         """Загрузка данных о продажах"""
         try:
             file_path = os.path.join(self.data_path, 'sales.csv')
             if os.path.exists(file_path):
-                return pd.read_csv(file_path)
+                return self._load_sales_file(self._sources['sales.csv'])
         except:
             pass
         
-        # Генерация примера данных о продажах
-        dates = pd.date_range(start='2024-01-01', end='2024-12-31', freq='D')
-        sales_data = []
+        # Пример данных о продажах: товар из примера справочника за 2024 год
+        sales_data = SyntheticWarehouse(product_ids=['tshirtwhite'], days=366, end='2024-12-31').sales_frame()
+        return sort_by_date(as_sales_frame(sales_data))
+    
+    def _load_sales_file(self, tracker):
+        """Загрузка продаж из колоночного снимка либо из CSV с сохранением снимка
+        
+        Если после сохранения снимка в sales.csv дописывались строки,
+        снимок загружается как есть, а из CSV разбирается только хвост.
+        """
+        if not self.use_snapshot:
+            return sort_by_date(read_sales_csv(tracker.open_full()))
         
-        for date in dates:
-            daily_sales = np.random.randint(20, 60)
-            sales_data.append({
-                'date': date,
-                'sales': daily_sales,
-                'product_id': 'tshirtwhite',
-                'size': np.random.choice(['XS', 'S', 'M', 'L', 'XL']),
-                'abc_category': 'A'
-            })
+        snapshot_dir = os.path.join(self.snapshot_path, 'sales')
+        meta = read_snapshot_meta(snapshot_dir)
+        if meta is not None and isinstance(meta.get('source'), dict):
+            tracker.restore(meta['source'])
+            status = tracker.check()
+            sales_data = load_sales_snapshot(snapshot_dir) if status in (UNCHANGED, APPENDED) else None
+            if sales_data is not None:
+                if status == UNCHANGED:
+                    return sales_data
+                new_rows = self._read_sales_tail()
+                if new_rows is not None:
+                    sales_data = sort_by_date(concat_sales(sales_data, as_sales_frame(new_rows)))
+                self._save_sales_snapshot(sales_data, snapshot_dir, tracker)
+                return sales_data
         
-        return pd.DataFrame(sales_data)
+        sales_data = sort_by_date(read_sales_csv(tracker.open_full()))
+        self._save_sales_snapshot(sales_data, snapshot_dir, tracker)
+        return sales_data
+    
+    def _save_sales_snapshot(self, sales_data, snapshot_dir, tracker):
+        """Сохранение снимка продаж вместе с состоянием исходного файла"""
+        try:
+            save_sales_snapshot(sales_data, snapshot_dir, source_state=tracker.state())
+        except OSError:
+            # Каталог данных может быть доступен только на чтение
+            pass
     
     def _load_inventory_data(self):
         """Загрузка данных об остатках"""
         try:
             file_path = os.path.join(self.data_path, 'inventory.json')
             if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                return json.loads(self._sources['inventory.json'].read_all().decode('utf-8'))
         except:
             pass
         
@@ -101,40 +549,25 @@ class DataHandler:
     
     def _load_payments_data(self):
         """Загрузка данных об оплатах"""
+        if self.plane is not None:
+            data = self._plane_sources['payments.csv'].attach()
+            if data is not None:
+                return data[0]
         try:
             file_path = os.path.join(self.data_path, 'payments.csv')
             if os.path.exists(file_path):
-                return pd.read_csv(file_path)
+                if self.payments_store is not None:
+                    self.payments_store.sync_csv('payments', self._sources['payments.csv'], self.chunk_rows)
+                    return self.payments_store.payments_frame()
+                return read_payments_csv(self._sources['payments.csv'].open_full())
         except:
             pass
         
-        # Генерация примера данных об оплатах
-        dates = pd.date_range(start='2024-01-01', end='2024-12-31', freq='M')
-        payments_data = []
-        
-        for date in dates:
-            payment_amount = np.random.randint(50000, 200000)
-            payments_data.append({
-                'date': date,
-                'amount': payment_amount,
-                'type': np.random.choice(['Поставщик', 'Логистика', 'Маркетплейс'])
-            })
-        
-        return pd.DataFrame(payments_data)
+        # Пример данных об оплатах за 2024 год
+        return SyntheticWarehouse(product_ids=['tshirtwhite'], days=366, end='2024-12-31').payments_frame()
     
-    def get_sales_by_period(self, period="месяц", abc_filter="A", size_filter="Все"):
-        """Получение данных о продажах за период"""
-        filtered_data = self.sales_data.copy()
-        
-        # Фильтрация по ABC категории
-        if abc_filter != "Все":
-            filtered_data = filtered_data[filtered_data['abc_category'] == abc_filter]
-        
-        # Фильтрация по размеру
-        if size_filter != "Все":
-            filtered_data = filtered_data[filtered_data['size'] == size_filter]
-        
-        # Фильтрация по периоду
+    def _period_bounds(self, period):
+        """Границы периода: (начало, конец), начало None для всего периода"""
         end_date = datetime.now()
         if period == "день":
             start_date = end_date - timedelta(days=1)
@@ -145,99 +578,353 @@ class DataHandler:
         elif period == "год":
             start_date = end_date - timedelta(days=365)
         else:  # весь период
-            start_date = filtered_data['date'].min()
+            start_date = None
+        return start_date, end_date
+    
+    def _date_slice(self, start_date, end_date, sales_data=None):
+        """Срез продаж по датам без копирования
+        
+        Таблица отсортирована по дате, поэтому границы окна находятся
+        бинарным поиском за O(log n), а результат - позиционный срез.
+        """
+        if sales_data is None:
+            sales_data = self.sales_data
+        dates = sales_data['date'].to_numpy()
+        lo = 0
+        if start_date is not None:
+            lo = dates.searchsorted(pd.Timestamp(start_date).to_datetime64(), side='left')
+        hi = dates.searchsorted(pd.Timestamp(end_date).to_datetime64(), side='right')
+        add_rows(hi - lo)
+        return sales_data.iloc[lo:hi]
+    
+    @cached_query
+    def get_sales_by_period(self, period="месяц", abc_filter="A", size_filter="Все", state=None):
+        """Получение данных о продажах за период"""
+        start_date, end_date = self._period_bounds(period)
+        # Загрузка агрегата синхронизирует хранилище с файлом
+        rollup = self._read(state, 'rollup')
+        if self.store is not None:
+            filtered_data = self.store.sales_frame(start_date, end_date, abc_filter, size_filter)
+            add_rows(len(filtered_data))
+            return self._with_abc_labels(filtered_data, rollup)
+        filtered_data = self._date_slice(start_date, end_date, self._read(state, 'sales_data'))
+        
+        # Фильтры ABC и размера применяются только к срезу периода
+        mask = None
+        if abc_filter != "Все" and self.abc_params is not None:
+            # Рассчитанные категории: товар строки сопоставляется с массивом классов агрегата
+            abc_code = ABC_CLASSES.index(abc_filter) if abc_filter in ABC_CLASSES else -2
+            mask = rollup.abc_codes(filtered_data['product_id']) == abc_code
+        elif abc_filter != "Все":
+            mask = (filtered_data['abc_category'] == abc_filter).to_numpy()
+        if size_filter != "Все":
+            size_mask = (filtered_data['size'] == size_filter).to_numpy()
+            mask = size_mask if mask is None else mask & size_mask
         
-        filtered_data = filtered_data[
-            (filtered_data['date'] >= start_date) & 
-            (filtered_data['date'] <= end_date)
-        ]
+        if mask is not None:
+            filtered_data = filtered_data[mask]
         
-        return filtered_data
+        return self._with_abc_labels(filtered_data, rollup)
     
-    def get_sales_metrics(self, period="месяц"):
-        """Получение основных метрик продаж"""
-        sales_data = self.get_sales_by_period(period)
+    def append_sales(self, new_rows):
+        """Добавление новых строк продаж с инкрементальным обновлением агрегатов"""
+        # Продажи загружаются до копирования состояния, чтобы копия их содержала
+        self.rollup
+        with self._reload_lock, self._load_lock:
+            state = self._state.copy()
+            if self._append_sales_rows(state, new_rows):
+                self._classify(state)
+                self._publish(state)
+    
+    def _append_sales_rows(self, state, new_rows, write_store=True):
+        """Дозапись строк в таблицу продаж и копию дневного агрегата нового состояния
         
-        total_sales = sales_data['sales'].sum()
+        write_store=False - строки уже в хранилище, обновляется только агрегат.
+        """
+        if new_rows is None or len(new_rows) == 0:
+            return False
+        new_rows = sort_by_date(as_sales_frame(new_rows))
+        if self.store is not None:
+            if write_store:
+                self.store.append('sales', new_rows, self._sources['sales.csv'])
+        else:
+            # Строки задним числом нарушают порядок, тогда таблица пересортировывается
+            sales_data = sort_by_date(concat_sales(state.sales_data, new_rows))
+            state.sales_data = trim_to_window(sales_data, self.raw_window_days)
+        # Текущий агрегат продолжают читать запросы, поэтому дописывается копия
+        rollup = state.rollup.copy()
+        rollup.add(new_rows)
+        state.rollup = rollup
+        return True
+    
+    @cached_query
+    def get_daily_sales(self, period="месяц", abc_filter="A", size_filter="Все", state=None):
+        """Продажи по дням за период из дневного агрегата"""
+        start_date, end_date = self._period_bounds(period)
+        return self._read(state, 'rollup').daily(start_date, end_date, abc_filter, size_filter)
+    
+    @cached_query
+    def get_sales_metrics(self, period="месяц", abc_filter="A", size_filter="Все", state=None):
+        """Получение основных метрик продаж
         
-        # Расчет изменения по сравнению с предыдущим периодом
-        if period == "месяц":
-            prev_start = datetime.now() - timedelta(days=60)
-            prev_end = datetime.now() - timedelta(days=30)
+        Продажи за период и за предыдущий период той же длины считаются
+        одним проходом с одними фильтрами: соседние окна по дневному агрегату
+        (или один запрос к базе). Для "весь период" сравнения нет и
+        change_percent равен None, как и при нулевых продажах в предыдущем
+        периоде. Упущенные продажи, текущий остаток и рекомендованный запас
+        суммируются по SKU прогноза, попавшим под фильтры ABC и размера.
+        """
+        start_date, end_date = self._period_bounds(period)
+        if start_date is None:
+            edges = [None, end_date]
         else:
-            prev_start = datetime.now() - timedelta(days=60)
-            prev_end = datetime.now() - timedelta(days=30)
+            edges = [start_date - (end_date - start_date), start_date, end_date]
+        totals = self._sales_totals(edges, abc_filter, size_filter, self._read(state, 'rollup'))
+        total_sales = int(totals[-1])
+        prev_sales = int(totals[0]) if len(totals) > 1 else 0
         
-        prev_sales = self.sales_data[
-            (self.sales_data['date'] >= prev_start) & 
-            (self.sales_data['date'] <= prev_end)
-        ]['sales'].sum()
+        change_percent = None
+        if prev_sales > 0:
+            change_percent = round((total_sales - prev_sales) / prev_sales * 100, 1)
         
-        change_percent = ((total_sales - prev_sales) / prev_sales * 100) if prev_sales > 0 else 0
+        selected, _ = self._forecast(state)
+        if abc_filter != "Все":
+            selected = selected[selected['abc_category'] == abc_filter]
+        if size_filter != "Все":
+            selected = selected[selected['size'] == size_filter]
         
         return {
             'total_sales': total_sales,
-            'change_percent': round(change_percent, 1),
-            'missed_sales': 570,  # Примерное значение
-            'current_stock': 13454,
-            'recommended_stock': 16000
+            'prev_sales': prev_sales,
+            'change_percent': change_percent,
+            'missed_sales': int(selected['missed_sales'].sum()),
+            'current_stock': int(selected['stock'].sum()),
+            'recommended_stock': int(selected['recommended_stock'].sum())
         }
     
-    def get_inventory_info(self, product_id="tshirtwhite"):
+    def _sales_totals(self, edges, abc_filter="Все", size_filter="Все", rollup=None):
+        """Суммы продаж по соседним окнам: запрос к базе или к дневному агрегату"""
+        if rollup is None:
+            rollup = self.rollup
+        if self.store is not None:
+            return self.store.totals_between(edges, abc_filter, size_filter)
+        return rollup.totals_between(edges, abc_filter, size_filter)
+    
+    def get_inventory_record(self, product_id=None):
+        """Остатки товара (InventoryRecord), None если товар не выбран или не найден
+        
+        Поля days_remaining и end_date берутся из прогноза остатков и
+        записываются в копию записи каталога.
+        """
+        if product_id is None:
+            return None
+        state = self._state
+        record = self._read(state, 'catalog').get_inventory(product_id)
+        if record is None:
+            return None
+        record = record.copy()
+        _, product_forecast = self._forecast(state)
+        if record.product_id in product_forecast.index:
+            row = product_forecast.loc[record.product_id]
+            if np.isfinite(row['days_of_cover']):
+                record.days_remaining = int(row['days_of_cover'])
+                record.end_date = row['stockout_date'].strftime('%d.%m.%Y')
+            else:
+                record.days_remaining = None
+                record.end_date = None
+        return record
+    
+    def get_product_record(self, product_id=None):
+        """Карточка товара (ProductRecord), None если товар не выбран или не найден"""
+        return self.catalog.get(product_id) if product_id is not None else None
+    
+    def get_inventory_info(self, product_id=None):
         """Получение информации об остатках товара"""
-        return self.inventory_data.get(product_id, {})
+        record = self.get_inventory_record(product_id)
+        return record.to_dict() if record is not None else {}
     
-    def get_product_info(self, product_id="tshirtwhite"):
+    def get_product_info(self, product_id=None):
         """Получение информации о товаре"""
-        return self.products_data.get(product_id, {})
-    
-    def get_forecast_data(self):
-        """Получение данных прогнозов"""
-        return [
-            {'SKU': 'S10', 'avg_rating': 3.8, 'days_out': '-', 'missed_sales': 66},
-            {'SKU': 'S11', 'avg_rating': 3.8, 'days_out': 3, 'missed_sales': 119},
-            {'SKU': 'S21', 'avg_rating': 5.9, 'days_out': 1, 'missed_sales': 188},
-            {'SKU': 'S22', 'avg_rating': 6.8, 'days_out': 8, 'missed_sales': 228},
-            {'SKU': 'S23', 'avg_rating': 5.7, 'days_out': 3, 'missed_sales': 328},
-            {'SKU': 'S24', 'avg_rating': 5.1, 'days_out': 8, 'missed_sales': 528}
-        ]
-    
-    def get_size_distribution(self):
-        """Получение распределения по размерам"""
-        return {
-            'XS': 15,
-            'S': 35,
-            'M': 33,
-            'L': 18,
-            'XL': 14,
-            'XXL': 5
-        }
+        record = self.get_product_record(product_id)
+        return record.to_dict() if record is not None else {}
+    
+    def search_products(self, query, limit=20):
+        """Поиск товаров по артикулу, названию и коду WB"""
+        return self.catalog.search(query, limit=limit)
+    
+    @cached_query
+    def _forecast(self, state=None):
+        """Прогноз остатков по SKU и товарам, один расчёт на версию данных
+        
+        state - снимок состояния, из которого читает вызывающий запрос;
+        по умолчанию текущее состояние (его подставляет cached_query).
+        """
+        params = dict(self.forecast_params)
+        params.pop('low_stock_days', None)
+        return forecast_stock(self._read(state, 'rollup'), self._read(state, 'inventory_data'), **params)
+    
+    @cached_query
+    def _stock_projection(self, days=35, state=None):
+        """Проекция остатков всех товаров по дням, один расчёт на версию данных"""
+        _, product_forecast = self._forecast(state)
+        projected, status = project_stock(
+            product_forecast,
+            days=days,
+            low_stock_days=self.forecast_params.get('low_stock_days', 7)
+        )
+        return product_forecast.index, projected, status
+    
+    @staticmethod
+    def _stockout_key(state):
+        return state.version, datetime.now().date()
+    
+    def _stockout_simulation(self, state=None):
+        """Симуляция риска дефицита по всем SKU, один расчёт на версию данных
+        
+        Результат хранится отдельно от кэша запросов: расчёт долгий, и кэш
+        с ограничением по объёму не должен его вытеснять. Одновременные
+        вызовы ждут один расчёт. Вызывается только вне запросов
+        пользователей: из фонового обновления и start_stockout_simulation.
+        """
+        if state is None:
+            state = self._state
+        key = self._stockout_key(state)
+        with self._stockout_lock:
+            if self._stockout[0] != key:
+                params = dict(self.stockout_params)
+                params.pop('enabled', None)
+                for name in ['history_days', 'ewma_alpha']:
+                    if name in self.forecast_params:
+                        params.setdefault(name, self.forecast_params[name])
+                simulation = simulate_stockout(
+                    self._read(state, 'rollup'), self._read(state, 'inventory_data'), **params
+                )
+                self._stockout = (key, simulation)
+            return self._stockout[1]
     
-    def get_missed_sales_distribution(self):
-        """Получение распределения упущенных продаж"""
+    def start_stockout_simulation(self):
+        """Расчёт симуляции для текущего состояния в фоновом потоке, если его ещё нет"""
+        if self.stockout_params is None:
+            return
+        state = self._state
+        with self._stockout_start_lock:
+            if self._stockout[0] == self._stockout_key(state):
+                return
+            if self._stockout_thread is not None and self._stockout_thread.is_alive():
+                return
+            self._stockout_thread = threading.Thread(
+                target=_run_stockout_simulation,
+                args=(self, state),
+                name='stockout-simulation',
+                daemon=True
+            )
+            self._stockout_thread.start()
+    
+    def stockout_pending(self):
+        """Считается ли ещё симуляция для текущей версии данных"""
+        return self.stockout_params is not None and self._stockout[0] != self._stockout_key(self._state)
+    
+    def get_stockout_risk(self, product_id=None):
+        """Риск дефицита товара по симуляции спроса и задержек поставки
+        
+        Вероятность отсутствия товара по датам горизонта, вероятность
+        закончиться в пределах горизонта, P10/P50/P90 дней запаса (inf -
+        хватит на весь горизонт) и те же величины по размерам. None, если
+        симуляция выключена или ещё не готова для текущей версии данных
+        (stockout_pending): расчёт тогда запускается в фоне, запрос его не ждёт.
+        """
+        if self.stockout_params is None or product_id is None:
+            return None
+        key, simulation = self._stockout
+        if key != self._stockout_key(self._state):
+            self.start_stockout_simulation()
+            return None
+        products = simulation['products']
+        if product_id not in products.index:
+            return None
+        position = products.index.get_loc(product_id)
+        skus = simulation['sku']
         return {
-            'SS': 35,
-            'M': 33,
-            'XL': 16,
-            'XXL': 14,
-            'XXXL': 5
+            'product': products.iloc[position].to_dict(),
+            'probability': pd.Series(simulation['product_probability'][position], index=simulation['dates']),
+            'skus': skus[skus['product_id'] == product_id],
+            'n_paths': simulation['n_paths']
         }
     
-    def get_payment_metrics(self):
-        """Получение метрик по оплатам"""
-        total_payments = self.payments_data['amount'].sum()
-        avg_monthly = self.payments_data['amount'].mean()
+    def get_forecast_data(self, product_id=None):
+        """Получение данных прогнозов по SKU (товар/размер)"""
+        sku_forecast, _ = self._forecast()
+        if product_id is not None:
+            sku_forecast = sku_forecast[sku_forecast['product_id'] == product_id]
+        return sku_forecast
+    
+    @cached_query
+    def get_size_distribution(self, period="месяц", abc_filter="Все", state=None):
+        """Получение распределения продаж по размерам, в процентах"""
+        start_date, end_date = self._period_bounds(period)
+        by_size = self._read(state, 'rollup').by_size(start_date, end_date, abc_filter)
+        by_size = by_size[by_size > 0]
+        if by_size.sum() == 0:
+            return {}
+        return (by_size / by_size.sum() * 100).round(1).to_dict()
+    
+    def get_missed_sales_distribution(self, product_id=None):
+        """Получение распределения упущенных продаж по размерам, в процентах"""
+        sku_forecast = self.get_forecast_data(product_id)
+        by_size = sku_forecast.groupby('size', sort=False)['missed_sales'].sum()
+        by_size = by_size[by_size > 0]
+        if by_size.sum() == 0:
+            return {}
+        return (by_size / by_size.sum() * 100).round(1).to_dict()
+    
+    @cached_query
+    def get_payment_analytics(self, state=None):
+        """Суммы оплат по периодам и типам, денежный поток и оценка следующих оплат
         
+        Один расчёт на версию данных: раздел оплат строится из готовых таблиц.
+        """
+        return payment_analytics(self._read(state, 'payments_data'))
+    
+    @cached_query
+    def get_payment_metrics(self, state=None):
+        """Получение метрик по оплатам
+        
+        Средняя оплата в месяц - среднее сумм по календарным месяцам от
+        первой до последней оплаты. Следующая оплата - ближайшая из оценок
+        по интервалам оплат каждого типа, None если оценки нет.
+        """
+        analytics = self.get_payment_analytics(state)
+        # Если payments.csv нет, в базе пусто и сумма считается по примеру данных
+        if self.payments_store is not None and self.payments_store.source_state('payments') is not None:
+            total_payments = self.payments_store.payment_totals()['total']
+        else:
+            total_payments = analytics['total']
+        
+        upcoming = analytics['next_payments'].dropna(subset=['next_date'])
+        next_payment = upcoming.iloc[0] if len(upcoming) else None
         return {
             'total_payments': total_payments,
-            'avg_monthly': avg_monthly,
-            'next_payment_date': "15.08.2024"
+            'avg_monthly': analytics['average_monthly'],
+            'next_payment_date': next_payment['next_date'].strftime('%d.%m.%Y') if next_payment is not None else None,
+            'next_payment_type': upcoming.index[0] if next_payment is not None else None,
+            'next_payment_amount': float(next_payment['expected_amount']) if next_payment is not None else None
         }
     
-    def get_calendar_data(self, days=35):
-        """Получение данных для календаря наличия товара"""
-        # Генерация случайных данных для календаря (0 - нет, 1 - мало, 2 - достаточно)
-        return np.random.choice([0, 1, 2], size=(5, 7), p=[0.1, 0.3, 0.6])
+    def get_calendar_data(self, product_id=None, weeks=5):
+        """Получение данных для календаря наличия товара
+        
+        Матрица недели x дни недели (с понедельника текущей недели):
+        0 - нет товара, 1 - мало, 2 - достаточно, NaN - прошедшие дни.
+        Статусы берутся из проекции остатков, общей для всех товаров.
+        Если товар не выбран, все дни - NaN.
+        """
+        offset = datetime.now().weekday()
+        calendar = np.full(weeks * 7, np.nan)
+        products, _, status = self._stock_projection(weeks * 7)
+        if product_id in products:
+            row = status[products.get_loc(product_id)]
+            calendar[offset:] = row[:weeks * 7 - offset]
+        return calendar.reshape(weeks, 7)
     
     def get_transit_info(self):
         """Получение информации о товарах в пути"""
@@ -248,3 +935,24 @@ class DataHandler:
             'status': "В пути"
         }
 
+def _run_stockout_simulation(handler, state):
+    """Фоновый расчёт симуляции дефицита"""
+    try:
+        handler._stockout_simulation(state)
+    except Exception:
+        logger.exception("Ошибка симуляции риска дефицита")
+
+def _refresh_loop(handler_ref, stop, interval):
+    """Цикл фонового обновления данных обработчика"""
+    while not stop.wait(interval):
+        handler = handler_ref()
+        if handler is None:
+            return
+        try:
+            # Симуляция дефицита пересчитывается здесь, а не в запросе раздела склада
+            if handler.refresh_if_changed() and handler.stockout_params is not None:
+                handler._stockout_simulation()
+        except Exception:
+            # Ошибка чтения не должна останавливать следующие обновления
+            logger.exception("Ошибка фонового обновления данных")
+        del handler
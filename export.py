@@ -0,0 +1,224 @@
+"""
+Выгрузка таблиц дашборда в CSV, Excel и JSON
+
+Таблица записывается в файл частями по chunk_rows строк: CSV и JSON
+дописываются в поток, Excel пишется в режиме openpyxl write-only, когда
+строки сразу сбрасываются в файл и книга целиком в памяти не строится.
+Выгрузки выполняются в пуле потоков, а ход записи доступен в ExportJob,
+поэтому сессия дашборда не ждёт окончания записи.
+"""
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'Excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'JSON': ('json', 'application/json')
+}
+
+# Строк на листе Excel, включая заголовок
+EXCEL_MAX_ROWS = 1_048_576
+
+
+def iter_chunks(df, chunk_rows):
+    """Части таблицы по chunk_rows строк (срезы без копирования)"""
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def write_csv(df, path, chunk_rows=100_000, progress=None):
+    """Запись CSV частями"""
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        if len(df) == 0:
+            df.to_csv(f, index=False)
+        for i, chunk in enumerate(iter_chunks(df, chunk_rows)):
+            chunk.to_csv(f, index=False, header=(i == 0))
+            if progress is not None:
+                progress(len(chunk))
+
+
+def write_json(df, path, chunk_rows=100_000, progress=None):
+    """Запись JSON массива записей частями"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('[')
+        first = True
+        for chunk in iter_chunks(df, chunk_rows):
+            records = chunk.to_json(orient='records', date_format='iso', force_ascii=False)
+            # Каждая часть - массив, скобки убираются и части склеиваются через запятую
+            if len(records) > 2:
+                f.write(records[1:-1] if first else ',' + records[1:-1])
+                first = False
+            if progress is not None:
+                progress(len(chunk))
+        f.write(']')
+
+
+def _excel_rows(chunk):
+    """Строки части как кортежи значений, понятных openpyxl
+
+    Пропуски и бесконечности (дни запаса без продаж) пишутся пустыми ячейками.
+    """
+    present = chunk.notna()
+    for column in chunk.columns:
+        if pd.api.types.is_float_dtype(chunk[column].dtype):
+            present[column] &= np.isfinite(chunk[column].to_numpy())
+    return chunk.astype(object).where(present, None).itertuples(index=False, name=None)
+
+
+def write_excel(df, path, chunk_rows=100_000, progress=None, sheet_title='Данные'):
+    """Запись Excel в режиме write-only
+
+    Таблица длиннее листа Excel продолжается на следующих листах
+    с тем же заголовком.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    header = [str(column) for column in df.columns]
+    sheet = None
+    sheet_rows = EXCEL_MAX_ROWS
+    for chunk in iter_chunks(df, chunk_rows):
+        start = 0
+        while start < len(chunk):
+            if sheet_rows >= EXCEL_MAX_ROWS:
+                number = len(workbook.worksheets) + 1
+                sheet = workbook.create_sheet(sheet_title if number == 1 else '%s %d' % (sheet_title, number))
+                sheet.append(header)
+                sheet_rows = 1
+            part = chunk.iloc[start:start + EXCEL_MAX_ROWS - sheet_rows]
+            for row in _excel_rows(part):
+                sheet.append(row)
+            sheet_rows += len(part)
+            start += len(part)
+        if progress is not None:
+            progress(len(chunk))
+    if sheet is None:
+        workbook.create_sheet(sheet_title).append(header)
+    workbook.save(path)
+
+
+WRITERS = {
+    'CSV': write_csv,
+    'Excel': write_excel,
+    'JSON': write_json
+}
+
+
+def export_frame(df, path, export_format, chunk_rows=100_000, progress=None):
+    """Запись таблицы в файл в заданном формате"""
+    if export_format not in WRITERS:
+        raise ValueError("Неизвестный формат выгрузки: %s" % export_format)
+    WRITERS[export_format](df, path, chunk_rows=chunk_rows, progress=progress)
+    return path
+
+
+class ExportJob:
+    """
+    Выгрузка одной таблицы: ход записи и результат
+    """
+
+    def __init__(self, name, export_format, total_rows, path):
+        self.name = name
+        self.format = export_format
+        self.total_rows = total_rows
+        self.path = path
+        self.rows_written = 0
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.future = None
+
+    def _progress(self, rows):
+        self.rows_written += rows
+
+    @property
+    def progress(self):
+        """Доля записанных строк от 0 до 1"""
+        if self.done:
+            return 1.0
+        return self.rows_written / self.total_rows if self.total_rows else 0.0
+
+    @property
+    def done(self):
+        return self.future is not None and self.future.done()
+
+    @property
+    def file_name(self):
+        return os.path.basename(self.path)
+
+    @property
+    def mime(self):
+        return FORMATS[self.format][1]
+
+    @property
+    def seconds(self):
+        """Время записи"""
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    def result(self):
+        """Путь к файлу; исключение записи пробрасывается"""
+        return self.future.result()
+
+
+class Exporter:
+    """
+    Пул потоков для выгрузок с временным каталогом файлов
+    """
+
+    def __init__(self, export_dir=None, max_workers=2, chunk_rows=100_000, max_age_seconds=3600):
+        self.export_dir = export_dir or os.path.join(tempfile.gettempdir(), 'warehouse-exports')
+        self.chunk_rows = chunk_rows
+        # Файлы старше max_age_seconds удаляются при следующей выгрузке
+        self.max_age_seconds = max_age_seconds
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='export')
+        self._lock = threading.Lock()
+
+    def _remove_old_files(self):
+        now = time.time()
+        for name in os.listdir(self.export_dir):
+            path = os.path.join(self.export_dir, name)
+            try:
+                if now - os.path.getmtime(path) > self.max_age_seconds:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def submit(self, df, name, export_format):
+        """Запуск выгрузки таблицы в фоне, возвращает ExportJob"""
+        if export_format not in FORMATS:
+            raise ValueError("Неизвестный формат выгрузки: %s" % export_format)
+        with self._lock:
+            os.makedirs(self.export_dir, exist_ok=True)
+            self._remove_old_files()
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        path = os.path.join(self.export_dir, '%s_%s.%s' % (name, stamp, FORMATS[export_format][0]))
+        job = ExportJob(name, export_format, len(df), path)
+        job.future = self._pool.submit(self._run, job, df)
+        return job
+
+    def _run(self, job, df):
+        job.started_at = time.perf_counter()
+        try:
+            return export_frame(df, job.path, job.format, self.chunk_rows, job._progress)
+        except Exception as error:
+            job.error = error
+            # Недописанный файл не должен попасть к пользователю
+            try:
+                os.remove(job.path)
+            except OSError:
+                pass
+            raise
+        finally:
+            job.finished_at = time.perf_counter()
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
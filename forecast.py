@@ -0,0 +1,169 @@
+"""
+Прогноз остатков по SKU (товар x размер)
+
+Скорость продаж каждой пары товар/размер считается экспоненциально
+взвешенным средним дневных продаж за последние history_days дней
+дневного агрегата. Остаток товара распределяется по размерам
+пропорционально спросу, после чего для всех SKU сразу считаются дни
+запаса, дата окончания товара и упущенные продажи до ближайшей поставки.
+Все расчёты выполняются над массивами по всем SKU, без циклов по товарам.
+"""
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from .rollup import ABC_CLASSES
+
+DELIVERY_DATE_FORMAT = '%d.%m.%y'
+
+
+def sku_daily_sales(rollup, history_days):
+    """Дневные продажи по SKU за последние history_days дней: (дни, SKU)"""
+    prefix = rollup.prefix
+    lo = max(0, rollup.n_days - history_days)
+    return np.diff(prefix[lo:], axis=0).astype(np.float64)
+
+
+def ewma_velocity(daily, alpha):
+    """Экспоненциально взвешенная средняя продаж в день по каждому SKU"""
+    n_days = daily.shape[0]
+    if n_days == 0:
+        return np.zeros(daily.shape[1])
+    weights = alpha * (1 - alpha) ** np.arange(n_days - 1, -1, -1)
+    return weights @ daily / weights.sum()
+
+
+def inventory_frame(inventory_data, products, today):
+    """Остатки и поставки по товарам в порядке оси товаров агрегата"""
+    frame = pd.DataFrame.from_dict(inventory_data, orient='index').reindex(products)
+    for column in ['own_warehouses', 'wb_warehouse', 'in_transit']:
+        if column not in frame:
+            frame[column] = 0
+    stock = frame[['own_warehouses', 'wb_warehouse']].apply(pd.to_numeric, errors='coerce').fillna(0).sum(axis=1)
+    in_transit = pd.to_numeric(frame['in_transit'], errors='coerce').fillna(0)
+    delivery = pd.to_datetime(
+        frame.get('expected_delivery', pd.Series(index=frame.index, dtype=object)),
+        format=DELIVERY_DATE_FORMAT,
+        errors='coerce'
+    )
+    delivery_days = (delivery - pd.Timestamp(today)).dt.days
+    return pd.DataFrame({
+        'stock': stock.to_numpy(dtype=np.float64),
+        'in_transit': in_transit.to_numpy(dtype=np.float64),
+        # Поставка в прошлом или без даты не учитывается
+        'delivery_days': delivery_days.where(delivery_days >= 0).to_numpy(dtype=np.float64)
+    }, index=pd.Index(products, name='product_id'))
+
+
+def allocate_to_skus(product_values, sku_product, weights):
+    """Распределение величины товара по его размерам пропорционально весам
+
+    Если у товара все веса нулевые, величина делится между размерами поровну.
+    """
+    n_products = len(product_values)
+    weight_sum = np.bincount(sku_product, weights=weights, minlength=n_products)
+    sku_count = np.bincount(sku_product, minlength=n_products)
+    share = np.where(
+        weight_sum[sku_product] > 0,
+        weights / np.where(weight_sum[sku_product] > 0, weight_sum[sku_product], 1),
+        1.0 / np.maximum(sku_count[sku_product], 1)
+    )
+    return product_values[sku_product] * share
+
+
+def forecast_stock(rollup, inventory_data, today=None, history_days=56, ewma_alpha=0.1, horizon_days=30):
+    """Прогноз по всем SKU и товарам
+
+    history_days - глубина истории для оценки скорости продаж, ewma_alpha -
+    вес последнего дня в экспоненциальном среднем, horizon_days - горизонт
+    упущенных продаж, если поставка не ожидается.
+
+    Возвращает две таблицы: по SKU (скорость продаж, остаток, дни запаса,
+    дата окончания, дни отсутствия, упущенные продажи, рекомендованный
+    запас на horizon_days) и по товарам.
+    """
+    today = today or date.today()
+    velocity = ewma_velocity(sku_daily_sales(rollup, history_days), ewma_alpha)
+    inventory = inventory_frame(inventory_data, rollup.products, today)
+    sku_product = rollup.sku_product
+
+    stock = allocate_to_skus(inventory['stock'].to_numpy(), sku_product, velocity)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_cover = np.where(velocity > 0, stock / velocity, np.inf)
+
+    # Дефицит длится от окончания запаса до поставки (или до конца горизонта)
+    delivery_days = inventory['delivery_days'].to_numpy()[sku_product]
+    window_end = np.where(np.isnan(delivery_days), horizon_days, np.minimum(delivery_days, horizon_days))
+    days_out = np.clip(window_end - days_of_cover, 0, None)
+    missed_sales = velocity * days_out
+
+    today64 = np.datetime64(today, 'D')
+    finite_cover = np.isfinite(days_of_cover)
+    stockout_date = np.where(
+        finite_cover,
+        today64 + np.floor(np.where(finite_cover, days_of_cover, 0)).astype('timedelta64[D]'),
+        np.datetime64('NaT')
+    )
+
+    products = np.array(rollup.products, dtype=object)
+    sizes = np.array(rollup.sizes, dtype=object)
+    # Код -1 (категория неизвестна) попадает на последний элемент - пустую строку
+    abc_labels = np.array(ABC_CLASSES + [''], dtype=object)
+    sku_table = pd.DataFrame({
+        'SKU': products[sku_product] + '/' + sizes[rollup.sku_size],
+        'product_id': products[sku_product],
+        'size': sizes[rollup.sku_size],
+        'abc_category': abc_labels[rollup.product_abc[sku_product]],
+        'velocity': velocity.round(2),
+        'stock': stock.round(0),
+        'days_of_cover': days_of_cover.round(1),
+        'stockout_date': stockout_date,
+        'days_out': np.ceil(days_out).astype(np.int64),
+        'missed_sales': missed_sales.round(0).astype(np.int64),
+        # Запас, покрывающий прогнозный спрос на горизонт
+        'recommended_stock': np.ceil(velocity * horizon_days).astype(np.int64)
+    })
+
+    product_velocity = np.bincount(sku_product, weights=velocity, minlength=len(products))
+    product_stock = inventory['stock'].to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        product_cover = np.where(product_velocity > 0, product_stock / product_velocity, np.inf)
+    product_table = pd.DataFrame({
+        'velocity': product_velocity.round(2),
+        'stock': product_stock,
+        'in_transit': inventory['in_transit'].to_numpy(),
+        'delivery_days': inventory['delivery_days'].to_numpy(),
+        'days_of_cover': product_cover.round(1),
+        'stockout_date': pd.to_datetime(today) + pd.to_timedelta(
+            np.where(np.isfinite(product_cover), np.floor(product_cover), np.nan), unit='D'
+        ),
+        'missed_sales': np.bincount(sku_product, weights=missed_sales, minlength=len(products)).round(0)
+    }, index=pd.Index(rollup.products, name='product_id'))
+
+    return sku_table, product_table
+
+
+def project_stock(product_table, days=35, low_stock_days=7):
+    """Проекция остатков всех товаров по дням начиная с сегодняшнего
+
+    Остаток на конец дня t: текущий остаток минус прогнозный спрос за
+    дни 0..t плюс товар в пути, если поставка пришла до t включительно.
+    Считается одним проходом cumsum по матрице товары x дни. Статус дня:
+    0 - товара нет, 1 - осталось меньше чем на low_stock_days дней, 2 -
+    достаточно.
+    """
+    velocity = product_table['velocity'].to_numpy(dtype=np.float64)
+    delta = np.repeat(-velocity[:, None], days, axis=1)
+
+    delivery_days = product_table['delivery_days'].to_numpy()
+    arriving = ~np.isnan(delivery_days) & (delivery_days < days)
+    rows = np.flatnonzero(arriving)
+    delta[rows, delivery_days[rows].astype(np.int64)] += product_table['in_transit'].to_numpy()[rows]
+
+    projected = product_table['stock'].to_numpy(dtype=np.float64)[:, None] + np.cumsum(delta, axis=1)
+    status = np.where(
+        projected <= 0, 0,
+        np.where(projected < velocity[:, None] * low_stock_days, 1, 2)
+    ).astype(np.int8)
+    return projected, status
@@ -0,0 +1,476 @@
+"""
+Загрузка заказов, остатков, товаров и оплат из API в исходные файлы
+
+Клиент asyncio читает постраничные ресурсы API одновременно: заказы и
+оплаты разбиваются на окна по window_days дней, и каждое окно листается
+своим курсором, а справочники товаров и остатков - одним курсором.
+Все запросы идут через одну сессию aiohttp с пулом keep-alive соединений;
+число запросов в полёте ограничено concurrency, частота - rate_per_second.
+Ответ 429 приостанавливает все запросы на Retry-After секунд, ошибки
+сервера и сети повторяются с экспоненциальной задержкой.
+
+Страницы сразу дописываются в исходные файлы DataHandler: заказы - в
+sales.csv, оплаты - в payments.csv, поэтому фоновое обновление обработчика
+читает только новый хвост. Товары и остатки копятся во временном файле
+и подменяют products.json / inventory.json целиком, когда справочник
+прочитан до конца. После каждой страницы в data/.cache/ingest_state.json
+сохраняются курсоры и длины файлов: прерванная загрузка продолжается с
+тех же курсоров, а строки, дописанные после последнего сохранения,
+обрезаются. Заказы и оплаты загружаются по вчерашний день включительно,
+следующий запуск начинает со следующего дня.
+
+Загрузку в один каталог данных ведёт один писатель: запуск берёт
+файловую блокировку data/.cache/ingest.lock и пропускается, если её
+держит другой процесс (например, другая реплика дашборда).
+
+    python -m modules.ingest --url https://api.example.com --data data --token $API_TOKEN
+
+Формат API: GET {url}/api/{ресурс}?cursor=&limit=[&date_from=&date_to=]
+возвращает {"items": [...], "next_cursor": строка или null}.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import random
+import threading
+import time
+from datetime import date, timedelta
+
+import aiohttp
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: запуски разделяются только внутри процесса
+    fcntl = None
+
+from .sales_store import SALES_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_COLUMNS = ['date', 'amount', 'type']
+# Ресурс API -> исходный файл; у ресурсов с колонками строки дописываются в CSV по окнам дат
+RESOURCES = {
+    'orders': ('sales.csv', SALES_COLUMNS),
+    'payments': ('payments.csv', PAYMENT_COLUMNS),
+    'products': ('products.json', None),
+    'stocks': ('inventory.json', None)
+}
+STATE_FORMAT_VERSION = 1
+# Ответов 429 подряд на один запрос, после которых загрузка прерывается
+MAX_THROTTLED = 50
+# Наибольший интервал между запросами при подборе частоты по 429
+MAX_INTERVAL_SECONDS = 5.0
+
+
+class ApiError(Exception):
+    """Ответ API, который не удалось получить за max_retries попыток"""
+
+
+class RateLimiter:
+    """
+    Общий для всех запросов интервал между запросами и пауза после 429
+
+    Без известного лимита API интервал подбирается по ответам: 429 на
+    запрос, отправленный после прошлого 429, удваивает его (ответы на
+    запросы, уже бывшие в полёте, не считаются), каждый успешный ответ
+    уменьшает на 5%, но не ниже интервала rate_per_second.
+    """
+
+    def __init__(self, rate_per_second=None):
+        self.min_interval = 1.0 / rate_per_second if rate_per_second else 0.0
+        self.interval = self.min_interval
+        self._next = 0.0
+        self._paused_until = 0.0
+        self._throttled_at = 0.0
+
+    async def wait(self):
+        """Ожидание очередного слота запроса, возвращает время отправки"""
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            if now >= self._next:
+                self._next = now + self.interval
+                return now
+            # Слот не занимается заранее: после сна проверяются пауза и новый интервал
+            await asyncio.sleep(self._next - now)
+
+    def throttle(self, seconds, sent_at):
+        """Ответ 429: пауза всех запросов на Retry-After и более редкие запросы"""
+        now = time.monotonic()
+        if sent_at >= self._throttled_at:
+            self.interval = min(max(self.interval * 2, 0.01), MAX_INTERVAL_SECONDS)
+            self._throttled_at = now
+        self._paused_until = max(self._paused_until, now + seconds)
+
+    def accept(self):
+        """Успешный ответ: запросы постепенно учащаются до заданного лимита"""
+        self.interval = max(self.min_interval, self.interval * 0.95)
+
+
+class IngestClient:
+    """
+    Загрузка ресурсов API в каталог исходных данных с продолжением по курсорам
+    """
+
+    def __init__(self, base_url, data_path, token=None, concurrency=16, page_size=1000, rate_per_second=None,
+                 max_retries=6, backoff_seconds=0.5, window_days=7, history_days=365, timeout_seconds=30,
+                 handler=None):
+        self.base_url = base_url.rstrip('/')
+        self.data_path = data_path
+        self.token = token
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        # Окно дат одного курсора заказов и оплат; первая загрузка - за history_days дней
+        self.window_days = window_days
+        self.history_days = history_days
+        self.timeout_seconds = timeout_seconds
+        self.rate_per_second = rate_per_second
+        self.state_path = os.path.join(data_path, '.cache', 'ingest_state.json')
+        self.lock_path = os.path.join(data_path, '.cache', 'ingest.lock')
+        self._run_lock = threading.Lock()
+        self.parts_path = os.path.join(data_path, '.cache', 'ingest')
+        # DataHandler того же процесса: подхватывает данные после каждого окна и справочника
+        self.handler = handler
+        self.stats = {}
+
+    # --- состояние ---
+
+    def _load_state(self):
+        """Курсоры окон и справочников и длины файлов с прошлого запуска"""
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = None
+        if not state or state.get('format_version') != STATE_FORMAT_VERSION:
+            state = {'format_version': STATE_FORMAT_VERSION, 'resources': {}, 'offsets': {}}
+        return state
+
+    def _save_state(self):
+        """Атомарная запись состояния: старое остаётся целым до подмены"""
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.state_path)
+
+    def _sink_path(self, resource):
+        """Файл, в который дописываются страницы ресурса"""
+        file_name, columns = RESOURCES[resource]
+        if columns is not None:
+            return os.path.join(self.data_path, file_name)
+        return os.path.join(self.parts_path, resource + '.jsonl')
+
+    def _prepare_sink(self, resource):
+        """Обрезка строк после последнего сохранённого состояния и колонки CSV
+
+        Порядок колонок берётся из заголовка существующего файла; новый
+        файл создаётся с заголовком по умолчанию.
+        """
+        path = self._sink_path(resource)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        offset = self.state['offsets'].get(resource)
+        if offset is not None and os.path.exists(path) and os.path.getsize(path) > offset:
+            with open(path, 'r+b') as f:
+                f.truncate(offset)
+        columns = RESOURCES[resource][1]
+        if columns is None:
+            if offset is None and os.path.exists(path):
+                os.remove(path)
+            return None
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'rb+') as f:
+                # Последняя строка без перевода строки слилась бы с первой дописанной
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    f.write(b'\n')
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                return next(csv.reader(f))
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            csv.writer(f, lineterminator='\n').writerow(columns)
+        return list(columns)
+
+    def _write_page(self, resource, items):
+        """Дозапись страницы и сохранение длины файла вместе с курсором"""
+        path = self._sink_path(resource)
+        with open(path, 'a', encoding='utf-8', newline='') as f:
+            if self._columns[resource] is None:
+                for item in items:
+                    f.write(json.dumps(item, ensure_ascii=False) + '\n')
+            else:
+                writer = csv.writer(f, lineterminator='\n')
+                writer.writerows(self._row(resource, item) for item in items)
+            f.flush()
+            os.fsync(f.fileno())
+            self.state['offsets'][resource] = f.tell()
+
+    def _row(self, resource, item):
+        """Строка CSV в порядке колонок файла"""
+        if resource == 'orders' and not item.get('abc_category'):
+            # API маркетплейса не знает категорий: берётся категория из products.json
+            item = dict(item, abc_category=self._abc.get(str(item.get('product_id')), 'C'))
+        return [item.get(column, '') for column in self._columns[resource]]
+
+    def _finish_catalog(self, resource):
+        """Подмена products.json / inventory.json прочитанным справочником"""
+        path = self._sink_path(resource)
+        catalog = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    item = json.loads(line)
+                    catalog[str(item.pop('product_id'))] = item
+        target = os.path.join(self.data_path, RESOURCES[resource][0])
+        # Пустой ответ не стирает прежний справочник
+        if catalog:
+            with open(target + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(catalog, f, ensure_ascii=False, indent=2)
+            os.replace(target + '.tmp', target)
+        if os.path.exists(path):
+            os.remove(path)
+        del self.state['resources'][resource]
+        self.state['offsets'].pop(resource, None)
+        self._save_state()
+
+    # --- окна дат ---
+
+    def _plan_windows(self, resource, today):
+        """Окна дат от последнего загруженного дня по вчерашний день"""
+        entry = self.state['resources'].setdefault(resource, {'until': None, 'windows': {}})
+        last_day = today - timedelta(days=1)
+        if entry['until'] is not None:
+            start = date.fromisoformat(entry['until']) + timedelta(days=1)
+        else:
+            start = today - timedelta(days=self.history_days)
+        # Окна прошлого запуска продолжаются, новые начинаются после последнего из них
+        for window in entry['windows'].values():
+            start = max(start, date.fromisoformat(window['date_to']) + timedelta(days=1))
+        while start <= last_day:
+            end = min(start + timedelta(days=self.window_days - 1), last_day)
+            entry['windows'][start.isoformat()] = {
+                'date_to': end.isoformat(), 'cursor': None, 'done': False
+            }
+            start = end + timedelta(days=1)
+        return entry
+
+    def _advance(self, entry):
+        """Сдвиг последнего загруженного дня по подряд завершённым окнам"""
+        for key in sorted(entry['windows']):
+            window = entry['windows'][key]
+            if not window['done']:
+                break
+            entry['until'] = window['date_to']
+            del entry['windows'][key]
+
+    # --- запросы ---
+
+    async def fetch_page(self, session, resource, params):
+        """Одна страница ресурса с повторами при 429, ошибках сервера и сети
+
+        Ответы 429 не расходуют попытки max_retries: запрос ждёт паузу и
+        повторяется, пока их подряд не больше MAX_THROTTLED.
+        """
+        url = '%s/api/%s' % (self.base_url, resource)
+        params = {name: value for name, value in params.items() if value is not None}
+        attempt = 0
+        throttled = 0
+        while True:
+            async with self._semaphore:
+                sent_at = await self._limiter.wait()
+                self.stats['requests'] += 1
+                try:
+                    async with session.get(url, params=params) as response:
+                        if response.status == 429:
+                            self.stats['rate_limited'] += 1
+                            throttled += 1
+                            if throttled > MAX_THROTTLED:
+                                raise ApiError('%s: ответ 429 %d раз подряд' % (url, throttled))
+                            try:
+                                delay = float(response.headers.get('Retry-After'))
+                            except (TypeError, ValueError):
+                                delay = self.backoff_seconds
+                            self._limiter.throttle(delay, sent_at)
+                            continue
+                        if response.status < 500:
+                            response.raise_for_status()
+                            self._limiter.accept()
+                            return await response.json()
+                        error = ApiError('%s: HTTP %d' % (url, response.status))
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as exc:
+                    error = ApiError('%s: %s' % (url, exc or type(exc).__name__))
+            if attempt >= self.max_retries:
+                raise error
+            self.stats['retries'] += 1
+            # Экспоненциальная задержка со случайной добавкой, чтобы повторы не шли залпом
+            await asyncio.sleep(self.backoff_seconds * 2 ** attempt * (0.5 + random.random()))
+            attempt += 1
+
+    async def _read_stream(self, session, resource, cursor_entry, params):
+        """Листание одного курсора до конца с записью каждой страницы"""
+        while not cursor_entry.get('done'):
+            page = await self.fetch_page(
+                session, resource, dict(params, cursor=cursor_entry['cursor'], limit=self.page_size)
+            )
+            items = page.get('items') or []
+            if items:
+                self._write_page(resource, items)
+            self.stats['pages'] += 1
+            self.stats['items'][resource] = self.stats['items'].get(resource, 0) + len(items)
+            cursor_entry['cursor'] = page.get('next_cursor')
+            cursor_entry['done'] = cursor_entry['cursor'] is None
+            self._save_state()
+
+    async def _sync_dated(self, session, resource, today):
+        """Заказы или оплаты: окна дат листаются одновременно"""
+        entry = self._plan_windows(resource, today)
+        self._save_state()
+
+        async def read_window(key, window):
+            await self._read_stream(session, resource, window, {'date_from': key, 'date_to': window['date_to']})
+            self._advance(entry)
+            self._save_state()
+
+        await asyncio.gather(*(read_window(key, window) for key, window in list(entry['windows'].items())))
+
+    async def _sync_catalog(self, session, resource):
+        """Товары или остатки: один курсор, файл подменяется по окончании"""
+        entry = self.state['resources'].setdefault(resource, {'cursor': None, 'done': False})
+        await self._read_stream(session, resource, entry, {})
+        self._finish_catalog(resource)
+
+    async def _notify(self):
+        """Обновление обработчика в потоке: чтение хвоста не задерживает запросы
+
+        Вызывается один раз после загрузки всех ресурсов: окна дат
+        завершаются не по порядку, и обновление после каждого из них
+        пересортировывало бы таблицу продаж на каждом окне.
+        """
+        # Обработчик может быть подменён между загрузками
+        handler = self.handler
+        if handler is not None:
+            await asyncio.to_thread(handler.refresh_if_changed)
+
+    async def sync(self, resources=None, today=None):
+        """Загрузка ресурсов (по умолчанию всех), возвращает счётчики запросов
+
+        None, если загрузку в этот каталог уже ведёт другой процесс или поток.
+        """
+        if not self._run_lock.acquire(blocking=False):
+            return None
+        try:
+            os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+            with open(self.lock_path, 'a') as lock:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        return None
+                return await self._sync(resources, today)
+        finally:
+            self._run_lock.release()
+
+    async def _sync(self, resources, today):
+        resources = list(resources or RESOURCES)
+        today = today or date.today()
+        self.state = self._load_state()
+        self.stats = {'requests': 0, 'pages': 0, 'retries': 0, 'rate_limited': 0, 'items': {}}
+        self._columns = {resource: self._prepare_sink(resource) for resource in resources}
+        self._abc = self._product_classes()
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._limiter = RateLimiter(self.rate_per_second)
+        started = time.perf_counter()
+
+        headers = {'Authorization': 'Bearer %s' % self.token} if self.token else None
+        # Соединения переиспользуются между запросами: не больше concurrency на клиент
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60)
+        timeout = aiohttp.ClientTimeout(total=self.timeout_seconds)
+        async with aiohttp.ClientSession(headers=headers, connector=connector, timeout=timeout) as session:
+            await asyncio.gather(*(
+                self._sync_dated(session, resource, today) if RESOURCES[resource][1] is not None
+                else self._sync_catalog(session, resource)
+                for resource in resources
+            ))
+        # Длины файлов нужны только для продолжения прерванной загрузки: строки,
+        # дописанные в файлы другими программами до следующего запуска, не обрезаются
+        self.state['offsets'].clear()
+        self._save_state()
+        await self._notify()
+        self.stats['seconds'] = round(time.perf_counter() - started, 3)
+        return self.stats
+
+    def run(self, resources=None, today=None):
+        """Синхронный запуск загрузки"""
+        return asyncio.run(self.sync(resources, today))
+
+    def start_worker(self, interval):
+        """Фоновый поток, запускающий загрузку каждые interval секунд
+
+        Возвращает событие остановки. Ошибка одной загрузки записывается в
+        лог, следующая продолжает с сохранённых курсоров.
+        """
+        stop = threading.Event()
+        threading.Thread(target=_ingest_loop, args=(self, stop, interval), name='ingest', daemon=True).start()
+        return stop
+
+    def _product_classes(self):
+        """ABC категории товаров из текущего products.json"""
+        try:
+            with open(os.path.join(self.data_path, 'products.json'), 'r', encoding='utf-8') as f:
+                products = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return {
+            str(product_id): product.get('abc_category') or 'C'
+            for product_id, product in products.items() if isinstance(product, dict)
+        }
+
+
+def _ingest_loop(client, stop, interval):
+    """Цикл фоновой загрузки"""
+    while True:
+        try:
+            client.run()
+        except Exception:
+            logger.exception("Ошибка загрузки данных из API")
+        if stop.wait(interval):
+            return
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Загрузка данных склада из API')
+    parser.add_argument('--url', required=True, help='адрес API')
+    parser.add_argument('--data', default='data', help='каталог исходных данных')
+    parser.add_argument('--token', default=os.environ.get('WAREHOUSE_API_TOKEN'))
+    parser.add_argument('--resources', nargs='+', default=list(RESOURCES), choices=list(RESOURCES))
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--rate', type=float, default=None, help='запросов в секунду, по умолчанию без ограничения')
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--window-days', type=int, default=7)
+    parser.add_argument('--history-days', type=int, default=365)
+    args = parser.parse_args()
+    client = IngestClient(
+        args.url, args.data, token=args.token, concurrency=args.concurrency, page_size=args.page_size,
+        rate_per_second=args.rate, window_days=args.window_days, history_days=args.history_days
+    )
+    stats = client.run(args.resources)
+    if stats is None:
+        print('Загрузку в %s уже ведёт другой процесс' % args.data)
+        return
+    print('Запросов %d (повторов %d, 429: %d), страниц %d за %.1f с: %s' % (
+        stats['requests'], stats['retries'], stats['rate_limited'], stats['pages'], stats['seconds'],
+        ', '.join('%s %d' % item for item in stats['items'].items())
+    ))
+
+
+if __name__ == '__main__':
+    main()
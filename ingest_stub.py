@@ -0,0 +1,186 @@
+"""
+Локальный сервер API для проверки и замеров загрузки (modules.ingest)
+
+Отдаёт заказы, оплаты, товары и остатки синтетического склада
+(synthetic.py) в формате, который ожидает IngestClient: страницы по
+курсору, заказы и оплаты - с фильтром по датам. Задержка ответа, ошибки
+сервера с заданной долей и ограничение частоты (ответ 429 с Retry-After)
+имитируют настоящий API:
+
+    python -m modules.ingest_stub --port 8080 --products 1000 --days 365 --latency-ms 50 --rate 200
+    python -m modules.ingest --url http://127.0.0.1:8080 --data /tmp/warehouse --rate 200
+"""
+import argparse
+import asyncio
+import random
+import threading
+import time
+
+import numpy as np
+from aiohttp import web
+
+from .synthetic import SyntheticWarehouse
+
+
+class StubApi:
+    """
+    Данные синтетического склада за API с задержкой, ошибками и лимитом частоты
+    """
+
+    def __init__(self, warehouse, latency_seconds=0.0, rate_per_second=None, error_rate=0.0, seed=0):
+        self.latency_seconds = latency_seconds
+        self.rate_per_second = rate_per_second
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        # Ведро запросов: не больше секунды запросов подряд
+        self._tokens = rate_per_second or 0.0
+        self._refilled = time.monotonic()
+        self.requests = 0
+        self.rejected = 0
+        self.connections = set()
+
+        sales = warehouse.sales_frame()
+        payments = warehouse.payments_frame()
+        self.dated = {
+            'orders': self._dated_table(sales[['date', 'product_id', 'size', 'sales']]),
+            'payments': self._dated_table(payments)
+        }
+        self.catalogs = {
+            'products': [dict(product, product_id=key) for key, product in warehouse.products_data().items()],
+            'stocks': [dict(stock, product_id=key) for key, stock in warehouse.inventory_data().items()]
+        }
+
+    @staticmethod
+    def _dated_table(df):
+        """Строки по возрастанию даты и даты строками ISO для поиска окна"""
+        df = df.sort_values('date', kind='stable', ignore_index=True)
+        days = df['date'].dt.strftime('%Y-%m-%d').to_numpy()
+        df = df.astype({column: str for column in df.columns if str(df[column].dtype) == 'category'})
+        df['date'] = days
+        return days, df
+
+    def _allow(self):
+        """Списание запроса из ведра, False - лимит частоты превышен"""
+        if not self.rate_per_second:
+            return True
+        now = time.monotonic()
+        self._tokens = min(self.rate_per_second, self._tokens + (now - self._refilled) * self.rate_per_second)
+        self._refilled = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    async def handle(self, request):
+        self.requests += 1
+        if request.transport is not None:
+            self.connections.add(id(request.transport))
+        if not self._allow():
+            self.rejected += 1
+            return web.json_response(
+                {'error': 'rate limit'}, status=429,
+                headers={'Retry-After': '%.3f' % (1.0 / self.rate_per_second)}
+            )
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        if self.error_rate and self._random.random() < self.error_rate:
+            return web.json_response({'error': 'internal'}, status=503)
+
+        resource = request.match_info['resource']
+        query = request.query
+        offset = int(query.get('cursor') or 0)
+        limit = int(query.get('limit') or 1000)
+        if resource in self.dated:
+            days, table = self.dated[resource]
+            lo = np.searchsorted(days, query.get('date_from', ''), side='left')
+            hi = np.searchsorted(days, query.get('date_to', '9999'), side='right')
+            rows = table.iloc[lo + offset:min(lo + offset + limit, hi)]
+            items = rows.to_dict('records')
+            end = lo + offset + limit < hi
+        elif resource in self.catalogs:
+            items = self.catalogs[resource][offset:offset + limit]
+            end = offset + limit < len(self.catalogs[resource])
+        else:
+            raise web.HTTPNotFound()
+        return web.json_response({
+            'items': items,
+            'next_cursor': str(offset + limit) if end else None
+        })
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get('/api/{resource}', self.handle)
+        return app
+
+
+class StubServer:
+    """
+    Сервер заглушки в фоновом потоке со своим циклом событий
+    """
+
+    def __init__(self, api, host='127.0.0.1', port=0):
+        self.api = api
+        self.host = host
+        self.port = port
+        self._loop = asyncio.new_event_loop()
+        self._runner = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://%s:%d' % (self.host, self.port)
+
+    def start(self):
+        """Запуск сервера; при port=0 порт выбирается свободный"""
+        started = threading.Event()
+
+        async def serve():
+            self._runner = web.AppRunner(self.api.app(), access_log=None)
+            await self._runner.setup()
+            site = web.TCPSite(self._runner, self.host, self.port)
+            await site.start()
+            self.port = site._server.sockets[0].getsockname()[1]
+            started.set()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(serve())
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name='ingest-stub', daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальный сервер API склада для проверки загрузки')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--products', type=int, default=100)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency-ms', type=float, default=50.0)
+    parser.add_argument('--rate', type=float, default=None, help='запросов в секунду до ответа 429')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='доля ответов 503')
+    args = parser.parse_args()
+    api = StubApi(
+        SyntheticWarehouse(args.products, args.days, seed=args.seed),
+        latency_seconds=args.latency_ms / 1000, rate_per_second=args.rate, error_rate=args.error_rate
+    )
+    web.run_app(api.app(), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+"""
+Замеры горячих путей: методы DataHandler и разделы дашборда
+
+Инструментирование включается явно. Обёртки ставятся на методы
+конкретного объекта (атрибутами экземпляра), класс не меняется, поэтому
+без включения накладных расходов нет совсем. Для каждого имени хранятся
+число вызовов, последние max_samples задержек (для p50/p95/p99), число
+просмотренных и возвращённых строк и объём новых результатов в байтах
+(result_bytes). Это оценка размера возвращённых объектов по estimate_size,
+а не выделенная при вызове память: промежуточные таблицы в неё не входят,
+а повторно возвращённый объект (попадание в кэш запросов) не считается.
+Реальные выделения показывает профиль tracemalloc одного запуска.
+
+Просмотренные строки сообщает сам код через add_rows(): вызов вне замера
+ничего не делает. Для одного запуска скрипта можно снять профиль cProfile
+и крупнейшие выделения памяти tracemalloc.
+"""
+import cProfile
+import functools
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .query_cache import estimate_size
+
+_scan = threading.local()
+
+
+def add_rows(n):
+    """Учёт просмотренных строк в текущем замеряемом вызове"""
+    rows = getattr(_scan, 'rows', None)
+    if rows is not None:
+        _scan.rows = rows + int(n)
+
+
+class _Stat:
+    """
+    Накопленные замеры одного имени
+    """
+
+    __slots__ = (
+        'count', 'errors', 'total_seconds', 'samples', 'rows_scanned', 'rows_returned', 'result_bytes', 'last_result_id',
+        'last_result_ref'
+    )
+
+    def __init__(self, max_samples):
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.samples = deque(maxlen=max_samples)
+        self.rows_scanned = 0
+        self.rows_returned = 0
+        self.result_bytes = 0
+        # Последний результат без сильной ссылки: id и слабая ссылка, если
+        # объект её допускает (DataFrame да, tuple и dict нет)
+        self.last_result_id = None
+        self.last_result_ref = None
+
+    def is_last_result(self, result):
+        """Тот же ли объект вернул предыдущий вызов"""
+        if id(result) != self.last_result_id:
+            return False
+        return self.last_result_ref is None or self.last_result_ref() is result
+
+    def remember(self, result):
+        self.last_result_id = id(result)
+        try:
+            self.last_result_ref = weakref.ref(result)
+        except TypeError:
+            self.last_result_ref = None
+
+
+class Instrumentation:
+    """
+    Потокобезопасный сборщик замеров с захватом профиля одного запуска
+    """
+
+    def __init__(self, max_samples=2048):
+        self.max_samples = max_samples
+        self._stats = {}
+        self._lock = threading.Lock()
+        self.started_at = datetime.now()
+        # Профиль следующего запуска скрипта
+        self.capture_next = False
+        self.last_capture = None
+        self._profiler = None
+        self._capture_started = None
+
+    def record(self, name, seconds, rows_scanned=0, rows_returned=0, result=None, error=False):
+        """Добавление одного замера"""
+        # Объём оценивается вне блокировки: для больших таблиц это заметное время
+        nbytes = 0
+        stat = self._stats.get(name)
+        if result is not None and (stat is None or not stat.is_last_result(result)):
+            nbytes = estimate_size(result)
+        with self._lock:
+            stat = self._stats.get(name)
+            if stat is None:
+                stat = self._stats[name] = _Stat(self.max_samples)
+            if result is not None:
+                stat.remember(result)
+            stat.count += 1
+            stat.errors += bool(error)
+            stat.total_seconds += seconds
+            stat.samples.append(seconds)
+            stat.rows_scanned += rows_scanned
+            stat.rows_returned += rows_returned
+            stat.result_bytes += nbytes
+
+    @contextmanager
+    def timer(self, name):
+        """Замер времени блока (раздела дашборда, вывода графика)"""
+        previous = getattr(_scan, 'rows', None)
+        _scan.rows = 0
+        started = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            rows = _scan.rows
+            _scan.rows = None if previous is None else previous + rows
+            self.record(name, seconds, rows_scanned=rows, error=error)
+
+    def wrap(self, name, method):
+        """Обёртка метода: время, строки и объём результата"""
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            previous = getattr(_scan, 'rows', None)
+            _scan.rows = 0
+            started = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            except BaseException:
+                _scan.rows = previous
+                self.record(name, time.perf_counter() - started, error=True)
+                raise
+            seconds = time.perf_counter() - started
+            rows = _scan.rows
+            # Вложенный замеряемый вызов учитывается и во внешнем
+            _scan.rows = None if previous is None else previous + rows
+            returned = len(result) if isinstance(result, (pd.DataFrame, pd.Series, np.ndarray)) else 0
+            self.record(name, seconds, rows, returned, result=result)
+            return result
+
+        return wrapper
+
+    def stats(self):
+        """Сводка по именам: вызовы, задержки в мс, строки, байты"""
+        with self._lock:
+            items = [(name, stat, np.array(stat.samples)) for name, stat in self._stats.items()]
+        summary = {}
+        for name, stat, samples in sorted(items):
+            p50, p95, p99 = np.percentile(samples, [50, 95, 99]) * 1000 if len(samples) else (0.0, 0.0, 0.0)
+            summary[name] = {
+                'count': stat.count,
+                'errors': stat.errors,
+                'p50_ms': round(float(p50), 3),
+                'p95_ms': round(float(p95), 3),
+                'p99_ms': round(float(p99), 3),
+                'max_ms': round(float(samples.max()) * 1000, 3) if len(samples) else 0.0,
+                'total_ms': round(stat.total_seconds * 1000, 3),
+                'rows_scanned': stat.rows_scanned,
+                'rows_returned': stat.rows_returned,
+                'result_bytes': stat.result_bytes
+            }
+        return summary
+
+    def to_json(self):
+        """Сводка и последний профиль в JSON"""
+        return json.dumps({
+            'started_at': self.started_at.isoformat(),
+            'exported_at': datetime.now().isoformat(),
+            'stats': self.stats(),
+            'last_capture': self.last_capture
+        }, ensure_ascii=False, indent=2)
+
+    def reset(self):
+        """Сброс накопленных замеров"""
+        with self._lock:
+            self._stats.clear()
+            self.started_at = datetime.now()
+
+    # --- профиль одного запуска ---
+
+    @property
+    def capturing(self):
+        return self._profiler is not None
+
+    def start_capture(self):
+        """Начало профиля: cProfile текущего потока и трассировка выделений памяти"""
+        self.capture_next = False
+        self._profiler = cProfile.Profile()
+        tracemalloc.start()
+        self._capture_started = time.perf_counter()
+        self._profiler.enable()
+
+    def stop_capture(self, top=30):
+        """Окончание профиля: самые дорогие функции и места выделения памяти"""
+        if self._profiler is None:
+            return None
+        self._profiler.disable()
+        seconds = time.perf_counter() - self._capture_started
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        output = io.StringIO()
+        pstats.Stats(self._profiler, stream=output).sort_stats('cumulative').print_stats(top)
+        self._profiler = None
+        self.last_capture = {
+            'captured_at': datetime.now().isoformat(),
+            'seconds': round(seconds, 3),
+            'peak_traced_bytes': peak,
+            'profile': output.getvalue(),
+            'allocations': [
+                {'where': str(stat.traceback), 'bytes': stat.size, 'count': stat.count}
+                for stat in snapshot.statistics('lineno')[:top]
+            ]
+        }
+        return self.last_capture
+
+
+def instrument_methods(obj, instrumentation, prefix, extra=()):
+    """Замер всех публичных методов объекта и методов из extra
+
+    Обёртки записываются в атрибуты экземпляра и перекрывают методы класса.
+    """
+    names = [
+        name for name, value in vars(type(obj)).items()
+        if not name.startswith('_') and callable(value) and not isinstance(value, (staticmethod, classmethod, type))
+    ]
+    for name in list(names) + list(extra):
+        setattr(obj, name, instrumentation.wrap(prefix + name, getattr(obj, name)))
+    return obj
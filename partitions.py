@@ -0,0 +1,456 @@
+"""
+Продажи в каталоге партиций по месяцам (и при желании по товарам)
+
+Строки продаж раскладываются по партициям месяц (или месяц x товар),
+каждая партиция - одна или несколько частей в формате колоночного
+снимка (.npy на колонку, открываются через memory-map). В manifest.json
+для каждой партиции хранятся минимальная и максимальная дата, число
+строк и список частей, поэтому запрос за период открывает только
+партиции, пересекающиеся с окном, и его стоимость не зависит от длины
+истории.
+
+Дозаписанные строки добавляются новыми частями в свои партиции; когда
+частей становится больше max_parts, партиция сливается в одну часть.
+Манифест подменяется атомарно. Заменённые части перечисляются в нём
+со временем замены и удаляются не раньше чем через retain_seconds,
+чтобы процессы, читающие по старому манифесту, успели их открыть;
+части, не упомянутые в манифесте (остались от прерванной записи),
+удаляются при открытии каталога и при следующей записи. Запись идёт
+под файловой блокировкой каталога, поэтому несколько процессов могут
+делить один каталог: дописанный хвост sales.csv переносит в каталог
+только первый из них (sync_csv).
+
+Как и база SQLite, каталог сверяется с sales.csv по состоянию файла.
+Разовое преобразование CSV:
+
+    python -m modules.partitions --data data/ --by-product
+"""
+import argparse
+import io
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from .instrumentation import add_rows
+from .sales_store import (
+    SALES_COLUMNS, as_sales_frame, concat_sales, load_sales_snapshot, read_sales_csv, save_sales_snapshot,
+    sort_by_date
+)
+from .sources import APPENDED, CHANGED, UNCHANGED, SourceTracker
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: запись разделяется только между потоками одного процесса
+    fcntl = None
+
+MANIFEST_FILE = 'manifest.json'
+LOCK_FILE = '.lock'
+MANIFEST_FORMAT_VERSION = 1
+
+
+def _empty_sales():
+    return as_sales_frame(pd.DataFrame({column: [] for column in SALES_COLUMNS}))
+
+
+def partition_key(month, product_id=None):
+    """Ключ и каталог партиции: '2024-05' или '2024-05/<товар>'"""
+    if product_id is None:
+        return month
+    return '%s/%s' % (month, quote(str(product_id), safe=''))
+
+
+class PartitionStore:
+    """
+    Каталог партиций продаж с манифестом
+    """
+
+    def __init__(self, root, by_product=False, max_parts=8, max_open=64, retain_seconds=3600):
+        self.root = root
+        self.by_product = by_product
+        # Частей в партиции до слияния в одну
+        self.max_parts = max_parts
+        # Сколько секунд хранить заменённые части для читателей старого манифеста
+        self.retain_seconds = retain_seconds
+        # Сколько открытых партиций держать для повторных запросов
+        self.max_open = max_open
+        self._write_lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._open = OrderedDict()
+        self._manifest = self._read_manifest()
+        if self._manifest is not None:
+            with self._locked():
+                self._remove_unreferenced()
+        # Рассчитанные ABC категории товаров вместо колонки abc_category
+        self.product_classes = None
+
+    # --- манифест ---
+
+    def _read_manifest(self):
+        try:
+            with open(os.path.join(self.root, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get('format_version') != MANIFEST_FORMAT_VERSION:
+            return None
+        return manifest
+
+    def _write_manifest(self, manifest):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, MANIFEST_FILE + '.tmp-%d' % os.getpid())
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(self.root, MANIFEST_FILE))
+        self._manifest = manifest
+
+    @property
+    def partitions(self):
+        """Описания партиций в порядке месяца и товара"""
+        return self._manifest['partitions'] if self._manifest else []
+
+    def source_state(self, table='sales'):
+        """Состояние sales.csv, по которому построен каталог"""
+        return self._manifest.get('source') if self._manifest else None
+
+    @contextmanager
+    def _locked(self):
+        """Блокировка записи каталога между потоками и процессами
+
+        Под блокировкой манифест перечитывается с диска: его мог
+        подменить другой процесс, и номера новых частей берутся из него.
+        """
+        with self._write_lock:
+            os.makedirs(self.root, exist_ok=True)
+            with open(os.path.join(self.root, LOCK_FILE), 'a') as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    self._manifest = self._read_manifest()
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _retire(self, manifest):
+        """Запись в новый манифест частей, заменённых им, со временем замены
+
+        Части, заменённые раньше чем retain_seconds назад, из списка
+        убираются и будут удалены при следующей чистке.
+        """
+        now = time.time()
+        kept = {part for partition in manifest['partitions'] for part in partition['parts']}
+        previous = self._manifest or {}
+        retired = [
+            entry for entry in previous.get('retired', [])
+            if now - entry['at'] < self.retain_seconds and entry['part'] not in kept
+        ]
+        replaced = {part for partition in previous.get('partitions', []) for part in partition['parts']} - kept
+        retired.extend({'part': part, 'at': now} for part in sorted(replaced))
+        manifest['retired'] = retired
+
+    def _remove_unreferenced(self):
+        """Удаление частей, не нужных ни текущему, ни недавним манифестам
+
+        Удаляются части, заменённые больше retain_seconds назад, и части
+        записи, прерванной до подмены манифеста. Вызывается под блокировкой.
+        """
+        now = time.time()
+        referenced = {part for partition in self.partitions for part in partition['parts']}
+        referenced.update(
+            entry['part'] for entry in (self._manifest or {}).get('retired', [])
+            if now - entry['at'] < self.retain_seconds
+        )
+        for directory, subdirs, _ in os.walk(self.root):
+            for name in list(subdirs):
+                if not name.startswith('part-'):
+                    continue
+                subdirs.remove(name)
+                part = os.path.relpath(os.path.join(directory, name), self.root).replace(os.sep, '/')
+                if part not in referenced:
+                    shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+    # --- запись ---
+
+    def _write_parts(self, manifest, df):
+        """Раскладка строк по партициям новыми частями, возвращает ключи изменённых партиций"""
+        df = sort_by_date(as_sales_frame(df))
+        months = df['date'].to_numpy().astype('datetime64[M]').astype(np.int64)
+        products = df['product_id'].cat.codes.to_numpy().astype(np.int64)
+        # Код группы - месяц или пара месяц x товар; строки групп собираются стабильной сортировкой
+        codes = months * (len(df['product_id'].cat.categories) + 1) + products if self.by_product else months
+        groups, inverse = np.unique(codes, return_inverse=True)
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.searchsorted(inverse[order], np.arange(len(groups) + 1))
+
+        index = {partition['key']: partition for partition in manifest['partitions']}
+        touched = set()
+        for i in range(len(groups)):
+            rows = df.iloc[order[bounds[i]:bounds[i + 1]]].reset_index(drop=True)
+            month = str(np.datetime64(int(months[order[bounds[i]]]), 'M'))
+            product_id = str(rows['product_id'].iloc[0]) if self.by_product else None
+            key = partition_key(month, product_id)
+            part = '%s/part-%06d' % (key, manifest['next_part'])
+            manifest['next_part'] += 1
+            save_sales_snapshot(rows, os.path.join(self.root, part))
+
+            partition = index.get(key)
+            min_date = str(rows['date'].iloc[0])
+            max_date = str(rows['date'].iloc[-1])
+            if partition is None:
+                partition = index[key] = {
+                    'key': key, 'month': month, 'product_id': product_id,
+                    'min_date': min_date, 'max_date': max_date, 'rows': 0, 'parts': []
+                }
+            partition['min_date'] = min(partition['min_date'], min_date)
+            partition['max_date'] = max(partition['max_date'], max_date)
+            partition['rows'] += len(rows)
+            partition['parts'].append(part)
+            touched.add(key)
+        manifest['partitions'] = sorted(index.values(), key=lambda p: (p['month'], p['product_id'] or ''))
+        return touched
+
+    def _compact(self, manifest, keys, max_parts):
+        """Слияние частей партиций, у которых их больше max_parts"""
+        for partition in manifest['partitions']:
+            if partition['key'] not in keys or len(partition['parts']) <= max_parts:
+                continue
+            frame = self._load_partition(partition)
+            part = '%s/part-%06d' % (partition['key'], manifest['next_part'])
+            manifest['next_part'] += 1
+            save_sales_snapshot(frame, os.path.join(self.root, part))
+            partition['parts'] = [part]
+
+    def _new_manifest(self, source=None):
+        return {
+            'format_version': MANIFEST_FORMAT_VERSION,
+            'by_product': self.by_product,
+            'source': source,
+            'next_part': (self._manifest or {}).get('next_part', 1),
+            'partitions': []
+        }
+
+    def load_csv(self, table, tracker, chunk_rows=500_000):
+        """Полное построение каталога из CSV частями по chunk_rows строк
+
+        Каждая часть CSV раскладывается по партициям, в конце части каждой
+        партиции сливаются в одну. Пиковая память - часть CSV или одна
+        партиция. Прежние части удаляются при следующей записи.
+        """
+        with self._locked():
+            self._load_csv(tracker, chunk_rows)
+
+    def _load_csv(self, tracker, chunk_rows):
+        self._remove_unreferenced()
+        manifest = self._new_manifest()
+        touched = set()
+        for chunk in read_sales_csv(tracker.open_full(), chunksize=chunk_rows):
+            if len(chunk):
+                touched |= self._write_parts(manifest, chunk)
+        self._compact(manifest, touched, max_parts=1)
+        manifest['source'] = tracker.state()
+        self._retire(manifest)
+        self._write_manifest(manifest)
+
+    def append(self, table, df, tracker=None):
+        """Дозапись строк новыми частями партиций (и состояния исходного файла)"""
+        with self._locked():
+            self._append(df, tracker)
+
+    def _append(self, df, tracker=None):
+        self._remove_unreferenced()
+        manifest = json.loads(json.dumps(self._manifest)) if self._manifest else self._new_manifest()
+        if df is not None and len(df):
+            touched = self._write_parts(manifest, df)
+            self._compact(manifest, touched, self.max_parts)
+        if tracker is not None:
+            manifest['source'] = tracker.state()
+        self._retire(manifest)
+        self._write_manifest(manifest)
+
+    def set_product_classes(self, products, labels):
+        """Рассчитанные ABC категории товаров, после них фильтр ABC использует их"""
+        self.product_classes = dict(zip(products, labels))
+
+    def read_tail(self, table, tracker):
+        """Разбор строк, дописанных в исходный CSV после последнего чтения"""
+        tail = tracker.read_tail()
+        if not tail:
+            return None
+        return read_sales_csv(io.BytesIO(tail), header=None, names=tracker.columns)
+
+    def sync_csv(self, table, tracker, chunk_rows=500_000):
+        """Приведение каталога в соответствие с sales.csv
+
+        Неизменённый файл не читается, из дописанного добавляется только
+        хвост, в остальных случаях (и при смене разбиения по товарам)
+        каталог строится заново. Сверка идёт под блокировкой записи: если
+        файл уже перенёс в каталог другой процесс, он не читается повторно.
+        Возвращает статус файла.
+        """
+        if table != 'sales':
+            raise ValueError("В партициях хранятся только продажи, а не %s" % table)
+        with self._locked():
+            state = self.source_state()
+            status = CHANGED
+            if state is not None and self._manifest.get('by_product') == self.by_product:
+                tracker.restore(state)
+                status = tracker.check()
+            if status == APPENDED:
+                self._append(self.read_tail(table, tracker), tracker)
+            elif status != UNCHANGED:
+                self._load_csv(tracker, chunk_rows)
+        return status
+
+    # --- чтение ---
+
+    def _load_partition(self, partition):
+        """Строки партиции: части через memory-map, отсортированные по дате"""
+        frames = []
+        for part in partition['parts']:
+            frame = load_sales_snapshot(os.path.join(self.root, part))
+            if frame is None:
+                raise OSError("Часть партиции недоступна: %s" % part)
+            frames.append(frame)
+        if len(frames) == 1:
+            return frames[0]
+        return sort_by_date(concat_sales(*frames))
+
+    def _partition_frame(self, partition):
+        """Строки партиции из набора открытых или с диска"""
+        key = tuple(partition['parts'])
+        with self._cache_lock:
+            frame = self._open.get(key)
+            if frame is not None:
+                self._open.move_to_end(key)
+                return frame
+        frame = self._load_partition(partition)
+        with self._cache_lock:
+            self._open[key] = frame
+            while len(self._open) > self.max_open:
+                self._open.popitem(last=False)
+        return frame
+
+    def partitions_between(self, start_date=None, end_date=None, abc_filter="Все", product_id=None):
+        """Партиции, пересекающиеся с окном дат (границы включительно)
+
+        При разбиении по товарам отбрасываются и партиции других товаров
+        и, если известны рассчитанные категории, товаров другого класса.
+        """
+        start = None if start_date is None else pd.Timestamp(start_date)
+        end = None if end_date is None else pd.Timestamp(end_date)
+        selected = []
+        for partition in self.partitions:
+            if start is not None and pd.Timestamp(partition['max_date']) < start:
+                continue
+            if end is not None and pd.Timestamp(partition['min_date']) > end:
+                continue
+            if partition['product_id'] is not None:
+                if product_id is not None and partition['product_id'] != str(product_id):
+                    continue
+                if abc_filter != "Все" and self.product_classes is not None:
+                    if self.product_classes.get(partition['product_id']) != abc_filter:
+                        continue
+            selected.append(partition)
+        return selected
+
+    def sales_frame(self, start_date=None, end_date=None, abc_filter="Все", size_filter="Все", product_id=None):
+        """Строки продаж за период по фильтрам, отсортированные по дате"""
+        start = None if start_date is None else pd.Timestamp(start_date).to_datetime64()
+        end = None if end_date is None else pd.Timestamp(end_date).to_datetime64()
+        frames = []
+        for partition in self.partitions_between(start_date, end_date, abc_filter, product_id):
+            frame = self._partition_frame(partition)
+            dates = frame['date'].to_numpy()
+            lo = 0 if start is None else dates.searchsorted(start, side='left')
+            hi = len(dates) if end is None else dates.searchsorted(end, side='right')
+            add_rows(hi - lo)
+            if hi > lo:
+                frames.append(frame.iloc[lo:hi])
+        if not frames:
+            return _empty_sales()
+        df = sort_by_date(concat_sales(*frames))
+
+        mask = np.ones(len(df), dtype=bool)
+        if abc_filter != "Все":
+            if self.product_classes is not None:
+                categories = df['product_id'].cat.categories
+                labels = np.array([self.product_classes.get(str(c)) for c in categories] + [None], dtype=object)
+                mask &= labels[df['product_id'].cat.codes.to_numpy()] == abc_filter
+            else:
+                mask &= (df['abc_category'] == abc_filter).to_numpy()
+        if size_filter != "Все":
+            mask &= (df['size'] == size_filter).to_numpy()
+        if product_id is not None:
+            mask &= (df['product_id'] == str(product_id)).to_numpy()
+        return df if mask.all() else df[mask].reset_index(drop=True)
+
+    def sales_total(self, start_date=None, end_date=None, abc_filter="Все", size_filter="Все", product_id=None):
+        """Сумма продаж за период по фильтрам"""
+        return int(self.sales_frame(start_date, end_date, abc_filter, size_filter, product_id)['sales'].sum())
+
+    def totals_between(self, edges, abc_filter="Все", size_filter="Все", product_id=None):
+        """Суммы продаж по соседним окнам дат по партициям общего окна
+
+        Границы окон как в DailyRollup.totals_between: окно i - от edges[i]
+        включительно до edges[i + 1], последняя граница включается.
+        """
+        df = self.sales_frame(edges[0], edges[-1], abc_filter, size_filter, product_id)
+        dates = df['date'].to_numpy()
+        positions = [
+            0 if edge is None else int(dates.searchsorted(pd.Timestamp(edge).to_datetime64(), side='left'))
+            for edge in edges[:-1]
+        ] + [len(dates)]
+        cumulative = np.concatenate([[0], np.cumsum(df['sales'].to_numpy(), dtype=np.int64)])
+        return np.diff(cumulative[positions])
+
+    def sales_chunks(self, chunk_rows=500_000):
+        """Все строки продаж частями не меньше chunk_rows строк, для построения дневного агрегата
+
+        Мелкие партиции (месяц x товар) объединяются в одну часть. Партиции
+        читаются мимо набора открытых, чтобы полный проход не вытеснял из
+        него партиции коротких периодов.
+        """
+        frames = []
+        rows = 0
+        for partition in self.partitions:
+            frames.append(self._load_partition(partition))
+            rows += partition['rows']
+            if rows >= chunk_rows:
+                yield concat_sales(*frames)
+                frames = []
+                rows = 0
+        if frames:
+            yield concat_sales(*frames)
+
+
+def convert_csv(data_path, root=None, by_product=False, chunk_rows=500_000):
+    """Разовое построение каталога партиций из sales.csv каталога данных"""
+    root = root or os.path.join(data_path, '.cache', 'partitions')
+    store = PartitionStore(root, by_product=by_product)
+    status = store.sync_csv('sales', SourceTracker(os.path.join(data_path, 'sales.csv')), chunk_rows)
+    return store, status
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Раскладка sales.csv по партициям месяцев')
+    parser.add_argument('--data', default='data')
+    parser.add_argument('--out', default=None, help='каталог партиций, по умолчанию data/.cache/partitions')
+    parser.add_argument('--by-product', action='store_true', help='партиции месяц x товар')
+    parser.add_argument('--chunk-rows', type=int, default=500_000)
+    args = parser.parse_args()
+    store, status = convert_csv(args.data, args.out, args.by_product, args.chunk_rows)
+    rows = sum(partition['rows'] for partition in store.partitions)
+    print('sales.csv: %s, партиций: %d, строк: %d' % (status, len(store.partitions), rows))
+
+
+if __name__ == '__main__':
+    main()
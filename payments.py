@@ -0,0 +1,126 @@
+"""
+Аналитика оплат: суммы по периодам и типам, денежный поток, следующая оплата
+
+Даты payments.csv разбираются один раз, после чего суммы по месяцам,
+неделям и дням в разрезе типа оплаты считаются одной группировкой на
+каждую частоту, накопленный поток - одним cumsum по дневным суммам.
+Следующая оплата каждого типа оценивается по медианному интервалу между
+его прошлыми оплатами: от последней оплаты откладывается столько целых
+интервалов, сколько нужно, чтобы дата была не раньше сегодняшней.
+"""
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+PAYMENT_TYPES = ['Поставщик', 'Логистика', 'Маркетплейс']
+# Частоты сумм по периодам
+FREQUENCIES = {
+    'месяц': 'ME',
+    'неделя': 'W-SUN',
+    'день': 'D'
+}
+
+
+def read_payments_csv(source, **kwargs):
+    """Чтение CSV с оплатами: даты - datetime64, как в базе и в общем снимке
+
+    С chunksize возвращается итератор частей с теми же типами.
+    """
+    if kwargs.get('chunksize') is not None:
+        return (_parse_payment_dates(chunk) for chunk in pd.read_csv(source, **kwargs))
+    return _parse_payment_dates(pd.read_csv(source, **kwargs))
+
+
+def _parse_payment_dates(payments):
+    payments['date'] = pd.to_datetime(payments['date'], errors='coerce', format='ISO8601')
+    return payments
+
+
+def parse_payments(payments_data):
+    """Оплаты с разобранными датами, отсортированные по дате
+
+    Строки без даты или суммы отбрасываются. Тип - категория, в которой
+    известные типы идут первыми в порядке PAYMENT_TYPES.
+    """
+    dates = pd.to_datetime(pd.Series(np.asarray(payments_data['date'], dtype=object)), errors='coerce')
+    amounts = pd.to_numeric(pd.Series(np.asarray(payments_data['amount'])), errors='coerce')
+    types = pd.Series(np.asarray(payments_data['type'], dtype=object)).astype(str)
+    extra = sorted(set(types.unique()) - set(PAYMENT_TYPES))
+    payments = pd.DataFrame({
+        'date': dates,
+        'amount': amounts,
+        'type': pd.Categorical(types, categories=PAYMENT_TYPES + extra)
+    })
+    payments = payments[payments['date'].notna() & payments['amount'].notna()]
+    return payments.sort_values('date', kind='stable', ignore_index=True)
+
+
+def totals_by_type(payments, freq):
+    """Суммы оплат по периодам частоты freq: строки - периоды без пропусков, колонки - типы"""
+    if len(payments) == 0:
+        return pd.DataFrame(columns=pd.Index(payments['type'].cat.categories, name='type'), dtype=np.float64)
+    totals = (
+        payments
+        .groupby([pd.Grouper(key='date', freq=freq), 'type'], observed=False)['amount']
+        .sum()
+        .unstack('type', fill_value=0)
+    )
+    # Группировка по двум ключам не даёт периодов без оплат, они дополняются нулями
+    return totals.asfreq(freq, fill_value=0)
+
+
+def cash_flow(payments, window_days=30):
+    """Дневной денежный поток: сумма за день, накопленная сумма и сумма за window_days дней"""
+    if len(payments) == 0:
+        return pd.DataFrame(
+            {'amount': [], 'cumulative': [], 'rolling': []},
+            index=pd.DatetimeIndex([], name='date'),
+            dtype=np.float64
+        )
+    daily = payments.set_index('date')['amount'].resample('D').sum()
+    return pd.DataFrame({
+        'amount': daily,
+        'cumulative': daily.cumsum(),
+        'rolling': daily.rolling(window_days, min_periods=1).sum()
+    })
+
+
+def next_payments(payments, today=None):
+    """Оценка следующей оплаты каждого типа по интервалам между прошлыми оплатами
+
+    Интервал - медиана разностей дат оплат типа в днях, ожидаемая сумма -
+    медиана сумм. Для типа с одной оплатой интервал не определён и дата
+    следующей оплаты пустая. Результат отсортирован по дате следующей оплаты.
+    """
+    today = pd.Timestamp(today or date.today()).normalize()
+    grouped = payments.groupby('type', observed=True)
+    gaps = grouped['date'].diff().dt.days
+    table = pd.DataFrame({
+        'last_date': grouped['date'].max(),
+        'count': grouped['date'].size(),
+        'cadence_days': gaps.groupby(payments['type'], observed=True).median(),
+        'expected_amount': grouped['amount'].median()
+    })
+    cadence = table['cadence_days'].where(table['cadence_days'] > 0)
+    # Число целых интервалов от последней оплаты до сегодняшнего дня или позже
+    elapsed = (today - table['last_date']).dt.days
+    steps = np.maximum(np.ceil(elapsed / cadence), 1)
+    table['next_date'] = table['last_date'] + pd.to_timedelta(steps * cadence, unit='D')
+    table.index.name = 'type'
+    return table.sort_values('next_date', na_position='last')
+
+
+def payment_analytics(payments_data, today=None, window_days=30):
+    """Все таблицы раздела оплат за один расчёт"""
+    payments = parse_payments(payments_data)
+    totals = {name: totals_by_type(payments, freq) for name, freq in FREQUENCIES.items()}
+    monthly = totals['месяц'].sum(axis=1)
+    return {
+        'payments': payments,
+        'totals': totals,
+        'cash_flow': cash_flow(payments, window_days),
+        'next_payments': next_payments(payments, today),
+        'total': float(payments['amount'].sum()),
+        'average_monthly': float(monthly.mean()) if len(monthly) else 0.0
+    }
@@ -0,0 +1,149 @@
+"""
+LRU кэш результатов запросов DataHandler с ограничением по объёму
+
+Ключ запроса: (метод, аргументы, версия данных, текущий день). При
+изменении исходных файлов версия данных растёт, и старые записи перестают
+совпадать с новыми ключами; сам кэш при этом очищается, чтобы не держать
+память. Текущий день входит в ключ, потому что окна периодов отсчитываются
+от сегодняшней даты.
+"""
+import functools
+import inspect
+import sys
+import threading
+from collections import OrderedDict
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+_MISSING = object()
+
+
+def estimate_size(value):
+    """Оценка объёма значения в байтах"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=False, index=True)
+        return int(usage.sum() if isinstance(usage, pd.Series) else usage)
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            estimate_size(k) + estimate_size(v) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class QueryCache:
+    """
+    Потокобезопасный LRU кэш с бюджетом в байтах и счётчиками попаданий
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Получение значения с отметкой последнего использования"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size=None):
+        """Сохранение значения с вытеснением давно не использованных
+
+        size - объём значения в байтах, если его нельзя оценить по типу.
+        """
+        if size is None:
+            size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        """Очистка кэша (счётчики сохраняются)"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Счётчики кэша"""
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.current_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0
+        }
+
+
+def cached_query(method):
+    """Кэширование результата метода DataHandler в self.query_cache
+
+    Аргументы приводятся к полному набору с учётом значений по умолчанию,
+    поэтому вызовы get_sales_by_period("месяц") и
+    get_sales_by_period(period="месяц") попадают в одну запись.
+    Возвращаемые значения общие для всех вызывающих и не должны изменяться.
+
+    Если у метода есть аргумент state (снимок DataState), а вызывающий
+    его не передал, подставляется текущее состояние обработчика. Снимок
+    в ключ не входит: вместо него берётся его версия, поэтому результат
+    попадает в кэш под версией тех данных, по которым посчитан.
+    """
+    signature = inspect.signature(method)
+    takes_state = 'state' in signature.parameters
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        if takes_state and bound.arguments['state'] is None:
+            bound.arguments['state'] = self._state
+        cache = getattr(self, 'query_cache', None)
+        if cache is None:
+            return method(*bound.args, **bound.kwargs)
+        arguments = dict(bound.arguments)
+        state = arguments.pop('state', None)
+        key = (
+            method.__name__,
+            tuple(arguments.items())[1:],
+            state.version if state is not None else self.data_version,
+            date.today()
+        )
+        try:
+            hash(key)
+        except TypeError:
+            return method(*bound.args, **bound.kwargs)
+        result = cache.get(key, _MISSING)
+        if result is _MISSING:
+            result = method(*bound.args, **bound.kwargs)
+            cache.put(key, result)
+        return result
+
+    return wrapper
@@ -0,0 +1,361 @@
+"""
+Дневной агрегат продаж (день x товар x размер)
+
+Куб хранится в виде префиксных сумм по дням: prefix[d] - продажи по всем
+дням до d (не включая). Сумма за любое окно дней по ячейке товар/размер
+считается как prefix[hi] - prefix[lo] за O(1), поэтому запросы по периоду,
+ABC категории и размеру не зависят от глубины истории.
+
+Ось товар x размер хранится только для реально встречающихся пар (SKU),
+а не как полное произведение всех товаров на все размеры: у разных
+товаров разные размерные сетки.
+"""
+import numpy as np
+import pandas as pd
+
+ABC_CLASSES = ['A', 'B', 'C']
+
+# Накопленные продажи одной пары товар/размер за всю историю помещаются в int32
+COUNT_DTYPE = np.int32
+ONE_DAY = np.timedelta64(1, 'D')
+DAY_MICROSECONDS = 86_400_000_000
+# День метки ABC товара, у которого её ещё нет
+NO_DAY = np.iinfo(np.int64).min
+
+
+class DailyRollup:
+    """
+    Дневной куб продаж с инкрементальным обновлением
+    """
+
+    def __init__(self):
+        self.start_day = None
+        self.n_days = 0
+        self.products = []
+        self.sizes = []
+        self._product_index = {}
+        self._size_index = {}
+        self._sku_index = {}
+        self.product_abc = np.empty(0, dtype=np.int8)
+        # День строки, из которой взята категория товара (дни от 1970-01-01)
+        self.product_abc_day = np.empty(0, dtype=np.int64)
+        self.sku_product = np.empty(0, dtype=np.int32)
+        self.sku_size = np.empty(0, dtype=np.int32)
+        self.n_skus = 0
+        # Буфер с запасом по обеим осям, чтобы дозапись была амортизированно дешёвой
+        self._prefix = np.zeros((1, 0), dtype=COUNT_DTYPE)
+        self.version = 0
+
+    @classmethod
+    def from_sales(cls, sales_data):
+        """Построение куба по таблице продаж"""
+        rollup = cls()
+        rollup.add(sales_data)
+        return rollup
+
+    @classmethod
+    def from_arrays(cls, start_day, products, sizes, product_abc, sku_product, sku_size, prefix, version=0,
+                    product_abc_day=None):
+        """Куб поверх готовых массивов без копирования
+
+        Используется для подключения к опубликованному снимку: массивы могут
+        быть открыты через memory-map только на чтение, тогда такой куб
+        нельзя дописывать, но copy() вернёт изменяемую копию. Без
+        product_abc_day категории заменяются любой новой строкой товара.
+        """
+        rollup = cls()
+        rollup.start_day = None if start_day is None else np.datetime64(start_day, 'D')
+        rollup.n_days = prefix.shape[0] - 1
+        rollup.products = list(products)
+        rollup.sizes = list(sizes)
+        rollup._product_index = {label: i for i, label in enumerate(rollup.products)}
+        rollup._size_index = {label: i for i, label in enumerate(rollup.sizes)}
+        rollup._sku_index = {
+            (int(product), int(size)): i for i, (product, size) in enumerate(zip(sku_product, sku_size))
+        }
+        rollup.product_abc = product_abc
+        if product_abc_day is None:
+            product_abc_day = np.full(len(product_abc), NO_DAY, dtype=np.int64)
+        rollup.product_abc_day = product_abc_day
+        rollup.sku_product = sku_product
+        rollup.sku_size = sku_size
+        rollup.n_skus = len(sku_product)
+        rollup._prefix = prefix
+        rollup.version = version
+        return rollup
+
+    @property
+    def prefix(self):
+        """Префиксные суммы: (n_days + 1) x n_skus"""
+        return self._prefix[:self.n_days + 1, :self.n_skus]
+
+    @property
+    def days(self):
+        """Календарные дни оси куба"""
+        if self.start_day is None:
+            return np.empty(0, dtype='datetime64[D]')
+        return self.start_day + np.arange(self.n_days)
+
+    @property
+    def end_day(self):
+        """Последний день куба"""
+        return None if self.start_day is None else self.start_day + (self.n_days - 1)
+
+    def copy(self):
+        """Независимая копия куба"""
+        other = DailyRollup.__new__(DailyRollup)
+        other.__dict__.update(self.__dict__)
+        other.products = list(self.products)
+        other.sizes = list(self.sizes)
+        other._product_index = dict(self._product_index)
+        other._size_index = dict(self._size_index)
+        other._sku_index = dict(self._sku_index)
+        other.product_abc = self.product_abc.copy()
+        other.product_abc_day = self.product_abc_day.copy()
+        other.sku_product = self.sku_product.copy()
+        other.sku_size = self.sku_size.copy()
+        other._prefix = self._prefix.copy()
+        return other
+
+    def with_abc(self, product_abc):
+        """Куб с другими ABC категориями товаров, массивы продаж общие"""
+        other = DailyRollup.__new__(DailyRollup)
+        other.__dict__.update(self.__dict__)
+        other.product_abc = product_abc
+        return other
+
+    # --- обновление ---
+
+    def _codes(self, values, labels, index):
+        """Коды значений в справочнике с дополнением новых значений"""
+        categorical = pd.Categorical(values)
+        mapping = np.empty(len(categorical.categories), dtype=np.int32)
+        for i, label in enumerate(categorical.categories):
+            label = str(label)
+            if label not in index:
+                index[label] = len(labels)
+                labels.append(label)
+            mapping[i] = index[label]
+        return mapping[categorical.codes]
+
+    def _sku_codes(self, product_codes, size_codes):
+        """Коды SKU (пар товар/размер) с регистрацией новых пар"""
+        pair = product_codes.astype(np.int64) * (len(self.sizes) + 1) + size_codes
+        unique_pairs, inverse = np.unique(pair, return_inverse=True)
+        mapping = np.empty(len(unique_pairs), dtype=np.int32)
+        new_products = []
+        new_sizes = []
+        for i, value in enumerate(unique_pairs):
+            key = (int(value // (len(self.sizes) + 1)), int(value % (len(self.sizes) + 1)))
+            if key not in self._sku_index:
+                self._sku_index[key] = self.n_skus + len(new_products)
+                new_products.append(key[0])
+                new_sizes.append(key[1])
+            mapping[i] = self._sku_index[key]
+        if new_products:
+            self.sku_product = np.concatenate([self.sku_product, np.array(new_products, dtype=np.int32)])
+            self.sku_size = np.concatenate([self.sku_size, np.array(new_sizes, dtype=np.int32)])
+            self._reserve(self.n_days, self.n_skus + len(new_products))
+            self.n_skus += len(new_products)
+        return mapping[inverse.ravel()]
+
+    def _reserve(self, n_days, n_skus):
+        """Расширение буфера префиксных сумм с удвоением ёмкости"""
+        rows, cols = self._prefix.shape
+        if n_days + 1 <= rows and n_skus <= cols:
+            return
+        new_rows = rows if n_days + 1 <= rows else max(n_days + 1, rows * 2)
+        new_cols = cols if n_skus <= cols else max(n_skus, cols * 2)
+        prefix = np.zeros((new_rows, new_cols), dtype=COUNT_DTYPE)
+        prefix[:self.n_days + 1, :self.n_skus] = self.prefix
+        self._prefix = prefix
+
+    def _extend_days(self, first_day, last_day):
+        """Расширение оси дней, чтобы она покрывала [first_day, last_day]"""
+        if self.start_day is None:
+            self.start_day = first_day
+        if first_day < self.start_day:
+            # Строки раньше начала истории: сдвиг куба вправо (редкий случай)
+            shift = int((self.start_day - first_day) // ONE_DAY)
+            old = self.prefix.copy()
+            self._reserve(self.n_days + shift, self.n_skus)
+            self._prefix[:shift + 1, :self.n_skus] = 0
+            self._prefix[shift:shift + self.n_days + 1, :self.n_skus] = old
+            self.start_day = first_day
+            self.n_days += shift
+        n_days = int((last_day - self.start_day) // ONE_DAY) + 1
+        if n_days > self.n_days:
+            self._reserve(n_days, self.n_skus)
+            # Новые дни без продаж продолжают накопленную сумму
+            self._prefix[self.n_days + 1:n_days + 1, :self.n_skus] = self._prefix[self.n_days, :self.n_skus]
+            self.n_days = n_days
+
+    def add(self, sales_rows):
+        """Инкрементальное добавление строк продаж
+
+        Стоимость пропорциональна числу новых строк и числу дней от самой
+        ранней новой даты до конца истории - для дозаписи в конец это
+        несколько последних дней.
+        """
+        if len(sales_rows) == 0:
+            return
+        days = sales_rows['date'].to_numpy().astype('datetime64[D]')
+        product_codes = self._codes(sales_rows['product_id'], self.products, self._product_index)
+        size_codes = self._codes(sales_rows['size'], self.sizes, self._size_index)
+        self._update_abc(product_codes, days, sales_rows)
+        sku_codes = self._sku_codes(product_codes, size_codes)
+
+        self._extend_days(days.min(), days.max())
+        day_codes = ((days - self.start_day) // ONE_DAY).astype(np.int64)
+        lo = int(day_codes.min())
+        hi = int(day_codes.max())
+
+        touched, sku_local = np.unique(sku_codes, return_inverse=True)
+        sku_local = sku_local.ravel()
+        block = np.bincount(
+            (day_codes - lo) * len(touched) + sku_local,
+            weights=sales_rows['sales'].to_numpy(),
+            minlength=(hi - lo + 1) * len(touched)
+        ).reshape(hi - lo + 1, len(touched))
+        cumulative = np.cumsum(block, axis=0).astype(COUNT_DTYPE)
+
+        prefix = self.prefix
+        prefix[lo + 1:hi + 2, touched] += cumulative
+        if hi + 2 <= self.n_days:
+            prefix[hi + 2:, touched] += cumulative[-1]
+        self.version += 1
+
+    def _update_abc(self, product_codes, days, sales_rows):
+        """ABC категория товара по строке продаж с самой поздней датой
+
+        При равных датах берётся строка, добавленная позже, поэтому
+        дозапись строк (в том числе задним числом) даёт те же категории,
+        что и построение по всей таблице, отсортированной по дате.
+        """
+        missing = len(self.products) - len(self.product_abc)
+        if missing > 0:
+            self.product_abc = np.concatenate([self.product_abc, np.full(missing, -1, dtype=np.int8)])
+            self.product_abc_day = np.concatenate([self.product_abc_day, np.full(missing, NO_DAY, dtype=np.int64)])
+        if 'abc_category' not in sales_rows:
+            return
+        abc = pd.Categorical(sales_rows['abc_category'].astype(str), categories=ABC_CLASSES).codes
+        day_numbers = days.astype(np.int64)
+        # Последняя строка каждого товара в порядке (товар, дата, позиция)
+        order = np.lexsort((np.arange(len(product_codes)), day_numbers, product_codes))
+        sorted_products = product_codes[order]
+        last = order[np.append(sorted_products[1:] != sorted_products[:-1], True)]
+        products = product_codes[last]
+        newer = day_numbers[last] >= self.product_abc_day[products]
+        self.product_abc[products[newer]] = abc[last[newer]].astype(np.int8)
+        self.product_abc_day[products[newer]] = day_numbers[last[newer]]
+
+    # --- запросы ---
+
+    def abc_codes(self, product_ids):
+        """Коды ABC категорий товаров для колонки строк (-1 - товар неизвестен)"""
+        categorical = pd.Categorical(product_ids)
+        lookup = pd.Index(self.products).get_indexer(categorical.categories.astype(str))
+        # Индекс -1 (неизвестный товар, пропуск) попадает на добавленный в конец код -1
+        by_category = np.append(np.append(self.product_abc, np.int8(-1))[lookup], np.int8(-1))
+        return by_category[categorical.codes]
+
+    def _day_row(self, value, side):
+        """Позиция даты на оси дней, как у searchsorted по self.days
+
+        Дни идут подряд с шагом в сутки, поэтому позиция считается от
+        start_day арифметикой, без построения оси на каждый запрос.
+        """
+        moment = pd.Timestamp(value).to_datetime64().astype('datetime64[us]')
+        micros = int((moment - self.start_day.astype('datetime64[us]')).astype(np.int64))
+        if side == 'left':
+            row = -(-micros // DAY_MICROSECONDS)
+        else:
+            row = micros // DAY_MICROSECONDS + 1
+        return min(max(row, 0), self.n_days)
+
+    def day_range(self, start_date=None, end_date=None):
+        """Индексы дней [lo, hi) для окна дат (границы включительно)"""
+        if self.start_day is None:
+            return 0, 0
+        lo = 0
+        if start_date is not None:
+            lo = self._day_row(start_date, 'left')
+        hi = self.n_days
+        if end_date is not None:
+            hi = self._day_row(end_date, 'right')
+        return lo, max(lo, hi)
+
+    def sku_mask(self, abc_filter="Все", size_filter="Все", product_id=None):
+        """Маска SKU по фильтрам ABC, размера и товара"""
+        mask = np.ones(self.n_skus, dtype=bool)
+        if abc_filter != "Все":
+            abc_code = ABC_CLASSES.index(abc_filter) if abc_filter in ABC_CLASSES else -2
+            mask &= self.product_abc[self.sku_product] == abc_code
+        if size_filter != "Все":
+            mask &= self.sku_size == self._size_index.get(str(size_filter), -1)
+        if product_id is not None:
+            mask &= self.sku_product == self._product_index.get(str(product_id), -1)
+        return mask
+
+    def window(self, start_date=None, end_date=None):
+        """Продажи за окно дат по каждому SKU"""
+        lo, hi = self.day_range(start_date, end_date)
+        prefix = self.prefix
+        return prefix[hi].astype(np.int64) - prefix[lo]
+
+    def total(self, start_date=None, end_date=None, abc_filter="Все", size_filter="Все", product_id=None):
+        """Сумма продаж за окно по фильтрам"""
+        mask = self.sku_mask(abc_filter, size_filter, product_id)
+        return int(self.window(start_date, end_date)[mask].sum())
+
+    def totals_between(self, edges, abc_filter="Все", size_filter="Все", product_id=None):
+        """Суммы продаж по соседним окнам дат за один проход
+
+        edges - возрастающие границы окон; окно i содержит даты от edges[i]
+        (включительно) до edges[i + 1], последняя граница включается.
+        Первая граница None - с начала истории. Все окна считаются по
+        одним и тем же строкам префиксных сумм и одной маске SKU.
+        """
+        if self.start_day is None:
+            return np.zeros(len(edges) - 1, dtype=np.int64)
+        rows = []
+        for i, edge in enumerate(edges):
+            if edge is None:
+                rows.append(0)
+                continue
+            rows.append(self._day_row(edge, 'right' if i == len(edges) - 1 else 'left'))
+        rows = np.maximum.accumulate(rows)
+        mask = self.sku_mask(abc_filter, size_filter, product_id)
+        cumulative = self.prefix[rows][:, mask].sum(axis=1, dtype=np.int64)
+        return np.diff(cumulative)
+
+    def daily(self, start_date=None, end_date=None, abc_filter="Все", size_filter="Все", product_id=None):
+        """Продажи по дням за окно по фильтрам"""
+        lo, hi = self.day_range(start_date, end_date)
+        mask = self.sku_mask(abc_filter, size_filter, product_id)
+        cumulative = self.prefix[lo:hi + 1][:, mask].sum(axis=1, dtype=np.int64)
+        return pd.Series(
+            np.diff(cumulative),
+            index=pd.DatetimeIndex(self.start_day + np.arange(lo, hi), name='date'),
+            name='sales'
+        )
+
+    def by_size(self, start_date=None, end_date=None, abc_filter="Все", product_id=None):
+        """Продажи за окно в разрезе размеров"""
+        mask = self.sku_mask(abc_filter, "Все", product_id)
+        totals = np.bincount(
+            self.sku_size[mask],
+            weights=self.window(start_date, end_date)[mask],
+            minlength=len(self.sizes)
+        )
+        return pd.Series(totals.astype(np.int64), index=pd.Index(self.sizes, name='size'), name='sales')
+
+    def by_product(self, start_date=None, end_date=None, size_filter="Все"):
+        """Продажи за окно в разрезе товаров"""
+        mask = self.sku_mask("Все", size_filter)
+        totals = np.bincount(
+            self.sku_product[mask],
+            weights=self.window(start_date, end_date)[mask],
+            minlength=len(self.products)
+        )
+        return pd.Series(totals.astype(np.int64), index=pd.Index(self.products, name='product_id'), name='sales')
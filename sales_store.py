@@ -0,0 +1,221 @@
+"""
+Колоночное хранилище данных о продажах
+
+CSV читается один раз с типизацией колонок (даты -> datetime64,
+товар/размер/ABC -> category), после чего таблица сохраняется в бинарный
+снимок: по одному .npy файлу на колонку и meta.json с категориями.
+Снимок открывается через memory-map, поэтому повторный старт процесса
+не разбирает CSV заново.
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+SALES_COLUMNS = ['date', 'sales', 'product_id', 'size', 'abc_category']
+CATEGORY_COLUMNS = ['product_id', 'size', 'abc_category']
+SALES_DTYPES = {
+    'sales': 'int32',
+    'product_id': 'category',
+    'size': 'category',
+    'abc_category': 'category'
+}
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+
+def as_sales_frame(df):
+    """Приведение таблицы продаж к типизированному виду"""
+    df = df.copy()
+    df['date'] = pd.to_datetime(df['date'])
+    for column, dtype in SALES_DTYPES.items():
+        if column not in df.columns:
+            continue
+        if dtype == 'category':
+            # Категории всегда строковые, как и при чтении из CSV
+            df[column] = df[column].astype(str).astype('category')
+        else:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+def sort_by_date(df):
+    """Стабильная сортировка продаж по дате (для поиска периода бинарным поиском)"""
+    if df['date'].is_monotonic_increasing:
+        return df
+    return df.sort_values('date', kind='stable', ignore_index=True)
+
+
+def concat_sales(*frames):
+    """Объединение типизированных таблиц продаж
+
+    Категории объединяются без пересортировки, поэтому коды строк первой
+    таблицы не меняются, а новые значения дописываются в конец справочника.
+    """
+    # У пустой таблицы (CSV из одного заголовка) категории могут быть другого типа
+    non_empty = [frame for frame in frames if len(frame)]
+    if non_empty and len(non_empty) < len(frames):
+        frames = non_empty
+    data = {}
+    for column in frames[0].columns:
+        if isinstance(frames[0][column].dtype, pd.CategoricalDtype):
+            data[column] = union_categoricals([frame[column] for frame in frames], ignore_order=True)
+        else:
+            data[column] = np.concatenate([frame[column].to_numpy() for frame in frames])
+    return pd.DataFrame(data)
+
+
+def read_sales_csv(file_path, **kwargs):
+    """Чтение CSV с продажами с разбором дат и категориальными колонками"""
+    return pd.read_csv(
+        file_path,
+        dtype=SALES_DTYPES,
+        parse_dates=['date'],
+        date_format='ISO8601',
+        **kwargs
+    )
+
+
+def stream_sales_csv(source, on_chunk, chunk_rows=500_000, raw_window_days=None):
+    """Потоковое чтение CSV продаж частями ограниченного размера
+
+    Каждая часть передаётся в on_chunk (например, DailyRollup.add) и
+    отбрасывается; сохраняются только строки за последние raw_window_days
+    дней относительно самой поздней прочитанной даты. Пиковая память
+    определяется размером части и окна, а не размером файла.
+    Возвращает таблицу строк окна, отсортированную по дате.
+    """
+    window = None if raw_window_days is None else np.timedelta64(raw_window_days, 'D')
+    latest = None
+    kept = []
+    for chunk in read_sales_csv(source, chunksize=chunk_rows):
+        if len(chunk) == 0:
+            continue
+        on_chunk(chunk)
+        if window is None:
+            kept.append(chunk)
+            continue
+
+        dates = chunk['date'].to_numpy()
+        chunk_latest = dates.max()
+        latest = chunk_latest if latest is None else max(latest, chunk_latest)
+        cutoff = latest - window
+        kept.append(chunk)
+        # Части целиком старше окна выбрасываются, пограничные - обрезаются
+        retained = []
+        for part in kept:
+            part_dates = part['date'].to_numpy()
+            if part_dates.max() < cutoff:
+                continue
+            if part_dates.min() < cutoff:
+                part = part[part_dates >= cutoff]
+            retained.append(part)
+        kept = retained
+
+    if not kept:
+        return as_sales_frame(pd.DataFrame({column: [] for column in SALES_COLUMNS}))
+    return sort_by_date(concat_sales(*kept))
+
+
+def trim_to_window(df, raw_window_days):
+    """Строки за последние raw_window_days дней отсортированной по дате таблицы"""
+    if raw_window_days is None or len(df) == 0:
+        return df
+    dates = df['date'].to_numpy()
+    cutoff = dates[-1] - np.timedelta64(raw_window_days, 'D')
+    return df.iloc[dates.searchsorted(cutoff, side='left'):].reset_index(drop=True)
+
+
+def source_signature(file_path):
+    """Размер и время изменения исходного файла"""
+    stat = os.stat(file_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def save_sales_snapshot(df, snapshot_dir, source_path=None, source_state=None):
+    """Сохранение таблицы продаж в колоночный снимок
+
+    Снимок пишется во временный каталог и подменяется целиком, чтобы
+    параллельно стартующий процесс не прочитал его наполовину записанным.
+    source_state - состояние SourceTracker исходного файла; по нему
+    следующий запуск дочитает из CSV только дописанный хвост.
+    """
+    if source_state is None and source_path:
+        source_state = source_signature(source_path)
+    tmp_dir = snapshot_dir + '.tmp-%d' % os.getpid()
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    columns = {}
+    for column in df.columns:
+        series = df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            np.save(os.path.join(tmp_dir, column + '.npy'), series.cat.codes.to_numpy())
+            columns[column] = {
+                'kind': 'category',
+                'categories': [str(c) for c in series.cat.categories]
+            }
+        else:
+            np.save(os.path.join(tmp_dir, column + '.npy'), series.to_numpy())
+            columns[column] = {'kind': 'plain', 'dtype': str(series.dtype)}
+
+    meta = {
+        'format_version': SNAPSHOT_FORMAT_VERSION,
+        'rows': len(df),
+        'columns': columns,
+        'source': source_state
+    }
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    shutil.rmtree(snapshot_dir, ignore_errors=True)
+    os.makedirs(os.path.dirname(os.path.abspath(snapshot_dir)), exist_ok=True)
+    os.replace(tmp_dir, snapshot_dir)
+
+
+def read_snapshot_meta(snapshot_dir):
+    """Чтение метаданных снимка, None если снимка нет"""
+    try:
+        with open(os.path.join(snapshot_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+        return None
+    return meta
+
+
+def load_sales_snapshot(snapshot_dir, source_path=None, mmap=True):
+    """Загрузка таблицы продаж из снимка
+
+    Возвращает None, если снимка нет или он устарел относительно
+    исходного CSV (изменились размер или время модификации).
+    """
+    meta = read_snapshot_meta(snapshot_dir)
+    if meta is None:
+        return None
+    if source_path is not None:
+        try:
+            signature = source_signature(source_path)
+            if {key: meta['source'].get(key) for key in signature} != signature:
+                return None
+        except (OSError, AttributeError):
+            return None
+
+    mmap_mode = 'r' if mmap else None
+    data = {}
+    try:
+        for column, info in meta['columns'].items():
+            values = np.load(os.path.join(snapshot_dir, column + '.npy'), mmap_mode=mmap_mode)
+            if info['kind'] == 'category':
+                data[column] = pd.Categorical.from_codes(
+                    values, categories=info['categories'], validate=False
+                )
+            else:
+                data[column] = values
+    except (OSError, ValueError, KeyError):
+        return None
+    return pd.DataFrame(data, copy=False)
@@ -0,0 +1,231 @@
+"""
+Общий снимок данных для нескольких процессов дашборда
+
+Один процесс-загрузчик читает исходные файлы и публикует колоночные
+массивы продаж и оплат и дневной агрегат в каталог плоскости данных в
+формате колоночного снимка (.npy на колонку и meta.json). Процессы
+дашборда открывают массивы через memory-map только на чтение: страницы
+файлов общие для всех процессов в кэше ОС, поэтому память не растёт с
+числом процессов, а старт процесса сводится к открытию файлов.
+
+Каждая публикация пишется в новый каталог vNNNNNNNN, после чего файл
+CURRENT с номером версии подменяется атомарно. Процессы дашборда
+сравнивают номер из CURRENT со своим и подключаются к новой версии.
+Старые версии удаляются с задержкой: открытые отображения удалённых
+файлов остаются действительными до закрытия.
+
+Каталог лучше размещать в /dev/shm, тогда файлы не пишутся на диск:
+
+    python -m modules.shared_plane --data data/ --plane /dev/shm/warehouse --interval 60
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .rollup import DailyRollup
+from .sales_store import load_sales_snapshot, save_sales_snapshot
+from .sources import CHANGED, UNCHANGED
+
+CURRENT_FILE = 'CURRENT'
+VERSION_PREFIX = 'v'
+ROLLUP_ARRAYS = ['prefix', 'product_abc', 'sku_product', 'sku_size']
+
+
+def as_columnar(df):
+    """Строковые колонки как категории, чтобы их можно было открыть через memory-map
+
+    Колонка date публикуется как datetime64: процессы, подключённые к
+    снимку, получают те же типы, что и обработчик, читающий файлы.
+    """
+    df = df.copy()
+    for column in df.columns:
+        if column == 'date':
+            df[column] = pd.to_datetime(df[column], errors='coerce', format='ISO8601')
+            continue
+        dtype = df[column].dtype
+        if isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_numeric_dtype(dtype):
+            continue
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            continue
+        df[column] = df[column].astype(str).astype('category')
+    return df
+
+
+def save_rollup(rollup, rollup_dir):
+    """Сохранение массивов дневного агрегата"""
+    os.makedirs(rollup_dir)
+    arrays = {
+        'prefix': np.ascontiguousarray(rollup.prefix),
+        'product_abc': rollup.product_abc,
+        'product_abc_day': rollup.product_abc_day,
+        'sku_product': rollup.sku_product,
+        'sku_size': rollup.sku_size
+    }
+    for name, values in arrays.items():
+        np.save(os.path.join(rollup_dir, name + '.npy'), values)
+    meta = {
+        'start_day': None if rollup.start_day is None else str(rollup.start_day),
+        'products': rollup.products,
+        'sizes': rollup.sizes,
+        'version': rollup.version
+    }
+    with open(os.path.join(rollup_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+
+def load_rollup(rollup_dir, mmap=True):
+    """Дневной агрегат поверх сохранённых массивов, None если их нет"""
+    try:
+        with open(os.path.join(rollup_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(rollup_dir, name + '.npy'), mmap_mode='r' if mmap else None)
+            for name in ROLLUP_ARRAYS
+        }
+    except (OSError, ValueError):
+        return None
+    # Снимки, опубликованные до появления дней категорий, открываются без них
+    abc_day_path = os.path.join(rollup_dir, 'product_abc_day.npy')
+    if os.path.exists(abc_day_path):
+        arrays['product_abc_day'] = np.load(abc_day_path, mmap_mode='r' if mmap else None)
+    return DailyRollup.from_arrays(
+        meta['start_day'], meta['products'], meta['sizes'], version=meta['version'], **arrays
+    )
+
+
+class SharedPlane:
+    """
+    Каталог опубликованных версий данных
+    """
+
+    def __init__(self, plane_dir, keep_versions=3):
+        self.plane_dir = plane_dir
+        # Сколько последних версий хранить для процессов, ещё не переключившихся
+        self.keep_versions = keep_versions
+
+    def _version_dir(self, version):
+        return os.path.join(self.plane_dir, '%s%08d' % (VERSION_PREFIX, version))
+
+    def current_version(self):
+        """Номер последней опубликованной версии, 0 если публикаций не было"""
+        try:
+            with open(os.path.join(self.plane_dir, CURRENT_FILE), 'r', encoding='utf-8') as f:
+                return int(json.load(f)['version'])
+        except (OSError, ValueError, KeyError):
+            return 0
+
+    def publish(self, sales_data, rollup, payments_data=None):
+        """Публикация новой версии данных, возвращает её номер"""
+        os.makedirs(self.plane_dir, exist_ok=True)
+        version = self.current_version() + 1
+        tmp_dir = self._version_dir(version) + '.tmp-%d' % os.getpid()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        save_sales_snapshot(sales_data, os.path.join(tmp_dir, 'sales'))
+        save_rollup(rollup, os.path.join(tmp_dir, 'rollup'))
+        if payments_data is not None:
+            save_sales_snapshot(as_columnar(payments_data), os.path.join(tmp_dir, 'payments'))
+        os.replace(tmp_dir, self._version_dir(version))
+
+        current = {'version': version, 'published_at': datetime.now().isoformat()}
+        current_tmp = os.path.join(self.plane_dir, CURRENT_FILE + '.tmp-%d' % os.getpid())
+        with open(current_tmp, 'w', encoding='utf-8') as f:
+            json.dump(current, f)
+        os.replace(current_tmp, os.path.join(self.plane_dir, CURRENT_FILE))
+        self._remove_old(version)
+        return version
+
+    def _remove_old(self, version):
+        """Удаление версий старше keep_versions последних"""
+        for name in os.listdir(self.plane_dir):
+            if not name.startswith(VERSION_PREFIX) or not name[len(VERSION_PREFIX):].isdigit():
+                continue
+            if int(name[len(VERSION_PREFIX):]) <= version - self.keep_versions:
+                shutil.rmtree(os.path.join(self.plane_dir, name), ignore_errors=True)
+
+    def _load_part(self, version, part):
+        part_dir = os.path.join(self._version_dir(version), part)
+        if part == 'rollup':
+            return load_rollup(part_dir)
+        return load_sales_snapshot(part_dir)
+
+    def attach(self, parts, retries=3):
+        """Подключение к частям текущей версии: 'sales', 'rollup', 'payments'
+
+        Возвращает (версия, список данных частей), все части из одной
+        версии. Данные открываются через memory-map только на чтение.
+        Если версия удалена между чтением CURRENT и открытием файлов,
+        читается новый CURRENT. Без публикаций - (0, None).
+        """
+        for _ in range(retries):
+            version = self.current_version()
+            if version == 0:
+                break
+            data = [self._load_part(version, part) for part in parts]
+            if all(part is not None for part in data):
+                return version, data
+        return 0, None
+
+
+class PlaneTracker:
+    """
+    Отслеживание версии общего снимка
+
+    Заменяет SourceTracker исходного файла в процессе дашборда, который
+    читает данные из плоскости: новая публикация считается изменением файла.
+    """
+
+    def __init__(self, plane, parts):
+        self.plane = plane
+        self.parts = parts
+        self.version = 0
+
+    def check(self):
+        """CHANGED, если после подключения опубликована новая версия"""
+        return UNCHANGED if self.plane.current_version() == self.version else CHANGED
+
+    def attach(self):
+        """Данные частей текущей версии с запоминанием её номера, None без публикаций"""
+        self.version, data = self.plane.attach(self.parts)
+        return data
+
+
+def publish_loop(handler, plane, interval=None):
+    """Публикация данных обработчика и повторная публикация при изменении файлов
+
+    Без interval данные публикуются один раз.
+    """
+    handler.sales_data
+    handler.payments_data
+    version = plane.publish(handler.sales_data, handler.rollup, handler.payments_data)
+    print('Опубликована версия %d' % version)
+    while interval:
+        time.sleep(interval)
+        if handler.refresh_if_changed():
+            version = plane.publish(handler.sales_data, handler.rollup, handler.payments_data)
+            print('Опубликована версия %d' % version)
+
+
+def main():
+    from .data_handler import DataHandler
+
+    parser = argparse.ArgumentParser(description='Публикация данных дашборда для нескольких процессов')
+    parser.add_argument('--data', default='data')
+    parser.add_argument('--plane', required=True)
+    parser.add_argument('--interval', type=float, default=None,
+                        help='проверять исходные файлы каждые N секунд и публиковать изменения')
+    parser.add_argument('--streaming', action='store_true')
+    parser.add_argument('--raw-window-days', type=int, default=None)
+    args = parser.parse_args()
+    handler = DataHandler(args.data, streaming=args.streaming, raw_window_days=args.raw_window_days)
+    publish_loop(handler, SharedPlane(args.plane), args.interval)
+
+
+if __name__ == '__main__':
+    main()
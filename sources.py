@@ -0,0 +1,180 @@
+"""
+Отслеживание изменений исходных файлов данных
+
+Для каждого файла хранится размер, время изменения и смещение до конца
+прочитанных данных. CSV файлы выгрузок только
+дописываются, поэтому при росте файла читается лишь новый хвост. JSON
+файлы перечитываются целиком, но только если изменился хэш содержимого.
+"""
+import hashlib
+import io
+import os
+
+UNCHANGED = 'unchanged'
+APPENDED = 'appended'
+CHANGED = 'changed'
+
+# Сколько байт в начале файла и перед смещением сверяется при дозаписи
+GUARD_BYTES = 64 * 1024
+READ_BLOCK = 1024 * 1024
+
+
+def _hash_bytes(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class BoundedReader(io.RawIOBase):
+    """
+    Чтение файла до заданного смещения, как будто дальше файл кончается
+    """
+
+    def __init__(self, path, limit):
+        self._file = open(path, 'rb')
+        self._remaining = limit
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._remaining <= 0:
+            return 0
+        view = memoryview(buffer)[:min(len(buffer), self._remaining)]
+        n = self._file.readinto(view)
+        self._remaining -= n
+        return n
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+class SourceTracker:
+    """
+    Состояние одного исходного файла
+    """
+
+    def __init__(self, path, kind='csv'):
+        self.path = path
+        self.kind = kind
+        self.size = None
+        self.mtime_ns = None
+        self.offset = 0
+        self.header = None
+        self.head_hash = None
+        self.edge_hash = None
+        self.content_hash = None
+
+    def state(self):
+        """Состояние для сохранения рядом со снимком данных"""
+        return {
+            'size': self.size,
+            'mtime_ns': self.mtime_ns,
+            'offset': self.offset,
+            'header': self.header,
+            'head_hash': self.head_hash,
+            'edge_hash': self.edge_hash,
+            'content_hash': self.content_hash
+        }
+
+    def restore(self, state):
+        """Восстановление состояния, сохранённого вместе со снимком"""
+        for key, value in state.items():
+            if key in self.state():
+                setattr(self, key, value)
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def _read_range(self, start, end):
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            return f.read(max(0, end - start))
+
+    def _guard_hashes(self, offset):
+        """Хэши начала файла и участка перед смещением"""
+        head = _hash_bytes(self._read_range(0, min(GUARD_BYTES, offset)))
+        edge = _hash_bytes(self._read_range(max(0, offset - GUARD_BYTES), offset))
+        return head, edge
+
+    def _last_line_end(self, size):
+        """Смещение сразу после последнего перевода строки не дальше size"""
+        with open(self.path, 'rb') as f:
+            end = size
+            while end > 0:
+                start = max(0, end - READ_BLOCK)
+                f.seek(start)
+                block = f.read(end - start)
+                position = block.rfind(b'\n')
+                if position >= 0:
+                    return start + position + 1
+                end = start
+        return 0
+
+    def check(self):
+        """Что произошло с файлом с момента последнего чтения"""
+        stat = self._stat()
+        if stat is None:
+            return UNCHANGED if self.size is None else CHANGED
+        if self.size is None:
+            return CHANGED
+        if stat == (self.size, self.mtime_ns):
+            return UNCHANGED
+
+        if self.kind == 'json':
+            content_hash = _hash_bytes(self._read_range(0, stat[0]))
+            if content_hash == self.content_hash:
+                self.size, self.mtime_ns = stat
+                return UNCHANGED
+            return CHANGED
+
+        if stat[0] < self.offset or (self.head_hash, self.edge_hash) != self._guard_hashes(self.offset):
+            return CHANGED
+        if self.offset > 0 and self._read_range(self.offset - 1, self.offset) != b'\n':
+            # Последняя строка была прочитана без перевода строки: дозапись
+            # допустима, только если она начинается с новой строки
+            if self._read_range(self.offset, self.offset + 1) not in (b'\n', b'\r'):
+                return CHANGED
+        return APPENDED
+
+    def open_full(self):
+        """Открытие файла для полного чтения с фиксацией состояния
+
+        Читается часть до размера файла на момент вызова, конец файла
+        считается концом строки: строки, дописанные во время чтения,
+        попадут в следующий хвост, а не потеряются и не задвоятся.
+        """
+        self.size, self.mtime_ns = self._stat()
+        self.offset = self.size
+        self.head_hash, self.edge_hash = self._guard_hashes(self.offset)
+        first_line = self._read_range(0, min(self.offset, GUARD_BYTES)).split(b'\n', 1)[0]
+        self.header = first_line.decode('utf-8-sig').strip()
+        return io.BufferedReader(BoundedReader(self.path, self.offset))
+
+    def read_all(self):
+        """Полное чтение небольшого файла (JSON) с фиксацией хэша содержимого"""
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        self.size, self.mtime_ns = self._stat()
+        self.content_hash = _hash_bytes(data)
+        return data
+
+    def read_tail(self):
+        """Чтение дописанных полных строк после смещения"""
+        stat = self._stat()
+        end = self._last_line_end(stat[0])
+        tail = self._read_range(self.offset, end) if end > self.offset else b''
+        self.size, self.mtime_ns = stat
+        self.offset = max(self.offset, end)
+        self.edge_hash = self._guard_hashes(self.offset)[1]
+        if self.offset <= GUARD_BYTES:
+            self.head_hash = self._guard_hashes(self.offset)[0]
+        return tail
+
+    @property
+    def columns(self):
+        """Имена колонок из заголовка CSV"""
+        return self.header.split(',') if self.header else None
@@ -0,0 +1,391 @@
+"""
+Хранение продаж и оплат во встроенной базе SQLite
+
+Альтернатива таблицам pandas в памяти: строки лежат в файле базы, а
+фильтры периода, ABC категории и размера и агрегаты выполняются в SQL
+по индексам (date), (product_id, size, date) и (abc_category, date).
+Даты хранятся целым числом секунд от 1970-01-01, поэтому границы
+периодов сравниваются так же точно, как в pandas.
+
+Состояние исходных CSV (SourceTracker) хранится в самой базе: при
+повторном старте неизменённый файл не читается, из дописанного
+вставляется только хвост. Запись идёт в транзакциях BEGIN IMMEDIATE,
+и сверка с CSV выполняется внутри них, поэтому несколько процессов с
+одной базой не вставляют один хвост дважды.
+
+Массовая загрузка из CSV:
+
+    python -m modules.sql_store --data data/ --db data/.cache/warehouse.sqlite
+"""
+import argparse
+import io
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from .payments import read_payments_csv
+from .sales_store import SALES_COLUMNS, as_sales_frame, read_sales_csv
+from .sources import APPENDED, CHANGED, UNCHANGED, SourceTracker
+
+SCHEMA = {
+    'sales': '''
+        CREATE TABLE IF NOT EXISTS sales (
+            date INTEGER NOT NULL,
+            sales INTEGER NOT NULL,
+            product_id TEXT NOT NULL,
+            size TEXT NOT NULL,
+            abc_category TEXT
+        )
+    ''',
+    'payments': '''
+        CREATE TABLE IF NOT EXISTS payments (
+            date INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            type TEXT
+        )
+    '''
+}
+
+INDEXES = {
+    'sales': {
+        'sales_date': '(date)',
+        'sales_sku_date': '(product_id, size, date)',
+        'sales_abc_date': '(abc_category, date)'
+    },
+    'payments': {
+        'payments_date': '(date)'
+    }
+}
+
+COLUMNS = {
+    'sales': SALES_COLUMNS,
+    'payments': ['date', 'amount', 'type']
+}
+
+# Исходный CSV каждой таблицы
+SOURCE_TABLES = {
+    'sales.csv': 'sales',
+    'payments.csv': 'payments'
+}
+
+
+def to_seconds(values):
+    """Даты (Timestamp, datetime или массив) в секунды от 1970-01-01"""
+    return pd.to_datetime(values).to_numpy().astype('datetime64[s]').astype(np.int64)
+
+
+def bound_seconds(value, side):
+    """Граница периода в секундах: начало округляется вверх, конец - вниз"""
+    if value is None:
+        return None
+    micros = int(pd.Timestamp(value).to_datetime64().astype('datetime64[us]').astype(np.int64))
+    return -(-micros // 1_000_000) if side == 'start' else micros // 1_000_000
+
+
+class SqlStore:
+    """
+    Продажи и оплаты в файле базы SQLite
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        # Соединение SQLite нельзя делить между потоками: у каждого потока своё
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        # Фильтр ABC по таблице product_classes (рассчитанные категории),
+        # а не по колонке abc_category строк продаж
+        self.product_classes = False
+
+    @property
+    def connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            connection = sqlite3.connect(self.db_path, timeout=60)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS sources (name TEXT PRIMARY KEY, state TEXT NOT NULL)'
+            )
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS product_classes (product_id TEXT PRIMARY KEY, abc_category TEXT NOT NULL)'
+            )
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS product_classes_abc ON product_classes (abc_category)'
+            )
+            for table, ddl in SCHEMA.items():
+                connection.execute(ddl)
+                self._create_indexes(connection, table)
+            connection.commit()
+            self._local.connection = connection
+        return connection
+
+    def _create_indexes(self, connection, table):
+        for name, columns in INDEXES[table].items():
+            connection.execute('CREATE INDEX IF NOT EXISTS %s ON %s %s' % (name, table, columns))
+
+    def close(self):
+        """Закрытие соединения текущего потока"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    # --- загрузка ---
+
+    @contextmanager
+    def _immediate(self):
+        """Транзакция записи, которая сразу берёт блокировку базы
+
+        Другие процессы ждут её окончания (timeout соединения), поэтому
+        прочитанное внутри неё состояние источников не устаревает до
+        фиксации.
+        """
+        with self._write_lock:
+            connection = self.connection
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield connection
+            except BaseException:
+                connection.rollback()
+                raise
+            connection.commit()
+
+    def source_state(self, table, connection=None):
+        """Сохранённое состояние исходного файла таблицы"""
+        connection = connection or self.connection
+        row = connection.execute('SELECT state FROM sources WHERE name = ?', (table,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set_source_state(self, connection, table, state):
+        connection.execute(
+            'INSERT OR REPLACE INTO sources (name, state) VALUES (?, ?)',
+            (table, json.dumps(state))
+        )
+
+    def _rows(self, table, df):
+        """Строки таблицы для executemany"""
+        values = [to_seconds(df['date']).tolist()]
+        for column in COLUMNS[table][1:]:
+            series = df[column] if column in df else pd.Series(None, index=df.index, dtype=object)
+            if pd.api.types.is_numeric_dtype(series.dtype):
+                values.append(series.tolist())
+            else:
+                values.append(series.astype(str).where(series.notna(), None).tolist())
+        return zip(*values)
+
+    def _insert(self, connection, table, df):
+        placeholders = ', '.join('?' * len(COLUMNS[table]))
+        connection.executemany(
+            'INSERT INTO %s (%s) VALUES (%s)' % (table, ', '.join(COLUMNS[table]), placeholders),
+            self._rows(table, df)
+        )
+
+    def _parse(self, table, source, **kwargs):
+        if table == 'sales':
+            return read_sales_csv(source, **kwargs)
+        return read_payments_csv(source, **kwargs)
+
+    def load_csv(self, table, tracker, chunk_rows=500_000):
+        """Полная перезаливка таблицы из CSV частями по chunk_rows строк
+
+        Индексы удаляются на время загрузки и строятся заново в конце:
+        так массовая вставка в несколько раз быстрее. Вся загрузка идёт в
+        одной транзакции, читатели до её окончания видят старые данные.
+        """
+        with self._immediate() as connection:
+            self._load_csv(connection, table, tracker, chunk_rows)
+        self.connection.execute('ANALYZE %s' % table)
+
+    def _load_csv(self, connection, table, tracker, chunk_rows):
+        connection.execute('DELETE FROM %s' % table)
+        for name in INDEXES[table]:
+            connection.execute('DROP INDEX IF EXISTS %s' % name)
+        for chunk in self._parse(table, tracker.open_full(), chunksize=chunk_rows):
+            self._insert(connection, table, chunk)
+        self._create_indexes(connection, table)
+        self._set_source_state(connection, table, tracker.state())
+
+    def append(self, table, df, tracker=None):
+        """Вставка новых строк (и состояния исходного файла) одной транзакцией"""
+        with self._immediate() as connection:
+            self._append(connection, table, df, tracker)
+
+    def _append(self, connection, table, df, tracker=None):
+        if df is not None and len(df):
+            self._insert(connection, table, df)
+        if tracker is not None:
+            self._set_source_state(connection, table, tracker.state())
+
+    def set_product_classes(self, products, labels):
+        """Замена рассчитанных ABC категорий товаров, после неё фильтр ABC использует их"""
+        with self._immediate() as connection:
+            connection.execute('DELETE FROM product_classes')
+            connection.executemany(
+                'INSERT INTO product_classes (product_id, abc_category) VALUES (?, ?)',
+                zip(products, labels)
+            )
+        self.product_classes = True
+
+    def read_tail(self, table, tracker):
+        """Разбор строк, дописанных в исходный CSV после последнего чтения"""
+        tail = tracker.read_tail()
+        if not tail:
+            return None
+        return self._parse(table, io.BytesIO(tail), header=None, names=tracker.columns)
+
+    def sync_csv(self, table, tracker, chunk_rows=500_000):
+        """Приведение таблицы в соответствие с исходным CSV
+
+        Неизменённый файл не читается, из дописанного вставляется только
+        хвост, в остальных случаях таблица перезаливается. Состояние
+        читается и сравнивается внутри транзакции записи: хвост, который
+        уже вставил другой процесс, не вставляется повторно. Возвращает
+        статус файла относительно сохранённого в базе состояния.
+        """
+        with self._immediate() as connection:
+            state = self.source_state(table, connection)
+            status = CHANGED
+            if state is not None:
+                tracker.restore(state)
+                status = tracker.check()
+            if status == APPENDED:
+                self._append(connection, table, self.read_tail(table, tracker), tracker)
+            elif status != UNCHANGED:
+                self._load_csv(connection, table, tracker, chunk_rows)
+        if status not in (APPENDED, UNCHANGED):
+            self.connection.execute('ANALYZE %s' % table)
+        return status
+
+    # --- запросы ---
+
+    def _sales_where(self, start_date=None, end_date=None, abc_filter="Все", size_filter="Все", product_id=None):
+        """Условие WHERE и параметры для фильтров продаж"""
+        conditions = []
+        params = []
+        start = bound_seconds(start_date, 'start')
+        end = bound_seconds(end_date, 'end')
+        if start is not None:
+            conditions.append('date >= ?')
+            params.append(start)
+        if end is not None:
+            conditions.append('date <= ?')
+            params.append(end)
+        if abc_filter != "Все":
+            if self.product_classes:
+                conditions.append('product_id IN (SELECT product_id FROM product_classes WHERE abc_category = ?)')
+            else:
+                conditions.append('abc_category = ?')
+            params.append(str(abc_filter))
+        if size_filter != "Все":
+            conditions.append('size = ?')
+            params.append(str(size_filter))
+        if product_id is not None:
+            conditions.append('product_id = ?')
+            params.append(str(product_id))
+        where = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+        return where, params
+
+    def sales_frame(self, start_date=None, end_date=None, abc_filter="Все", size_filter="Все"):
+        """Строки продаж за период по фильтрам, отсортированные по дате"""
+        where, params = self._sales_where(start_date, end_date, abc_filter, size_filter)
+        rows = self.connection.execute(
+            'SELECT %s FROM sales%s ORDER BY date' % (', '.join(SALES_COLUMNS), where), params
+        ).fetchall()
+        df = pd.DataFrame(rows, columns=SALES_COLUMNS)
+        df['date'] = pd.to_datetime(df['date'].astype(np.int64), unit='s')
+        return as_sales_frame(df)
+
+    def sales_total(self, start_date=None, end_date=None, abc_filter="Все", size_filter="Все", product_id=None):
+        """Сумма продаж за период по фильтрам"""
+        where, params = self._sales_where(start_date, end_date, abc_filter, size_filter, product_id)
+        return int(self.connection.execute('SELECT TOTAL(sales) FROM sales' + where, params).fetchone()[0])
+
+    def totals_between(self, edges, abc_filter="Все", size_filter="Все", product_id=None):
+        """Суммы продаж по соседним окнам дат одним запросом
+
+        Границы окон как в DailyRollup.totals_between: окно i - от edges[i]
+        включительно до edges[i + 1], последняя граница включается.
+        """
+        seconds = [bound_seconds(edge, 'start') for edge in edges[:-1]] + [bound_seconds(edges[-1], 'end')]
+        where, params = self._sales_where(edges[0], edges[-1], abc_filter, size_filter, product_id)
+        columns = []
+        case_params = []
+        for i in range(len(edges) - 1):
+            conditions = []
+            if seconds[i] is not None:
+                conditions.append('date >= ?')
+                case_params.append(seconds[i])
+            if i < len(edges) - 2:
+                conditions.append('date < ?')
+                case_params.append(seconds[i + 1])
+            condition = ' AND '.join(conditions) or '1'
+            columns.append('TOTAL(CASE WHEN %s THEN sales END)' % condition)
+        row = self.connection.execute(
+            'SELECT %s FROM sales%s' % (', '.join(columns), where), case_params + params
+        ).fetchone()
+        return np.array(row, dtype=np.int64)
+
+    def sales_chunks(self, chunk_rows=500_000):
+        """Все строки продаж частями в порядке вставки
+
+        Используется для построения дневного агрегата без загрузки всей
+        таблицы: агрегат суммирует строки сам, поэтому группировка и
+        сортировка в SQL не нужны.
+        """
+        cursor = self.connection.execute('SELECT %s FROM sales' % ', '.join(SALES_COLUMNS))
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            df = pd.DataFrame(rows, columns=SALES_COLUMNS)
+            df['date'] = pd.to_datetime(df['date'].astype(np.int64), unit='s')
+            yield df
+
+    def payments_frame(self):
+        """Таблица оплат в порядке дат"""
+        rows = self.connection.execute(
+            'SELECT date, amount, type FROM payments ORDER BY date'
+        ).fetchall()
+        df = pd.DataFrame(rows, columns=COLUMNS['payments'])
+        df['date'] = pd.to_datetime(df['date'].astype(np.int64), unit='s')
+        return df
+
+    def payment_totals(self):
+        """Сумма, средний платёж и число оплат"""
+        total, average, count = self.connection.execute(
+            'SELECT TOTAL(amount), AVG(amount), COUNT(*) FROM payments'
+        ).fetchone()
+        return {'total': total, 'average': average, 'count': count}
+
+
+def bulk_load(data_path, db_path, chunk_rows=500_000):
+    """Загрузка sales.csv и payments.csv из каталога данных в базу"""
+    store = SqlStore(db_path)
+    statuses = {}
+    for file_name, table in SOURCE_TABLES.items():
+        file_path = os.path.join(data_path, file_name)
+        if os.path.exists(file_path):
+            statuses[file_name] = store.sync_csv(table, SourceTracker(file_path), chunk_rows)
+    store.close()
+    return statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Загрузка CSV данных дашборда в базу SQLite')
+    parser.add_argument('--data', default='data')
+    parser.add_argument('--db', default=None)
+    parser.add_argument('--chunk-rows', type=int, default=500_000)
+    args = parser.parse_args()
+    db_path = args.db or os.path.join(args.data, '.cache', 'warehouse.sqlite')
+    for file_name, status in bulk_load(args.data, db_path, args.chunk_rows).items():
+        print('%s: %s' % (file_name, status))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""
+Риск дефицита по SKU: симуляция Монте-Карло спроса и задержек поставки
+
+Прогноз остатков даёт одно число дней запаса по средней скорости продаж.
+Здесь для каждой пары товар/размер строится n_paths сценариев на
+horizon_days дней вперёд: спрос дня выбирается случайным днём из последних
+history_days дней дневного агрегата (бутстрап, один и тот же день истории
+для всех SKU сценария, поэтому связь спроса размеров и товаров
+сохраняется), а ожидаемая поставка с вероятностью delay_probability
+опаздывает на 1..max_delay_days дней. Непроданный из-за отсутствия спрос
+теряется, пришедшая поставка пополняет остаток.
+
+По сценариям считаются вероятность отсутствия товара на каждую дату и
+P10/P50/P90 дней запаса - дней до первого отсутствия (inf, если товар не
+заканчивается в пределах горизонта). Товары симулируются так же, как
+SKU, по суммарному спросу размеров с общими сценариями.
+
+Все случайные величины выбираются заранее, сценарии всех SKU считаются
+массивами NumPy частями по max_cells ячеек (сценарии x дни x SKU). Для
+больших каталогов части считаются в пуле процессов; результат от числа
+процессов не зависит.
+"""
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from .forecast import allocate_to_skus, ewma_velocity, inventory_frame, sku_daily_sales
+
+PERCENTILES = [10, 50, 90]
+
+
+def draw_scenarios(n_paths, horizon_days, history_len, delivery_days, delay_probability, max_delay_days, seed=0):
+    """Случайные величины всех сценариев
+
+    Возвращает дни истории для спроса (сценарии x дни) и день прихода
+    поставки каждого товара (сценарии x товары); без поставки - horizon_days,
+    то есть за горизонтом.
+    """
+    rng = np.random.default_rng(seed)
+    days = rng.integers(0, max(history_len, 1), size=(n_paths, horizon_days), dtype=np.int32)
+    late = rng.random((n_paths, len(delivery_days))) < delay_probability
+    delay = np.where(late, rng.integers(1, max_delay_days + 1, size=late.shape), 0)
+    scheduled = np.where(np.isnan(delivery_days), horizon_days, delivery_days)
+    arrival = np.minimum(scheduled[None, :] + delay, horizon_days).astype(np.int32)
+    return days, arrival
+
+
+def simulate_batch(daily, days, stock, in_transit, arrival):
+    """Сценарии части единиц (SKU или товаров)
+
+    daily - дневные продажи истории (дни истории x единицы), days - дни
+    истории сценариев (сценарии x дни), arrival - день прихода поставки
+    (сценарии x единицы). Возвращает вероятность отсутствия по датам
+    (единицы x дни), долю сценариев, в которых единица заканчивается в
+    пределах горизонта, и перцентили дней запаса (3 x единицы).
+
+    Накопленный спрос не убывает, поэтому в каждом сценарии товара нет
+    на отрезке [t1, arrival), если t1 - день окончания начального остатка
+    раньше поставки, и начиная с t2 - дня окончания остатка вместе с
+    поставкой. Оба дня считаются числом дней, когда накопленный спрос
+    ещё меньше остатка, без матрицы остатков по дням.
+    """
+    n_paths, horizon_days = days.shape
+    n_units = daily.shape[1]
+    if daily.shape[0] == 0:
+        daily = np.zeros((1, n_units), dtype=np.float32)
+    # Накопленный спрос: дни x сценарии x единицы. Сложение соседних дней
+    # по строкам заметно быстрее np.cumsum по оси дней
+    cumulative = daily[days.T]
+    for day in range(1, horizon_days):
+        np.add(cumulative[day], cumulative[day - 1], out=cumulative[day])
+
+    # Спрос до прихода поставки; с поставкой товара хватает, пока
+    # накопленный спрос меньше max(остаток, спрос до поставки) + поставка
+    before = np.take_along_axis(cumulative, np.maximum(arrival - 1, 0)[None, :, :], axis=0)[0]
+    before = np.where(arrival > 0, before, 0)
+    first_out = np.add.reduce(cumulative < stock, axis=0, dtype=np.int32)
+    refilled = np.maximum(stock, before) + in_transit
+    second_out = np.maximum(np.add.reduce(cumulative < refilled, axis=0, dtype=np.int32), arrival)
+
+    # Отрезки отсутствия по сценариям -> разностный массив по дням
+    early = first_out < arrival
+    unit = np.broadcast_to(np.arange(n_units) * (horizon_days + 1), (n_paths, n_units))
+    events = np.bincount(
+        np.concatenate([(unit + first_out)[early], (unit + arrival)[early], (unit + second_out).ravel()]),
+        weights=np.concatenate([np.ones(early.sum()), -np.ones(early.sum()), np.ones(n_paths * n_units)]),
+        minlength=n_units * (horizon_days + 1)
+    ).reshape(n_units, horizon_days + 1)
+    probability = (np.cumsum(events, axis=1)[:, :horizon_days] / n_paths).astype(np.float32)
+
+    cover = np.where(early, first_out, second_out)
+    percentiles = np.percentile(cover, PERCENTILES, axis=0)
+    return (
+        probability,
+        (cover < horizon_days).mean(axis=0),
+        np.where(percentiles >= horizon_days, np.inf, percentiles)
+    )
+
+
+def _batches(daily, days, stock, in_transit, arrival, groups, batch):
+    """Аргументы simulate_batch по частям единиц
+
+    arrival задан по товарам, groups - товар каждой единицы; день прихода
+    единиц выбирается только для текущей части, чтобы не держать матрицу
+    сценарии x все SKU.
+    """
+    for lo in range(0, daily.shape[1], batch):
+        units = slice(lo, lo + batch)
+        yield daily[:, units], days, stock[units], in_transit[units], arrival[:, groups[units]]
+
+
+def _simulate_units(daily, days, stock, in_transit, arrival, groups, max_cells, workers, parallel_min_units):
+    """Сценарии всех единиц частями, в пуле процессов для большого числа единиц"""
+    n_paths, horizon_days = days.shape
+    n_units = daily.shape[1]
+    batch = max(1, max_cells // max(n_paths * horizon_days, 1))
+    batches = _batches(daily, days, stock, in_transit, arrival, groups, batch)
+    results = []
+    if workers > 1 and n_units >= parallel_min_units and n_units > batch:
+        # spawn: дочерние процессы не наследуют потоки Streamlit и фонового обновления
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            # В очереди не больше двух частей на процесс: части не копятся в памяти
+            pending = deque()
+            for args in batches:
+                pending.append(pool.submit(simulate_batch, *args))
+                if len(pending) >= 2 * workers:
+                    results.append(pending.popleft().result())
+            results.extend(future.result() for future in pending)
+    else:
+        results = [simulate_batch(*args) for args in batches]
+    if not results:
+        return np.zeros((0, horizon_days), dtype=np.float32), np.zeros(0), np.zeros((len(PERCENTILES), 0))
+    probability, ever_out, percentiles = zip(*results)
+    return np.concatenate(probability), np.concatenate(ever_out), np.concatenate(percentiles, axis=1)
+
+
+def simulate_stockout(rollup, inventory_data, today=None, history_days=56, ewma_alpha=0.1, horizon_days=60,
+                      n_paths=1000, delay_probability=0.3, max_delay_days=14, seed=0, workers=None,
+                      parallel_min_skus=20_000, max_cells=8_000_000):
+    """Риск дефицита по всем SKU и товарам
+
+    Остаток и товар в пути распределяются по размерам пропорционально
+    скорости продаж, как в прогнозе остатков (history_days, ewma_alpha).
+    workers - число процессов (по умолчанию по числу ядер), пул
+    используется от parallel_min_skus SKU.
+
+    Возвращает словарь: таблицы по SKU и по товарам (вероятность
+    закончиться в пределах горизонта, P10/P50/P90 дней запаса), даты
+    горизонта и матрицы вероятности отсутствия по датам для SKU и товаров.
+    """
+    today = today or date.today()
+    workers = workers or os.cpu_count() or 1
+    daily = sku_daily_sales(rollup, history_days).astype(np.float32)
+    velocity = ewma_velocity(daily, ewma_alpha)
+    inventory = inventory_frame(inventory_data, rollup.products, today)
+    sku_product = rollup.sku_product
+    n_products = len(rollup.products)
+
+    days, arrival = draw_scenarios(
+        n_paths, horizon_days, daily.shape[0], inventory['delivery_days'].to_numpy(),
+        delay_probability, max_delay_days, seed
+    )
+    stock = inventory['stock'].to_numpy()
+    in_transit = inventory['in_transit'].to_numpy()
+    sku_probability, sku_out, sku_cover = _simulate_units(
+        daily, days,
+        allocate_to_skus(stock, sku_product, velocity).astype(np.float32),
+        allocate_to_skus(in_transit, sku_product, velocity).astype(np.float32),
+        arrival, sku_product,
+        max_cells, workers, parallel_min_skus
+    )
+
+    # Дневной спрос товаров - сумма по размерам
+    n_days = daily.shape[0]
+    cells = (np.arange(n_days)[:, None] * n_products + sku_product[None, :]).ravel()
+    product_daily = np.bincount(cells, weights=daily.ravel(), minlength=n_days * n_products)
+    product_probability, product_out, product_cover = _simulate_units(
+        product_daily.reshape(n_days, n_products).astype(np.float32), days,
+        stock.astype(np.float32), in_transit.astype(np.float32), arrival, np.arange(n_products),
+        max_cells, workers, parallel_min_skus
+    )
+
+    products = np.array(rollup.products, dtype=object)
+    sizes = np.array(rollup.sizes, dtype=object)
+
+    def summary(ever_out, cover):
+        table = {'stockout_probability': ever_out.round(3)}
+        for percentile, values in zip(PERCENTILES, cover):
+            table['cover_p%d' % percentile] = values.round(1)
+        return table
+
+    sku_table = pd.DataFrame({
+        'SKU': products[sku_product] + '/' + sizes[rollup.sku_size],
+        'product_id': products[sku_product],
+        'size': sizes[rollup.sku_size],
+        **summary(sku_out, sku_cover)
+    })
+    product_table = pd.DataFrame(
+        summary(product_out, product_cover),
+        index=pd.Index(rollup.products, name='product_id')
+    )
+    return {
+        'sku': sku_table,
+        'products': product_table,
+        'dates': pd.date_range(pd.Timestamp(today), periods=horizon_days, freq='D'),
+        'sku_probability': sku_probability,
+        'product_probability': product_probability,
+        'n_paths': n_paths
+    }
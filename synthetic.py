@@ -0,0 +1,237 @@
+"""
+Синтетические данные склада в форматах исходных файлов
+
+Генератор строит products.json, inventory.json, sales.csv и payments.csv
+для N товаров со всеми размерами за заданное число дней, заканчивающихся
+сегодня (или датой end). Спрос пары товар/размер - пуассоновский с
+интенсивностью по закону Ципфа от номера товара, долей размера, недельной
+и годовой сезонностью и ростом на протяжении истории; в sales.csv
+попадают только дни с ненулевыми продажами. ABC категории товаров
+считаются по выручке, как в abc_analysis.
+
+Продажи каждого дня генерируются своим генератором от (seed, номер дня)
+массивами NumPy, поэтому результат не зависит от размера частей записи,
+а sales.csv пишется частями и может содержать сотни миллионов строк:
+
+    python -m modules.synthetic --out /tmp/warehouse --products 10000 --days 1825
+"""
+import argparse
+import json
+import os
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from .abc_analysis import classify_revenue
+from .payments import PAYMENT_TYPES
+from .rollup import ABC_CLASSES
+from .sales_store import SALES_COLUMNS
+
+SIZES = ['XS', 'S', 'M', 'L', 'XL', '2XL', '3XL', '4XL', '5XL']
+SIZE_WEIGHTS = np.array([0.04, 0.10, 0.20, 0.22, 0.18, 0.12, 0.08, 0.04, 0.02])
+# Продажи по дням недели относительно среднего, с понедельника
+WEEKDAY_FACTORS = np.array([1.0, 0.95, 0.95, 1.0, 1.1, 1.25, 1.2])
+# Интервал оплат каждого типа, дни
+PAYMENT_CADENCE = {
+    'Поставщик': 14,
+    'Логистика': 7,
+    'Маркетплейс': 30
+}
+
+
+class SyntheticWarehouse:
+    """
+    Воспроизводимый набор данных склада: одинаковый seed - одинаковые файлы
+    """
+
+    def __init__(self, n_products=100, days=365, end=None, seed=0, product_ids=None, max_daily_sales=50.0):
+        if product_ids is not None:
+            n_products = len(product_ids)
+        self.product_ids = list(product_ids) if product_ids is not None else [
+            'sku%06d' % i for i in range(n_products)
+        ]
+        self.n_products = n_products
+        self.days = days
+        self.end = pd.Timestamp(end or date.today()).normalize()
+        self.start = self.end - pd.Timedelta(days=days - 1)
+        self.seed = seed
+
+        rng = np.random.default_rng([seed, 0])
+        # Средние продажи товара в день: самые популярные товары - в случайном порядке артикулов
+        ranks = rng.permutation(n_products) + 1
+        self.product_rate = max_daily_sales / ranks ** 0.7
+        self.cost_price = np.round(rng.lognormal(np.log(900), 0.6, n_products), 2)
+        self.product_abc = classify_revenue(self.product_rate * self.cost_price)
+        # Интенсивность пары товар/размер, строки - товары
+        self.sku_rate = self.product_rate[:, None] * (SIZE_WEIGHTS / SIZE_WEIGHTS.sum())[None, :]
+
+    def day_factors(self, day_index):
+        """Множитель спроса дней: день недели, сезон и рост на протяжении истории"""
+        day_index = np.asarray(day_index)
+        dates = self.start + pd.to_timedelta(day_index, unit='D')
+        weekday = WEEKDAY_FACTORS[np.asarray(dates.weekday)]
+        season = 1 + 0.2 * np.sin(2 * np.pi * (np.asarray(dates.dayofyear) - 80) / 365.25)
+        growth = 0.8 + 0.4 * day_index / max(self.days - 1, 1)
+        return weekday * season * growth
+
+    def expected_rows(self):
+        """Ожидаемое число строк sales.csv: сумма вероятностей ненулевых продаж по дням и SKU"""
+        factors = self.day_factors(np.arange(self.days))
+        # Оценка по квантилям множителя дня вместо прохода по всем дням
+        levels = np.quantile(factors, np.linspace(0, 1, 21))
+        nonzero = [(1 - np.exp(-self.sku_rate * level)).sum() for level in levels]
+        return int(np.mean(nonzero) * self.days)
+
+    # --- справочники ---
+
+    def products_data(self):
+        """Содержимое products.json"""
+        rng = np.random.default_rng([self.seed, 1])
+        wb_codes = rng.integers(10_000_000, 99_999_999, self.n_products)
+        orders = np.round(self.product_rate * 30).astype(int)
+        changes = np.round(orders * rng.uniform(-0.2, 0.3, self.n_products)).astype(int)
+        return {
+            product_id: {
+                "title": "Товар %s" % product_id,
+                "article": product_id,
+                "quantity_in_set": 1,
+                "wb_code": str(wb_codes[i]),
+                "orders": int(orders[i]),
+                "orders_change": int(changes[i]),
+                "sizes": SIZES,
+                "default_size": "M",
+                "monthly_plan": None,
+                "daily_plan": None,
+                "abc_category": ABC_CLASSES[self.product_abc[i]],
+                "cost_price": float(self.cost_price[i]),
+                "photo_url": "https://via.placeholder.com/150x150?text=%s" % product_id
+            }
+            for i, product_id in enumerate(self.product_ids)
+        }
+
+    def inventory_data(self):
+        """Содержимое inventory.json: запас от нескольких дней до квартала продаж"""
+        rng = np.random.default_rng([self.seed, 2])
+        rate = self.product_rate
+        own = np.round(rate * rng.uniform(0, 90, self.n_products)).astype(int)
+        wb = np.round(rate * rng.uniform(0, 20, self.n_products)).astype(int)
+        in_transit = np.round(rate * rng.uniform(0, 60, self.n_products)).astype(int)
+        delivery = self.end + pd.to_timedelta(rng.integers(3, 45, self.n_products), unit='D')
+        days_remaining = np.floor((own + wb) / np.maximum(rate, 1e-9)).astype(int)
+        end_dates = self.end + pd.to_timedelta(np.minimum(days_remaining, 3650), unit='D')
+        return {
+            product_id: {
+                "name": "Товар %s" % product_id,
+                "cost_price": float(self.cost_price[i]),
+                "wb_warehouse": int(wb[i]),
+                "to_client": int(rate[i] * 3),
+                "from_client": int(rate[i]),
+                "own_warehouses": int(own[i]),
+                "in_transit": int(in_transit[i]),
+                "expected_delivery": delivery[i].strftime('%d.%m.%y'),
+                "total_value": int((own[i] + wb[i] + in_transit[i]) * self.cost_price[i]),
+                "avg_sales_period": "день",
+                "days_remaining": int(days_remaining[i]),
+                "end_date": end_dates[i].strftime('%d.%m.%Y'),
+                "last_update": "5 минут назад"
+            }
+            for i, product_id in enumerate(self.product_ids)
+        }
+
+    # --- продажи и оплаты ---
+
+    def _day_sales(self, day_index, factor):
+        """Ненулевые продажи одного дня: коды товаров и размеров и количества"""
+        rng = np.random.default_rng([self.seed, 3, day_index])
+        counts = rng.poisson(self.sku_rate * factor).ravel()
+        cells = np.flatnonzero(counts)
+        return cells // len(SIZES), cells % len(SIZES), counts[cells]
+
+    def _sales_block(self, day_codes, product_codes, size_codes, sales):
+        return pd.DataFrame({
+            'date': self.start + pd.to_timedelta(day_codes, unit='D'),
+            'sales': sales.astype(np.int32),
+            'product_id': pd.Categorical.from_codes(product_codes, categories=self.product_ids),
+            'size': pd.Categorical.from_codes(size_codes, categories=SIZES),
+            'abc_category': pd.Categorical.from_codes(self.product_abc[product_codes], categories=ABC_CLASSES)
+        }, columns=SALES_COLUMNS)
+
+    def sales_chunks(self, chunk_rows=1_000_000):
+        """Продажи в порядке дат частями примерно по chunk_rows строк"""
+        factors = self.day_factors(np.arange(self.days))
+        parts = []
+        rows = 0
+        for day_index in range(self.days):
+            products, sizes, sales = self._day_sales(day_index, factors[day_index])
+            parts.append((np.full(len(sales), day_index), products, sizes, sales))
+            rows += len(sales)
+            if rows >= chunk_rows or day_index == self.days - 1:
+                yield self._sales_block(*(np.concatenate(column) for column in zip(*parts)))
+                parts = []
+                rows = 0
+
+    def sales_frame(self):
+        """Все продажи одной таблицей"""
+        return pd.concat(list(self.sales_chunks()), ignore_index=True)
+
+    def payments_frame(self):
+        """Оплаты каждого типа со своим интервалом, сумма - доля выручки за интервал"""
+        rng = np.random.default_rng([self.seed, 4])
+        daily_revenue = float((self.product_rate * self.cost_price).sum())
+        shares = {'Поставщик': 0.6, 'Логистика': 0.08, 'Маркетплейс': 0.15}
+        frames = []
+        for payment_type in PAYMENT_TYPES:
+            cadence = PAYMENT_CADENCE[payment_type]
+            offsets = np.arange(int(rng.integers(0, cadence)), self.days, cadence)
+            amounts = daily_revenue * shares[payment_type] * cadence * rng.uniform(0.8, 1.2, len(offsets))
+            frames.append(pd.DataFrame({
+                'date': self.start + pd.to_timedelta(offsets, unit='D'),
+                'amount': np.round(amounts).astype(np.int64),
+                'type': payment_type
+            }))
+        payments = pd.concat(frames, ignore_index=True)
+        return payments.sort_values('date', kind='stable', ignore_index=True)
+
+    # --- запись ---
+
+    def write(self, data_path, chunk_rows=1_000_000, progress=None):
+        """Запись четырёх исходных файлов в каталог данных, возвращает число строк продаж"""
+        os.makedirs(data_path, exist_ok=True)
+        for file_name, data in [('products.json', self.products_data()), ('inventory.json', self.inventory_data())]:
+            with open(os.path.join(data_path, file_name), 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+        self.payments_frame().to_csv(
+            os.path.join(data_path, 'payments.csv'), index=False, date_format='%Y-%m-%d'
+        )
+        rows = 0
+        with open(os.path.join(data_path, 'sales.csv'), 'w', encoding='utf-8', newline='') as f:
+            for chunk in self.sales_chunks(chunk_rows):
+                chunk.to_csv(f, index=False, header=(rows == 0), date_format='%Y-%m-%d')
+                rows += len(chunk)
+                if progress is not None:
+                    progress(rows)
+        return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Генерация синтетических данных склада')
+    parser.add_argument('--out', required=True, help='каталог данных')
+    parser.add_argument('--products', type=int, default=100)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--end', default=None, help='последний день продаж, по умолчанию сегодня')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-daily-sales', type=float, default=50.0,
+                        help='средние продажи самого популярного товара в день')
+    parser.add_argument('--chunk-rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+    warehouse = SyntheticWarehouse(
+        args.products, args.days, end=args.end, seed=args.seed, max_daily_sales=args.max_daily_sales
+    )
+    print('Ожидается строк продаж: %d' % warehouse.expected_rows())
+    rows = warehouse.write(args.out, args.chunk_rows, progress=lambda n: print('\r%d строк' % n, end='', flush=True))
+    print('\rЗаписано строк продаж: %d' % rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Прореживание рядов для графиков: LTTB и min/max по корзинам
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from ..charts import downsample, lttb_indices, max_points_for_width, minmax_indices
+
+
+def daily_series(n, seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.normal(100, 10, n)
+    values[n // 3] = 1000
+    values[2 * n // 3] = -500
+    return pd.Series(values, index=pd.date_range('2020-01-01', periods=n, freq='D'), name='sales')
+
+
+@pytest.mark.parametrize('max_points', [3, 10, 300])
+def test_lttb_keeps_endpoints_and_point_limit(max_points):
+    series = daily_series(2000)
+    selected = lttb_indices(series.index.to_numpy(), series.to_numpy(), max_points)
+    assert len(selected) == max_points
+    assert selected[0] == 0 and selected[-1] == len(series) - 1
+    assert np.all(np.diff(selected) > 0)
+
+
+def test_lttb_keeps_spikes():
+    series = daily_series(2000)
+    selected = lttb_indices(series.index.to_numpy(), series.to_numpy(), 100)
+    assert len(series) // 3 in selected
+    assert 2 * len(series) // 3 in selected
+
+
+@pytest.mark.parametrize('max_points', [2, 11, 300])
+def test_minmax_keeps_extremes_within_limit(max_points):
+    series = daily_series(2000, seed=1)
+    selected = minmax_indices(series.to_numpy(), max_points)
+    assert len(selected) <= max_points
+    assert np.all(np.diff(selected) > 0)
+    assert series.to_numpy().argmax() in selected
+    assert series.to_numpy().argmin() in selected
+
+
+def test_downsample_series():
+    series = daily_series(50)
+    assert downsample(series, 100) is series
+    assert len(downsample(series, 10, method='minmax')) <= 10
+
+    thinned = downsample(daily_series(5000), max_points_for_width(400))
+    assert len(thinned) == 400
+    assert thinned.index.is_monotonic_increasing
+    assert max_points_for_width(1) == 3
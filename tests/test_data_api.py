@@ -0,0 +1,89 @@
+"""
+HTTP API данных: ETag, 304 по If-None-Match и смена обработчика
+"""
+import asyncio
+import json
+from urllib.parse import urlencode
+
+from ..data_api import DataApi
+
+
+class FakeHandler:
+    """Обработчик с версией данных и счётчиком расчётов"""
+
+    def __init__(self, instance_id):
+        self.instance_id = instance_id
+        self.data_version = 0
+        self.calls = 0
+
+    def get_sales_metrics(self, period='месяц', abc_filter='Все', size_filter='Все'):
+        self.calls += 1
+        return {'period': period, 'abc': abc_filter, 'total_sales': 10 * (self.data_version + 1)}
+
+
+def request(app, path, query=None, headers=()):
+    """Статус, заголовки и тело ответа ASGI приложения"""
+    scope = {
+        'type': 'http',
+        'method': 'GET',
+        'path': path,
+        'query_string': urlencode(query or {}).encode('latin-1'),
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start, body = messages
+    return start['status'], {k.decode(): v.decode() for k, v in start['headers']}, body['body']
+
+
+def test_etag_and_not_modified():
+    handler = FakeHandler('a')
+    app = DataApi(handler, threads=1)
+    status, headers, body = request(app, '/api/metrics', {'period': 'неделя'})
+    assert status == 200
+    assert json.loads(body)['total_sales'] == 10
+    etag = headers['etag']
+
+    status, headers, body = request(app, '/api/metrics', {'period': 'неделя'}, [('If-None-Match', 'W/' + etag)])
+    assert (status, body) == (304, b'')
+    assert headers['etag'] == etag
+    assert handler.calls == 1
+    assert app.not_modified == 1
+
+    # Другие параметры - другой ETag
+    _, headers, _ = request(app, '/api/metrics', {'period': 'год'}, [('If-None-Match', etag)])
+    assert headers['etag'] != etag
+
+
+def test_etag_follows_data_version_and_handler():
+    handler = FakeHandler('a')
+    app = DataApi(handler, threads=1)
+    _, headers, _ = request(app, '/api/metrics')
+    etag = headers['etag']
+
+    handler.data_version += 1
+    status, headers, body = request(app, '/api/metrics', headers=[('If-None-Match', etag)])
+    assert status == 200
+    assert json.loads(body)['total_sales'] == 20
+    assert headers['etag'] != etag
+
+    # Новый обработчик начинает версии с нуля, но ETag не совпадает со старым
+    app.handler = FakeHandler('b')
+    status, headers, _ = request(app, '/api/metrics', headers=[('If-None-Match', etag)])
+    assert status == 200
+    assert headers['etag'] != etag
+
+
+def test_bad_request_and_missing_handler():
+    app = DataApi(FakeHandler('a'), threads=1)
+    assert request(app, '/api/metrics', {'period': 'век'})[0] == 400
+    assert request(app, '/api/unknown')[0] == 404
+    app.handler = None
+    assert request(app, '/api/metrics')[0] == 503
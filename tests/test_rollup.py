@@ -0,0 +1,79 @@
+"""
+Дневной агрегат: ABC категория по самой поздней строке и окна дат
+"""
+import numpy as np
+import pandas as pd
+
+from ..rollup import ABC_CLASSES, DailyRollup
+
+
+def sales_frame(rows):
+    """Таблица продаж из кортежей (дата, товар, размер, продажи, категория)"""
+    frame = pd.DataFrame(rows, columns=['date', 'product_id', 'size', 'sales', 'abc_category'])
+    frame['date'] = pd.to_datetime(frame['date'])
+    return frame
+
+
+def random_sales(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return sales_frame(list(zip(
+        np.datetime64('2024-01-01') + rng.integers(0, 40, n).astype('timedelta64[D]'),
+        ['p%d' % i for i in rng.integers(0, 12, n)],
+        rng.choice(['S', 'M', 'L'], n),
+        rng.integers(1, 20, n),
+        rng.choice(ABC_CLASSES, n)
+    )))
+
+
+def abc_of(rollup, product_id):
+    return ABC_CLASSES[rollup.product_abc[rollup.products.index(product_id)]]
+
+
+def test_abc_takes_latest_dated_row_not_last_row():
+    rollup = DailyRollup.from_sales(sales_frame([
+        ('2024-01-05', 'p1', 'M', 3, 'A'),
+        ('2024-01-01', 'p1', 'M', 1, 'C'),
+        ('2024-01-03', 'p2', 'S', 2, 'B'),
+    ]))
+    assert abc_of(rollup, 'p1') == 'A'
+    assert abc_of(rollup, 'p2') == 'B'
+
+
+def test_abc_backdated_append_keeps_newer_label():
+    rollup = DailyRollup.from_sales(sales_frame([('2024-01-05', 'p1', 'M', 3, 'A')]))
+    rollup.add(sales_frame([('2024-01-02', 'p1', 'M', 1, 'C')]))
+    assert abc_of(rollup, 'p1') == 'A'
+
+    # При равной дате побеждает строка, добавленная позже
+    rollup.add(sales_frame([('2024-01-05', 'p1', 'L', 2, 'B')]))
+    assert abc_of(rollup, 'p1') == 'B'
+
+
+def test_incremental_add_matches_full_build():
+    sales = random_sales(400)
+    full = DailyRollup.from_sales(sales.sort_values('date', kind='stable'))
+
+    incremental = DailyRollup()
+    for part in np.array_split(np.arange(len(sales)), 7):
+        incremental.add(sales.iloc[part])
+
+    for product_id in full.products:
+        assert abc_of(incremental, product_id) == abc_of(full, product_id)
+        assert incremental.total(product_id=product_id) == full.total(product_id=product_id)
+    pd.testing.assert_series_equal(incremental.daily(), full.daily())
+
+
+def test_windows_match_row_filter():
+    sales = random_sales(400, seed=1)
+    rollup = DailyRollup.from_sales(sales)
+    start, end = pd.Timestamp('2024-01-10 12:00'), pd.Timestamp('2024-01-20')
+    expected = sales.loc[(sales['date'] >= start) & (sales['date'] <= end), 'sales'].sum()
+    assert rollup.total(start, end) == expected
+    # Окна за пределами истории пусты
+    assert rollup.total('2023-01-01', '2023-12-31') == 0
+    assert rollup.total('2025-01-01') == 0
+
+    edges = [None, pd.Timestamp('2024-01-15'), pd.Timestamp('2024-03-01')]
+    first, second = rollup.totals_between(edges)
+    assert first == sales.loc[sales['date'] < edges[1], 'sales'].sum()
+    assert second == sales.loc[sales['date'] >= edges[1], 'sales'].sum()
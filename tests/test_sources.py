@@ -0,0 +1,106 @@
+"""
+Отслеживание исходных файлов: дозапись, правка и защита начала и края
+"""
+import os
+
+import pytest
+
+from ..sources import APPENDED, CHANGED, GUARD_BYTES, UNCHANGED, SourceTracker
+
+HEADER = b'date,sales,product_id\n'
+ROW = b'2024-01-01,10,p1\n'
+
+
+def write(path, data, mode='wb'):
+    with open(path, mode) as f:
+        f.write(data)
+    # Правка того же размера должна быть видна и при грубом mtime
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+@pytest.fixture
+def tracked(tmp_path):
+    path = str(tmp_path / 'sales.csv')
+    write(path, HEADER + ROW * 3)
+    tracker = SourceTracker(path)
+    assert tracker.check() == CHANGED
+    tracker.open_full().close()
+    return path, tracker
+
+
+def test_unchanged_then_appended(tracked):
+    path, tracker = tracked
+    assert tracker.check() == UNCHANGED
+    assert tracker.columns == ['date', 'sales', 'product_id']
+
+    write(path, b'2024-01-02,5,p2\n', mode='ab')
+    assert tracker.check() == APPENDED
+    assert tracker.read_tail() == b'2024-01-02,5,p2\n'
+    assert tracker.check() == UNCHANGED
+
+
+def test_tail_waits_for_complete_line(tracked):
+    path, tracker = tracked
+    write(path, b'2024-01-02,5,p2\n2024-01-03,', mode='ab')
+    assert tracker.check() == APPENDED
+    assert tracker.read_tail() == b'2024-01-02,5,p2\n'
+
+    write(path, b'7,p3\n', mode='ab')
+    assert tracker.check() == APPENDED
+    assert tracker.read_tail() == b'2024-01-03,7,p3\n'
+
+
+def test_edit_in_head_is_changed(tracked):
+    path, tracker = tracked
+    write(path, HEADER + ROW.replace(b'10', b'99') + ROW * 2 + ROW)
+    assert tracker.check() == CHANGED
+
+
+def test_truncate_and_delete_are_changed(tracked):
+    path, tracker = tracked
+    write(path, HEADER + ROW)
+    assert tracker.check() == CHANGED
+    os.remove(path)
+    assert tracker.check() == CHANGED
+
+
+def test_edit_before_offset_in_large_file_is_changed(tmp_path):
+    path = str(tmp_path / 'sales.csv')
+    rows = ROW * (3 * GUARD_BYTES // len(ROW))
+    write(path, HEADER + rows)
+    tracker = SourceTracker(path)
+    tracker.open_full().close()
+
+    # Правка последней строки вне начала файла, но внутри края перед смещением
+    write(path, HEADER + rows[:-len(ROW)] + ROW.replace(b'p1', b'p9') + ROW)
+    assert tracker.check() == CHANGED
+
+
+def test_file_without_trailing_newline(tmp_path):
+    path = str(tmp_path / 'sales.csv')
+    write(path, HEADER + ROW.rstrip(b'\n'))
+    tracker = SourceTracker(path)
+    tracker.open_full().close()
+
+    # Дозапись с новой строки - это хвост
+    write(path, b'\n2024-01-02,5,p2\n', mode='ab')
+    assert tracker.check() == APPENDED
+
+    # Продолжение прочитанной последней строки - уже другие данные
+    write(path, HEADER + ROW.rstrip(b'\n'))
+    tracker.open_full().close()
+    write(path, b'0,p1\n', mode='ab')
+    assert tracker.check() == CHANGED
+
+
+def test_json_same_content_is_unchanged(tmp_path):
+    path = str(tmp_path / 'products.json')
+    write(path, b'{"p1": 1}')
+    tracker = SourceTracker(path, kind='json')
+    tracker.read_all()
+
+    write(path, b'{"p1": 1}')
+    assert tracker.check() == UNCHANGED
+    write(path, b'{"p1": 2}')
+    assert tracker.check() == CHANGED
@@ -0,0 +1,84 @@
+"""
+Потоковая загрузка sales.csv: сверка агрегата и ограничение памяти
+
+Объём выгрузки задаётся переменной окружения WAREHOUSE_STREAM_TEST_MB
+(по умолчанию 64 МБ), лимит памяти - WAREHOUSE_STREAM_CAP_MB (24 МБ);
+полный прогон на 5 ГБ - benchmarks/bench_streaming.py. Пиковая память
+загрузки меряется tracemalloc: при потоковом чтении она определяется
+размером части, а не файла (загрузка целиком занимает в разы больше
+объёма выгрузки).
+"""
+import os
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from ..data_handler import DataHandler
+
+SIZES = ['XS', 'S', 'M', 'L', 'XL']
+ABC = ['A', 'B', 'C']
+STREAM_MB = float(os.environ.get('WAREHOUSE_STREAM_TEST_MB', 64))
+MEMORY_CAP_MB = float(os.environ.get('WAREHOUSE_STREAM_CAP_MB', 24))
+
+
+def write_sales_stream(path, total_bytes, rows_per_day=20_000, n_products=50, seed=0):
+    """Запись синтетической выгрузки заданного объёма, возвращает (строки, сумма продаж, по товарам)"""
+    rng = np.random.default_rng(seed)
+    day = np.datetime64('2015-01-01', 'D')
+    rows = 0
+    total_sales = 0
+    by_product = np.zeros(n_products, dtype=np.int64)
+    written = 0
+    with open(path, 'wb') as f:
+        written += f.write(b'date,sales,product_id,size,abc_category\n')
+        while written < total_bytes:
+            products = rng.integers(0, n_products, rows_per_day)
+            sales = rng.integers(1, 60, rows_per_day)
+            sizes = rng.integers(0, len(SIZES), rows_per_day)
+            prefix = str(day).encode()
+            written += f.write(b''.join(
+                b'%s,%d,sku%03d,%s,%s\n' % (prefix, q, p, SIZES[s].encode(), ABC[p % len(ABC)].encode())
+                for q, p, s in zip(sales, products, sizes)
+            ))
+            np.add.at(by_product, products, sales)
+            rows += rows_per_day
+            total_sales += int(sales.sum())
+            day += 1
+    return rows, total_sales, by_product
+
+
+@pytest.fixture(scope='module')
+def sales_stream(tmp_path_factory):
+    data_path = tmp_path_factory.mktemp('stream')
+    total_bytes = int(STREAM_MB * 1024 ** 2)
+    rows, total_sales, by_product = write_sales_stream(os.path.join(data_path, 'sales.csv'), total_bytes)
+    return str(data_path), total_bytes, rows, total_sales, by_product
+
+
+def test_streaming_rollup_matches_stream_under_memory_cap(sales_stream):
+    data_path, _, _, total_sales, by_product = sales_stream
+    handler = DataHandler(data_path=data_path, streaming=True, chunk_rows=50_000, raw_window_days=7)
+
+    tracemalloc.start()
+    try:
+        rollup = handler.rollup
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert peak < MEMORY_CAP_MB * 1024 ** 2
+    assert rollup.total() == total_sales
+    for i, expected in enumerate(by_product):
+        assert rollup.total(product_id='sku%03d' % i) == expected
+
+
+def test_streaming_keeps_only_raw_window(sales_stream):
+    data_path, _, rows, _, _ = sales_stream
+    handler = DataHandler(data_path=data_path, streaming=True, chunk_rows=50_000, raw_window_days=7)
+
+    sales_data = handler.sales_data
+    dates = sales_data['date'].to_numpy()
+    assert len(sales_data) < rows
+    assert dates.max() - dates.min() <= np.timedelta64(7, 'D')
+    assert handler.rollup.end_day == dates.max().astype('datetime64[D]')